@@ -6,14 +6,31 @@ Created on Thu Dec 18 18:32:26 2025
 """
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import threading
 import os
 import sys
 
 
-# Import your backend script
-import WORKINGFILE_PhiRu_FUNCTION as backend
+# The backend runs in a separate process, managed by the job manager
+from analysis_jobs import AnalysisJobManager
+from image_cache import ImageCache
+
+# Status text shown for each stage of the analysis
+STAGE_TEXT = {
+    "load": "Loading the impact database...",
+    "filter": "Filtering events...",
+    "clean": "Cleaning administrative area codes...",
+    "merge": "Aggregating and merging L3/L2...",
+    "match": "Matching with EM-DAT...",
+    "plot": "Rendering figures...",
+}
+
+# Milliseconds between two looks at the job events
+POLL_INTERVAL_MS = 100
+
+# Image size used before the window is drawn, and delay before re-fitting
+# the image after the window was resized (resizing fires many events)
+DEFAULT_IMAGE_BOX = (800, 600)
+RESIZE_DELAY_MS = 150
 
 class AnalysisApp:
     def __init__(self, root):
@@ -23,6 +40,16 @@ class AnalysisApp:
         
         # Store image paths here after analysis runs
         self.image_paths = {}
+        self.stage_summary = ""  # per-stage timings of the last run
+
+        # Runs the analyses in a worker process, polled from the Tk loop
+        self.jobs = AnalysisJobManager()
+        self.polling = False  # True while poll_jobs is scheduled
+
+        # Decoded, pre-scaled figures and the one on display
+        self.images = ImageCache()
+        self.current_category = None
+        self.resize_job = None
 
         # --- GUI LAYOUT ---
         
@@ -44,6 +71,10 @@ class AnalysisApp:
         self.run_btn = ttk.Button(control_frame, text="Run Analysis", command=self.start_analysis_thread)
         self.run_btn.pack(side="left", padx=5)
 
+        # The Cancel button (kills a running analysis)
+        self.cancel_btn = ttk.Button(control_frame, text="Cancel", state="disabled", command=self.cancel_analysis)
+        self.cancel_btn.pack(side="left", padx=5)
+
         # Status Label (to show "Running..." or "Done")
         self.status_var = tk.StringVar(value="Ready")
         self.status_lbl = ttk.Label(control_frame, textvariable=self.status_var, font=("Arial", 10, "italic"))
@@ -65,18 +96,21 @@ class AnalysisApp:
         self.view_spatial_btn = ttk.Button(self.btn_frame, text="View Spatial Map", state="disabled",command=lambda: self.show_image("Spatial"))
         self.view_spatial_btn.pack(side="left", padx=5)
 
+        # Per-stage timings of the last run, apart from the status line ("Viewing: ..." replaces that)
+        self.summary_var = tk.StringVar(value="")
+        self.summary_lbl = ttk.Label(self.btn_frame, textvariable=self.summary_var, font=("Arial", 9))
+        self.summary_lbl.pack(side="left", padx=10)
+
         # 3. Image Display Area
         self.image_canvas = tk.Label(root, text="Run analysis to generate graphs", bg="#f0f0f0")
         self.image_canvas.pack(side="top", fill="both", expand=True, padx=20, pady=20)
+        self.image_canvas.bind("<Configure>", self.on_resize)
         
         # Rewire the "X" button as a safe exit
         self.root.protocol("WM_DELETE_WINDOW", self.safe_exit)
 
     def start_analysis_thread(self):
-        """Starts the backend process in a separate thread so GUI doesn't freeze."""
-        self.run_btn.config(state="disabled")
-        self.status_var.set("Running analysis... Please wait.")
-        
+        """Submits the analysis to the worker process so GUI doesn't freeze."""
         # Check if the user typed a year
         try:
             s_year = int(self.start_year_var.get())
@@ -85,64 +119,124 @@ class AnalysisApp:
             messagebox.showerror("Input Error", "Please enter valid numbers for year.")
             return
         
-        # Run the actual work in a background thread
-        self.run_btn.config(state="disabled")
-        self.status_var.set(f"Running analysis from {s_year} onwards ...")
-        
-        # Pass the years to the thread
-        thread = threading.Thread(target=self.run_backend_logic, args=(s_year,))
-        thread.start()
-
-    def run_backend_logic(self,s_year):
-        """This function runs in the background."""
-        try:
-            self.image_paths = backend.run_analysis(s_year)
-            self.root.after(0, self.analysis_complete)
-        except Exception as e:
-            error_msg = str(e)
-            self.root.after(0, lambda: messagebox.showerror("Error", error_msg))
-            self.root.after(0, lambda: self.status_var.set("Error occurred."))
-            self.root.after(0, lambda: self.run_btn.config(state="normal"))
+        # Runs now, or after the running job (only the latest request is kept)
+        was_busy = self.jobs.busy
+        accepted = self.jobs.submit(filter_year=s_year)
+        self.cancel_btn.config(state="normal")
+        if not accepted:
+            self.status_var.set(f"Already running: analysis from {s_year} onwards")
+        elif was_busy:
+            self.status_var.set(f"Queued: analysis from {s_year} onwards (after the current run)")
+        else:
+            self.status_var.set(f"Running analysis from {s_year} onwards ...")
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL_MS, self.poll_jobs)
+
+    def cancel_analysis(self):
+        """Kills the running analysis."""
+        self.handle_events(self.jobs.cancel())
+
+    def poll_jobs(self):
+        """Handles the job events, then looks again a bit later while busy."""
+        self.handle_events(self.jobs.poll())
+        self.polling = self.jobs.busy
+        if self.polling:
+            self.root.after(POLL_INTERVAL_MS, self.poll_jobs)
+
+    def handle_events(self, events):
+        """Updates the window from the job events (GUI thread only)."""
+        for event in events:
+            kind = event[0]
+            if kind == "progress":
+                self.status_var.set(STAGE_TEXT.get(event[2], event[2]))
+            elif kind == "metrics":
+                self.stage_summary = event[2]
+            elif kind == "done":
+                self.image_paths = event[2]
+                self.analysis_complete()
+            elif kind == "error":
+                self.status_var.set("Error occurred.")
+                messagebox.showerror("Error", event[2])
+            elif kind == "cancelled":
+                self.status_var.set("Analysis cancelled.")
+        if not self.jobs.busy:
+            self.cancel_btn.config(state="disabled")
 
     def analysis_complete(self):
         """Called when analysis finishes successfully."""
         self.status_var.set("Analysis Complete! Select a graph below.")
-        self.run_btn.config(state="normal")
+        notes = []
+        if "Spatial" not in self.image_paths:  # e.g. no country layer, reason printed by the run
+            notes.append("Spatial map not drawn (see the console)")
+        if self.stage_summary:
+            notes.append(f"Last run: {self.stage_summary}")
+        self.summary_var.set("  |  ".join(notes))
         
-        # Enable the view buttons
-        self.view_deaths_btn.config(state="normal")
-        self.view_injuries_btn.config(state="normal")
-        self.view_damage_btn.config(state="normal")
-        self.view_spatial_btn.config(state="normal")
+        # Enable the view buttons of the figures that were drawn
+        for category, button in (("Deaths", self.view_deaths_btn), ("Injuries", self.view_injuries_btn),
+                                 ("Damage", self.view_damage_btn), ("Spatial", self.view_spatial_btn)):
+            button.config(state="normal" if category in self.image_paths else "disabled")
         
         
         
-        # Show the first image automatically
+        # Show the first image automatically, then prepare the others
         self.show_image("Deaths")
+        self.root.after_idle(self.prepare_images, ["Injuries", "Damage", "Spatial"])
+
+    def image_box(self):
+        """Size available for the image in the display area."""
+        width, height = self.image_canvas.winfo_width(), self.image_canvas.winfo_height()
+        if width <= 1 or height <= 1:  # not drawn yet
+            return DEFAULT_IMAGE_BOX
+        # Keep a small margin, so the image never makes the label grow
+        return (width - 4, height - 4)
 
     def show_image(self, category):
-        """Loads and displays the image for the selected category."""
+        """Displays the image for the selected category, scaled to the window."""
         path = self.image_paths.get(category)
         if path and os.path.exists(path):
-            # Load Image using Pillow
-            load = Image.open(path)
-            
-            # Resize image to fit window if necessary (Optional)
-            load = load.resize((800, 600), Image.Resampling.LANCZOS)
-            
-            render = ImageTk.PhotoImage(load)
+            # Decoded once, then served from the cache at this size
+            render = self.images.photo(category, path, self.image_box())
             
             # Update the label
             self.image_canvas.config(image=render, text="")
             self.image_canvas.image = render # Keep a reference! (Crucial for Tkinter)
+            self.current_category = category
             self.status_var.set(f"Viewing: {category}")
         else:
             messagebox.showwarning("File Missing", f"Could not find image at {path}")
+
+    def prepare_images(self, categories):
+        """Builds the images of the other views at the current size, one per idle slot."""
+        if not categories:
+            return
+        category, rest = categories[0], categories[1:]
+        path = self.image_paths.get(category)
+        if path and os.path.exists(path):
+            self.images.photo(category, path, self.image_box())
+        self.root.after_idle(self.prepare_images, rest)
+
+    def on_resize(self, event):
+        """Re-fits the displayed image once the window stopped resizing."""
+        if self.current_category is None:
+            return
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(RESIZE_DELAY_MS, self.refit_image)
+
+    def refit_image(self):
+        """Shows the current view at the new size and prepares the other views."""
+        self.resize_job = None
+        self.show_image(self.current_category)
+        others = [c for c in ("Deaths", "Injuries", "Damage", "Spatial") if c != self.current_category]
+        self.root.after_idle(self.prepare_images, others)
         
     def safe_exit(self):
         """Ensures the application and kernel shut down completely."""
         if messagebox.askokcancel("Quit", "Do you want to quit the program?"):
-            # This kills the main window and stops the mainloop
+            # Stop the analysis worker, then kill the main window and stop the mainloop
+            self.jobs.shutdown()
             self.root.destroy()
             
             # Kills the python kernal
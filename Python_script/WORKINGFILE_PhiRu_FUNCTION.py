@@ -1,290 +1,565 @@
-import sqlite3
 import pandas as pd
 import data_processing_functions as dpf
+import emdat_ingest
+import emdat_matching
+import impactdb_cache as dbc
+import impactdb_events as events
+import impactdb_loader as loader
+import impactdb_schema as schema
+import pipeline_metrics
 import os
-import geopandas as gpd
 
 
-def run_analysis(filter_year):
-    #1------- Connecting to Data base using dynamic paths
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    db_path = os.path.join(project_root, 'Data', 'impactdb.v1.0.2.dg_filled.db')  # <-- database
-    conn = sqlite3.connect(db_path)
-    
-    #2-------  Reading data from tables and selecting those with total in title
-    # List all tables
-    tables = pd.read_sql(
-        "SELECT name FROM sqlite_master WHERE type='table';", conn)
-    
-    all_total_tables = tables[tables["name"].str.startswith("Total")]["name"]
-    
-    #2(L1)-------
-    # Concatenate to one big L1 dataframe
-    L1_list = []
-    for table_name in all_total_tables:
-        df = pd.read_sql(f"SELECT * FROM {table_name};", conn)
-        df["source_table"] = table_name
-        L1_list.append(df)
-    
-    L1 = pd.concat(L1_list, ignore_index=True)
-    
-    #2(L3)--------
-    
-    spec_tables = tables[tables["name"].str.startswith("Specific")]["name"].tolist()
-    L3 = {}  # dictionary of category -> dataframe
-    
-    for table_name in spec_tables: #for each table that starts with specific
-        #classifyinging tables into three impacts deaths, injuries & damage
-        if "Deaths" in table_name:
-            category = "Deaths"
-        elif "Injuries" in table_name:
-            category = "Injuries"
-        elif "Damage" in table_name:
-            category = "Damage"
+def file_key(path):
+    """Cheap identity of a file for the stage cache: path, size and mtime."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def print_gid_stats(rejections):
+    """
+    Print the GID cache counters and the rows dropped by the GID cleaning.
+
+    Args:
+        rejections (data_processing_functions.RejectionStats): Counters of
+            the rows dropped, e.g. those of the current run.
+    """
+    gid_stats = dpf.GID_CACHE.stats()
+    print(f"GID cache: {gid_stats['hits']} hits, {gid_stats['misses']} misses "
+          f"({gid_stats['hit_rate']:.0%} hit rate, {gid_stats['size']} entries)")
+    rejected = rejections.stats()
+    print(f"GID rows dropped: {rejected['dropped']} of {rejected['rows_in']} "
+          f"({rejected['missing']} missing, {rejected['multiple']} multiple codes, "
+          f"{rejected['invalid']} invalid format)")
+
+
+# Year-independent stages needed by run() in the in-memory mode (not the raw tables)
+SHARED_STAGES = ("prepare_L3", "prepare_L2", "emdat", "emdat_index")
+
+# dpf functions called once per GID string: not measured, that would cost
+# more than the calls themselves
+ROW_FUNCTIONS = ("get_single_valid_gid", "get_single_valid_gid_instance")
+
+
+class AnalysisPipeline:
+    """
+    run_analysis split into stages whose results are kept between runs.
+
+    Every stage stores its last result together with the inputs it was
+    computed from (file identities, hazard type). A later run with the same
+    inputs reuses the result, so changing only the year threshold re-runs
+    the year filter and the steps after it (aggregation, L3/L2 merge, EM-DAT
+    match, plots), while the DB load, TC filtering, GID cleaning and EM-DAT
+    read are served from memory.
+
+    With a PipelineMetrics, every run is measured: each stage reported to
+    the progress callback (load, filter, clean, merge, match, plot), each
+    cached step and each data_processing_functions call, see
+    pipeline_metrics.
+
+    Args:
+        project_root (str, optional): Folder holding Data/ (database, EM-DAT
+            workbook, their Data/cache snapshots and the figure cache) and
+            Images/. Defaults to the parent of this script's folder.
+        metrics (pipeline_metrics.PipelineMetrics, optional): Instrumentation
+            of the runs. Defaults to none (nothing is measured).
+    """
+
+    def __init__(self, project_root=None, metrics=None):
+        if project_root is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            project_root = os.path.dirname(script_dir)
+        self.project_root = project_root
+        self.db_path = os.path.join(project_root, 'Data', 'impactdb.v1.0.2.dg_filled.db')  # <-- database
+        self.emdat_path = os.path.join(project_root, 'Data', 'EMDAT.xlsx')
+        self.cache_dir = os.path.join(project_root, 'Data', 'cache')  # on-disk snapshots
+        self._stages = {}  # stage name -> (inputs, result)
+        self.results = {}  # impact type / 'Spatial' -> computed numbers of the last run
+        self._progress = None  # progress callback of the running analysis
+        self.metrics = metrics
+        self.gid_rejections = dpf.RejectionStats()  # rows dropped by the GID cleaning of the current run
+        self.failed_figures = {}  # figure -> why it was not drawn, in the last run
+
+    def _stage(self, name, inputs, compute):
+        """Return the cached result of a stage, or compute and store it."""
+        entry = self._stages.get(name)
+        if entry is not None and entry[0] == inputs:
+            if self.metrics is not None:
+                self.metrics.end(self.metrics.begin("step", name), cached=True)
+            return entry[1]
+        if self.metrics is None:
+            result = compute()
         else:
-            continue
-    
-        df = pd.read_sql(f"SELECT * FROM {table_name};", conn)
-        df["source_table"] = table_name
-        L3.setdefault(category, []).append(df)
-    
-    # Get only Deaths, Injuries and Damage
-    for category in L3:
-        L3[category] = pd.concat(L3[category], ignore_index=True)
-    
-    L3_Deaths = L3.get("Deaths")
-    L3_Injuries = L3.get("Injuries")
-    L3_Damage = L3.get("Damage")
-    
-    
-    #3----- Filtering for Tropical Storm/Cyclone events
-    
-    filter_criteria = L1["Main_Event"] == "Tropical Storm/Cyclone"
-    L1_TC = L1[filter_criteria].copy() #Copy is very imprtant to ensure original data isn't altered
-    
-    tc_events = L1_TC["Event_ID"].unique()
-    
-    L3_Deaths_TC = dpf.filter_L3_tc(L3_Deaths, tc_events)
-    L3_Injuries_TC = dpf.filter_L3_tc(L3_Injuries, tc_events)
-    L3_Damage_TC  = dpf.filter_L3_tc(L3_Damage, tc_events)
-    date_cols = [
-        "Start_Date_Year", "Start_Date_Month", "Start_Date_Day",
-        "End_Date_Year", "End_Date_Month", "End_Date_Day"]
-    
-    L1_TC_dates = L1_TC[["Event_ID"] + date_cols].drop_duplicates()
-    
-    L3_Deaths_TC = dpf.fill_dates(L3_Deaths_TC, L1_TC_dates, date_cols)
-    L3_Injuries_TC = dpf.fill_dates(L3_Injuries_TC, L1_TC_dates, date_cols)
-    L3_Damage_TC = dpf.fill_dates(L3_Damage_TC, L1_TC_dates, date_cols)
-    
-    #4---------- Filtering by year
+            with self.metrics.measure("step", name) as measured:
+                result = compute()
+                measured.rows_out = pipeline_metrics.count_rows(result)
+        self._stages[name] = (inputs, result)
+        return result
+
+    def clear(self):
+        """Forget every cached stage result."""
+        self._stages.clear()
+
+    def prepare(self, hazard, match_mode="exact", window=1):
+        """
+        Compute the stages that do not depend on the year threshold.
+
+        Args:
+            hazard (str): Main_Event to analyse.
+            match_mode (str): EM-DAT matching mode, see run.
+            window (int): Tolerance in months of the fuzzy mode.
+
+        Returns:
+            dict: The cached stages run() needs for this hazard and matching
+            mode; hand them to another pipeline with use_stages().
+        """
+        self.prepare_L3(hazard)
+        self.prepare_L2(hazard)
+        self.emdat_index(match_mode, window)
+        return {name: self._stages[name] for name in SHARED_STAGES}
+
+    def use_stages(self, stages):
+        """Adopt stages computed by another pipeline (see prepare)."""
+        self._stages.update(stages)
+
+    def db_cache(self):
+        """Return the database snapshot, refreshed if the db file changed."""
+        cache = dbc.ImpactDBCache(self.db_path, cache_dir=os.path.join(self.cache_dir, 'impactdb'))
+        cache.refresh()
+        return cache
+
+    def _report(self, stage):
+        """Tell the progress callback (if any) that a stage starts."""
+        if self.metrics is not None:
+            self.metrics.mark(stage)
+        if self._progress is not None:
+            self._progress(stage)
+
+    #1-2------- Reading the Total (L1), Specific (L3) and Instance (L2) tables
+    def load(self, hazard):
+        """
+        Load the L1 rows of one hazard type and the L3/L2 rows of its events.
+
+        Returns:
+            dict: 'L1_TC' DataFrame, 'L3' and 'L2' dicts of category -> DataFrame.
+        """
+        def compute():
+            self._report("load")
+            # Snapshot the tables once (keyed on size, mtime and hash of the db file),
+            # later runs only read the columns we use from the memory-mapped snapshot
+            cache = self.db_cache()
             
-    year_to_filter = filter_year
-    L3_Deaths_TC_1900 = dpf.filter_year(L3_Deaths_TC, year_to_filter)
-    L3_Injuries_TC_1900 = dpf.filter_year(L3_Injuries_TC, year_to_filter)
-    L3_Damage_TC_1900 = dpf.filter_year(L3_Damage_TC, year_to_filter)
-    
-    #5---------- Aggregate by Administrative Area
-    
-    # Execute the process on each of our filtered dataframes:
-    L3_Deaths_TC_1900_aggregated = dpf.aggregate_by_eventID(dpf.clean_dataframe(L3_Deaths_TC_1900))
-    L3_Damage_TC_1900_aggregated = dpf.aggregate_by_eventID(dpf.clean_dataframe(L3_Damage_TC_1900))
-    L3_Injuries_Damage_TC_1900_aggregated = dpf.aggregate_by_eventID(dpf.clean_dataframe(L3_Injuries_TC_1900))
-    
-    #6-------
-    
-    instance_tables = tables[tables["name"].str.startswith("Instance")]["name"].tolist()
-    
-    L2 = {}  # dictionary of category -> dataframe
-    
-    for table_name in instance_tables: #for each table that starts with instance
-        #classifyinging tables into three impacts deaths, injuries & damage
-        if "Deaths" in table_name:
-            category = "Deaths"
-        elif "Injuries" in table_name:
-            category = "Injuries"
-        elif "Damage" in table_name:
-            category = "Damage"
+            # Only rows of the hazard (WHERE Main_Event = ?) and of its events are read.
+            # No year is pushed down, so this stage is shared by every year threshold.
+            L1, L3, L2, load_timings = loader.load_impactdb(self.db_path, hazard, cache=cache)
+            for timing in load_timings:
+                print(f"Loaded {timing['table']} ({timing['source']}): "
+                      f"{timing['rows']} rows in {timing['seconds']:.2f}s")
+            return {"L1_TC": L1, "L3": L3, "L2": L2}
+        
+        return self._stage("load", (file_key(self.db_path), hazard), compute)
+
+    #1------- Event index of the whole L1 (one per database, shared by every hazard)
+    def event_index(self):
+        """
+        Return the index of every level-1 event (Event_ID, Main_Event, dates).
+
+        Returns:
+            impactdb_events.EventIndex: Built once per database file.
+        """
+        def compute():
+            self._report("load")
+            cache = self.db_cache()
+            return events.load_event_index(self.db_path, cache=cache)
+        
+        return self._stage("event_index", (file_key(self.db_path),), compute)
+
+    #3------- TC events, dates filled from L1, GIDs cleaned (independent of the year)
+    def prepare_L3(self, hazard):
+        """
+        Filter L3 on the hazard's events, back-fill dates from L1, clean GIDs.
+
+        Returns:
+            pandas.DataFrame: Cleaned L3 rows of every impact type (long frame
+            keyed by 'Impact_Type'), before the year filter.
+        """
+        def compute():
+            loaded = self.load(hazard)
+            # Membership and date back-fill are binary searches in the event index
+            hazard_events = self.event_index().for_hazard(hazard)
+            self._report("filter")
+            
+            tc_plan = (dpf.FilterPlan()
+                       .keep_events(hazard_events)
+                       .fill_dates_from(hazard_events, dbc.DATE_COLUMNS))
+            
+            # All impact types in one long frame: every step below runs once
+            L3 = schema.stack_frames(loaded["L3"], "Impact_Type", loader.IMPACT_CATEGORIES)
+            
+            # GID cleaning only drops rows, so it can run before the year filter
+            self._report("clean")
+            return dpf.clean_dataframe(tc_plan.apply(L3), stats=self.gid_rejections)
+        
+        return self._stage("prepare_L3", (file_key(self.db_path), hazard), compute)
+
+    #6------- L2 GIDs cleaned (independent of the year)
+    def prepare_L2(self, hazard):
+        """
+        Clean the L2 GIDs and rename the column to match L3.
+
+        Returns:
+            pandas.DataFrame: Cleaned L2 rows of every impact type (long frame
+            keyed by 'Impact_Type') with 'Administrative_Area_GID'.
+        """
+        def compute():
+            loaded = self.load(hazard)
+            self._report("clean")
+            L2 = schema.stack_frames(loaded["L2"], "Impact_Type", loader.IMPACT_CATEGORIES)
+            # --- Rename L2 GID column to match L3, AreaS to Area (more prone to error if not changed)
+            L2 = dpf.clean_dataframe(L2, stats=self.gid_rejections).rename(
+                columns={"Administrative_Areas_GID": "Administrative_Area_GID"})
+            print_gid_stats(self.gid_rejections)
+            return L2
+        
+        return self._stage("prepare_L2", (file_key(self.db_path), hazard), compute)
+
+    #7------- EM-DAT
+    def emdat(self):
+        """
+        Read the EM-DAT columns used for matching.
+
+        Returns:
+            pandas.DataFrame: EM-DAT ISO, dates and impact columns.
+        """
+        # Only the nine columns we use are parsed, and only the first time:
+        # later runs load them from a typed Arrow cache of the workbook
+        return self._stage("emdat", file_key(self.emdat_path),
+                           lambda: emdat_ingest.load_emdat(
+                               self.emdat_path, cache_dir=os.path.join(self.cache_dir, 'emdat')))
+
+    def emdat_index(self, match_mode="exact", window=1):
+        """
+        Index the EM-DAT records for the chosen matching mode.
+
+        Args:
+            match_mode (str): 'exact' or 'fuzzy', see emdat_matching.make_index.
+            window (int): Tolerance in months of the fuzzy mode.
+
+        Returns:
+            EmdatIndex or EmdatIntervalIndex: Index shared by the three categories.
+        """
+        return self._stage("emdat_index", (file_key(self.emdat_path), match_mode, window),
+                           lambda: emdat_matching.make_index(self.emdat(), match_mode, window))
+
+    #8------- Country polygons of the spatial map
+    def countries(self, allow_download=True):
+        """
+        Return the Natural Earth country layer of the project.
+
+        Read from Data/ of the project root or from Data/cache/geometry, see
+        geometry_provider.load_countries (parsed once per process).
+
+        Args:
+            allow_download (bool): Download the layer into the cache folder
+                if there is no local copy.
+
+        Returns:
+            geopandas.GeoDataFrame: Country polygons with their 'ISO_A3' code.
+        """
+        import geometry_provider  # geopandas is only imported by runs that draw the map
+        return geometry_provider.load_countries(
+            cache_dir=os.path.join(self.cache_dir, 'geometry'), allow_download=allow_download,
+            data_dir=os.path.join(self.project_root, 'Data'))
+
+    #3-6------- Streaming mode: the impact tables are read chunk by chunk
+    def stream(self, filter_year, hazard, chunksize):
+        """
+        Filter, clean and aggregate L3 and filter L2 without loading whole tables.
+
+        Each chunk of the Specific tables goes through the TC filter, the
+        date back-fill, the year filter and the GID cleaning, and is folded
+        into a ChunkAggregator. The Instance tables are then read the same
+        way, keeping only the rows of the aggregated (Impact_Type, Event_ID).
+        Peak memory is set by chunksize and by the size of these two
+        results, not by the size of the database. Nothing is cached.
+
+        Args:
+            filter_year (int): Keep L3 rows whose start year is after this year.
+            hazard (str): Main_Event to analyse.
+            chunksize (int): Number of table rows read at a time.
+
+        Returns:
+            tuple: (L3_TC_year_aggregated, L2_filter), as in the in-memory mode.
+
+        Raises:
+            ValueError: If no level-3 row is left after filtering.
+        """
+        self._report("load")
+        cache = self.db_cache()
+        hazard_events = self.event_index().for_hazard(hazard)
+        plan = (dpf.FilterPlan()
+                .keep_events(hazard_events)
+                .fill_dates_from(hazard_events, dbc.DATE_COLUMNS)
+                .after_year(filter_year))
+        merge_keys = ["Impact_Type", "Event_ID", "Administrative_Area_GID"]
+        
+        # L3: filter -> clean -> partial sums per (Impact_Type, Event_ID, GID)
+        self._report("filter")
+        aggregator = dpf.ChunkAggregator(merge_keys)
+        for category, chunk in loader.stream_impact_tables(
+                self.db_path, hazard, "Specific", hazard_events.event_ids, chunksize,
+                year_after=filter_year, cache=cache):
+            chunk = schema.stack_frames({category: plan.apply(chunk)}, "Impact_Type",
+                                        loader.IMPACT_CATEGORIES)
+            aggregator.add(dpf.drop_invalid_gids(chunk, "Administrative_Area_GID",
+                                                 stats=self.gid_rejections))
+        L3_TC_year_aggregated = aggregator.result()
+        if L3_TC_year_aggregated is None:
+            raise ValueError(f"No level-3 {hazard} rows after {filter_year}.")
+        
+        # L2: clean -> keep the events of the aggregated L3
+        self._report("clean")
+        L3_events = L3_TC_year_aggregated[["Impact_Type", "Event_ID"]].drop_duplicates()
+        L2_parts = []
+        for category, chunk in loader.stream_impact_tables(
+                self.db_path, hazard, "Instance", hazard_events.event_ids, chunksize, cache=cache):
+            chunk = schema.stack_frames({category: chunk}, "Impact_Type", loader.IMPACT_CATEGORIES)
+            chunk = dpf.drop_invalid_gids(chunk, "Administrative_Areas_GID",
+                                          stats=self.gid_rejections).rename(
+                columns={"Administrative_Areas_GID": "Administrative_Area_GID"})
+            L2_parts.append(dpf.semi_join(chunk, L3_events, ["Impact_Type", "Event_ID"]))
+        L2_filter = schema.concat_frames(L2_parts)
+        print_gid_stats(self.gid_rejections)
+        
+        # Same categories on both sides, so the keys stay categorical
+        return schema.align_categories(
+            L3_TC_year_aggregated, L2_filter, ["Event_ID", "Administrative_Area_GID"])
+
+    #4-8------- Everything that depends on the year threshold
+    def run(self, filter_year, hazard="Tropical Storm/Cyclone", match_mode="exact", window=1,
+            output_dir=None, dpi=300, fmt="png", render=True, progress=None, chunksize=None,
+            plot_workers=None, allow_download=True):
+        """
+        Run the analysis for one year threshold, reusing the cached stages.
+
+        Args:
+            filter_year (int): Keep L3 rows whose start year is after this year.
+            hazard (str): Main_Event to analyse.
+            match_mode (str): 'exact' 5-key EM-DAT matching, or 'fuzzy'
+                matching within ``window`` months.
+            window (int): Tolerance in months of the fuzzy mode.
+            output_dir (str, optional): Folder of the figures. Defaults to
+                the project Images folder.
+            dpi (int): Resolution of the figures.
+            fmt (str): File format of the figures, e.g. 'png' or 'svg'.
+            render (bool): Draw the figures. If False, only the numbers are
+                computed (see ``results``) and matplotlib is never loaded.
+            progress (callable, optional): Called with the name of each stage
+                as it starts: 'load', 'filter', 'clean', 'merge', 'match', 'plot'.
+                Cached stages are not reported.
+            chunksize (int, optional): Streaming mode: read the impact tables
+                this many rows at a time (see stream) instead of holding
+                them in memory. Defaults to the in-memory, cached mode.
+            plot_workers (int, optional): Processes drawing the figures, see
+                plot_rendering.render_all. 1 draws them in this process.
+            allow_download (bool): Download the country layer of the spatial
+                map once into Data/cache/geometry if the project has no
+                copy. False for offline hosts.
+
+        Returns:
+            dict: Impact type ('Deaths', 'Injuries', 'Damage') or 'Spatial' -> image
+            path in output_dir; empty if render is False. A figure that could
+            not be drawn is left out and its reason kept in ``failed_figures``.
+        """
+        self._progress = progress
+        self.gid_rejections.clear()  # the counts printed are those of this run
+        self.failed_figures = {}
+        metrics = self.metrics
+        if metrics is not None:
+            run_span = metrics.start_run(filter_year=filter_year, hazard=hazard, match_mode=match_mode,
+                                         window=window, chunksize=chunksize)
+            metrics.instrument_module(dpf, exclude=ROW_FUNCTIONS)
+        error = None
+        try:
+            return self._run(filter_year, hazard, match_mode, window, output_dir, dpi, fmt,
+                             render, chunksize, plot_workers, allow_download)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            self._progress = None
+            if metrics is not None:
+                metrics.restore_module(dpf)
+                metrics.end_run(run_span, error=error)
+
+    def _run(self, filter_year, hazard, match_mode, window, output_dir, dpi, fmt, render, chunksize,
+             plot_workers, allow_download):
+        """Body of run(), see there."""
+        merge_keys = ["Impact_Type", "Event_ID", "Administrative_Area_GID"]
+        if chunksize:
+            #4-6---------- Streaming mode: same steps, chunk by chunk
+            L3_TC_year_aggregated, L2_filter = self.stream(filter_year, hazard, chunksize)
+            self._report("merge")
         else:
-            continue
-    
-        df = pd.read_sql(f"SELECT * FROM {table_name};", conn)
-        df["source_table"] = table_name
-        L2.setdefault(category, []).append(df)
-    
-    # Get only Deaths, Injuries and Damage
-    for category in L2:
-        L2[category] = pd.concat(L2[category], ignore_index=True)
-    
-    L2_Deaths = dpf.clean_dataframe(L2.get("Deaths"))
-    L2_Injuries = dpf.clean_dataframe(L2.get("Injuries"))
-    L2_Damage = dpf.clean_dataframe(L2.get("Damage"))
-    
-    #---- Using  Event_ID from ‘L3_*_1900_aggregated’ filter the events from ’ L2_*`, name as ‘L2_*_filter`
-    #Extract Event ID from L3
-    L3_deaths_ids = L3_Deaths_TC_1900_aggregated["Event_ID"].unique()
-    L3_injuries_ids = L3_Injuries_Damage_TC_1900_aggregated["Event_ID"].unique()
-    L3_damage_ids = L3_Damage_TC_1900_aggregated["Event_ID"].unique()
-    
-    #Filter L2 using these Event_ID's from L3
-    L2_Deaths_filter = L2_Deaths[L2_Deaths["Event_ID"].isin(L3_deaths_ids)].copy()
-    L2_Injuries_filter = L2_Injuries[L2_Injuries["Event_ID"].isin(L3_injuries_ids)].copy()
-    L2_Damage_filter = L2_Damage[L2_Damage["Event_ID"].isin(L3_damage_ids)].copy()
-    
-    #----Using Administrative Area of L3_aggregated and L2_filter, get the same GIS and compute the difference between each impact category 
-    # Equation is (‘L3_*_1900_aggregated’/ ‘L2_*_filter`)/ ‘L2_*_filter`.
-    
-    
-    # --- Rename L2 GID column to match L3, AreaS to Area (more prone to error if not changed)
-    L2_Deaths_filter = L2_Deaths_filter.rename(columns={"Administrative_Areas_GID": "Administrative_Area_GID"})
-    L2_Injuries_filter = L2_Injuries_filter.rename(columns={"Administrative_Areas_GID": "Administrative_Area_GID"})
-    L2_Damage_filter = L2_Damage_filter.rename(columns={"Administrative_Areas_GID": "Administrative_Area_GID"})
-    
-    # --- Merge L3 and L2 ---
-    merged_deaths = L3_Deaths_TC_1900_aggregated.merge(
-        L2_Deaths_filter,
-        on=["Event_ID", "Administrative_Area_GID"],
-        suffixes=("_L3", "_L2")
-    )
-    
-    merged_injuries = L3_Injuries_Damage_TC_1900_aggregated.merge(
-        L2_Injuries_filter,
-        on=["Event_ID", "Administrative_Area_GID"],
-        suffixes=("_L3", "_L2")
-    )
-    
-    merged_damage = L3_Damage_TC_1900_aggregated.merge(
-        L2_Damage_filter,
-        on=["Event_ID", "Administrative_Area_GID"],
-        suffixes=("_L3", "_L2")
-    )
-    
-    # --- Keep only the required columns (including both GIDs) ---
-    cols_to_keep = [
-        "Event_ID",
-        "Administrative_Area_GID",
-        "Num_Min_L3", "Num_Max_L3", "Num_Approx_L3",
-        "Num_Min_L2", "Num_Max_L2", "Num_Approx_L2"
-    ]
-    
-    merged_deaths = merged_deaths[cols_to_keep].copy()
-    merged_injuries = merged_injuries[cols_to_keep].copy()
-    merged_damage = merged_damage[cols_to_keep].copy()
-    
-    # Compute relative differences
-    impact_columns = ["Num_Min", "Num_Max", "Num_Approx"]
-    
-    for col in impact_columns:
-        merged_deaths[f"{col}_rel_diff"] = dpf.rel_diff_between_data_levels(merged_deaths, col)
-        merged_injuries[f"{col}_rel_diff"] = dpf.rel_diff_between_data_levels(merged_injuries, col)
-        merged_damage[f"{col}_rel_diff"] = dpf.rel_diff_between_data_levels(merged_damage, col)
-    
-    # Compute average relative difference per category
-    avg_rel_diff_deaths = merged_deaths[[c for c in merged_deaths.columns if "rel_diff" in c]].mean()
-    avg_rel_diff_injuries = merged_injuries[[c for c in merged_injuries.columns if "rel_diff" in c]].mean()
-    avg_rel_diff_damage = merged_damage[[c for c in merged_damage.columns if "rel_diff" in c]].mean()
-    
-    # --- Task 7
-    
-    # Load EM-DAT Excel file
-    emdat = pd.read_excel(os.path.join(project_root, 'Data', 'EMDAT.xlsx'),sheet_name="EM-DAT Data")
-    
-    emdat = emdat[[
-        "ISO",
-        "Start Year", "Start Month",
-        "End Year", "End Month", 'Total Deaths', 'No. Injured', "Total Damage ('000 US$)", "Total Damage, Adjusted ('000 US$)"
-    ]].copy()
-    
-    cols_for_matching = [
-        "Event_ID",
-        "Administrative_Area_GID",
-        "Start_Date_Year", "Start_Date_Month",
-        "End_Date_Year", "End_Date_Month",
-        "Num_Min", "Num_Max", "Num_Approx"
-    ]
-    
-    L2_Deaths_match = L2_Deaths_filter[cols_for_matching].copy()
-    L2_Injuries_match = L2_Injuries_filter[cols_for_matching].copy()
-    L2_Damage_match = L2_Damage_filter[cols_for_matching].copy()
-    
-    match_deaths = L2_Deaths_match.merge(
-        emdat,
-        left_on=["Administrative_Area_GID", "Start_Date_Year", "Start_Date_Month", "End_Date_Year", "End_Date_Month"],
-        right_on=["ISO", "Start Year", "Start Month", "End Year", "End Month"],
-        how="inner")
-    
-    match_injuries = L2_Injuries_match.merge(
-        emdat,
-        left_on=["Administrative_Area_GID", "Start_Date_Year", "Start_Date_Month", "End_Date_Year", "End_Date_Month"],
-        right_on=["ISO", "Start Year", "Start Month", "End Year", "End Month"],
-        how="inner")
-    
-    match_damage = L2_Damage_match.merge(
-        emdat,
-        left_on=["Administrative_Area_GID", "Start_Date_Year", "Start_Date_Month", "End_Date_Year", "End_Date_Month"],
-        right_on=["ISO", "Start Year", "Start Month", "End Year", "End Month"],
-        how="inner")
-    
-    cols_final = [
-        "Event_ID",
-        "ISO",
-        "Administrative_Area_GID",
-        "Start_Date_Year", "Start_Date_Month",
-        "End_Date_Year", "End_Date_Month",
-        "Start Year", "Start Month", "End Year", "End Month",
-        "Num_Min", "Num_Max", "Num_Approx",
-        "Total Deaths",
-        "No. Injured",
-        "Total Damage ('000 US$)",
-        "Total Damage, Adjusted ('000 US$)"]
-    
-    match_deaths = match_deaths[cols_final].copy()
-    match_injuries = match_injuries[cols_final].copy()
-    match_damage = match_damage[cols_final].copy()
-    
-    EM_DAT_Wikimapcts_Matched = pd.concat(
-        [match_deaths, match_injuries, match_damage],
-        ignore_index=True)
-    
-    
-    # --- Execute for each Category ---
-    
-    print("Processing Deaths...")
-    match_deaths_processed = dpf.process_and_plot_impacts(
-        match_deaths, 
-        category_name="Deaths", 
-        emdat_col="Total Deaths"
-    )
-    
-    print("Processing Injuries...")
-    match_injuries_processed = dpf.process_and_plot_impacts(
-        match_injuries, 
-        category_name="Injuries", 
-        emdat_col="No. Injured"
-    )
-    
-    print("Processing Damage...")
-    match_damage_processed = dpf.process_and_plot_impacts(
-        match_damage, 
-        category_name="Damage", 
-        emdat_col="Total Damage, Adjusted ('000 US$)"
-    )
-    
-        # Task 8 spatial map
-    print("Processing Spatial Map...")
-    spatial_path = dpf.process_and_plot_spatial_differences(
-        emdat,
-        L2_Deaths_filter,
-        L2_Injuries_filter,
-        L2_Damage_filter
-    )
-
-    image_dir = os.path.join(project_root, 'Images')
-    return {
-        "Deaths": os.path.join(image_dir, "EM_DAT_Wikimpacts_Deaths_comparison.png"),
-        "Injuries": os.path.join(image_dir, "EM_DAT_Wikimpacts_Injuries_comparison.png"),
-        "Damage": os.path.join(image_dir, "EM_DAT_Wikimpacts_Damage_comparison.png"), 
-        "Spatial": os.path.join(image_dir, "EM_DAT_Wikimpacts_Spatial_Global_comparison.png")}
+            L3 = self.prepare_L3(hazard)
+            L2 = self.prepare_L2(hazard)
+            
+            # Every step runs once over the long frames; 'Impact_Type' keeps the
+            # Deaths, Injuries and Damage rows apart where it matters
+            
+            #4---------- Filtering by year (dates were already filled from L1)
+            self._report("filter")
+            L3_TC_year = dpf.FilterPlan().after_year(filter_year).apply(L3)
+            
+            #5---------- Aggregate by Administrative Area
+            self._report("merge")
+            L3_TC_year_aggregated = dpf.aggregate_by_eventID(L3_TC_year, group_cols=merge_keys)
+            
+            #6---------- Using (Impact_Type, Event_ID) from L3_aggregated filter the events from L2
+            # --- Same categories on both sides, so the keys stay categorical
+            L3_TC_year_aggregated, L2 = schema.align_categories(
+                L3_TC_year_aggregated, L2, ["Event_ID", "Administrative_Area_GID"])
+            L2_filter = dpf.semi_join(L2, L3_TC_year_aggregated, ["Impact_Type", "Event_ID"])
+    
+        #----Using Administrative Area of L3_aggregated and L2_filter, get the same GIS and compute the difference between each impact category 
+        # Equation is (‘L3_*_1900_aggregated’/ ‘L2_*_filter`)/ ‘L2_*_filter`.
+    
+        # --- Merge L3 and L2 ---
+        merged = L3_TC_year_aggregated.merge(
+            L2_filter,
+            on=merge_keys,
+            suffixes=("_L3", "_L2")
+        )
+    
+        # --- Keep only the required columns (including both GIDs) ---
+        cols_to_keep = [
+            "Impact_Type",
+            "Event_ID",
+            "Administrative_Area_GID",
+            "Num_Min_L3", "Num_Max_L3", "Num_Approx_L3",
+            "Num_Min_L2", "Num_Max_L2", "Num_Approx_L2"
+        ]
+        merged = merged[cols_to_keep].copy()
+    
+        # Compute relative differences
+        impact_columns = ["Num_Min", "Num_Max", "Num_Approx"]
+        for col in impact_columns:
+            merged[f"{col}_rel_diff"] = dpf.rel_diff_between_data_levels(merged, col)
+    
+        # Compute average relative difference per impact type
+        avg_rel_diff = (merged.groupby("Impact_Type", observed=True)
+                        [[c for c in merged.columns if "rel_diff" in c]].mean())
+    
+        # --- Task 7
+        self._report("match")
+    
+        # EM-DAT is read once and kept by the pipeline
+        emdat = self.emdat()
+    
+        cols_for_matching = [
+            "Impact_Type",
+            "Event_ID",
+            "Administrative_Area_GID",
+            "Start_Date_Year", "Start_Date_Month",
+            "End_Date_Year", "End_Date_Month",
+            "Num_Min", "Num_Max", "Num_Approx"
+        ]
+        L2_match = L2_filter[cols_for_matching].copy()
+    
+        # One sorted EM-DAT index, probed once for every impact type
+        # (fuzzy mode: best match within the window)
+        emdat_index = self.emdat_index(match_mode, window)
+        matched = emdat_index.match(L2_match, by="Impact_Type")
+        print(emdat_index.report())
+    
+        cols_final = [
+            "Impact_Type",
+            "Event_ID",
+            "ISO",
+            "Administrative_Area_GID",
+            "Start_Date_Year", "Start_Date_Month",
+            "End_Date_Year", "End_Date_Month",
+            "Start Year", "Start Month", "End Year", "End Month",
+            "Num_Min", "Num_Max", "Num_Approx",
+            "Total Deaths",
+            "No. Injured",
+            "Total Damage ('000 US$)",
+            "Total Damage, Adjusted ('000 US$)"]
+        EM_DAT_Wikimapcts_Matched = matched[cols_final].copy()
+    
+        # --- Compare every impact type with its EM-DAT column, in one pass ---
+        print("Processing impacts...")
+        impacts = dpf.compute_impacts_by_type(EM_DAT_Wikimapcts_Matched, emdat_ingest.EMDAT_IMPACT_COLUMNS)
+    
+            # Task 8 spatial map
+        print("Processing Spatial Map...")
+        spatial_comparison = dpf.spatial_comparison(emdat, L2_filter)
+
+        # Numbers of the last run, for callers that do not need the figures
+        self.results = dict(impacts, Spatial=spatial_comparison)
+        if not render:
+            return {}
+
+        # The figures are drawn in parallel worker processes
+        self._report("plot")
+        import plot_rendering  # matplotlib is only loaded when something is drawn
+
+        output_dir = output_dir or os.path.join(self.project_root, 'Images')
+        image_paths = {impact_type: plot_rendering.image_path(impact_type, output_dir, fmt)
+                       for impact_type in impacts}
+        jobs = [plot_rendering.impact_job(impact_type, counts, image_paths[impact_type], dpi)
+                for impact_type, (_, counts) in impacts.items()]
+        # Last, so a missing or broken country layer only costs the map
+        try:
+            world_map = dpf.spatial_world_map(spatial_comparison, self.countries(allow_download))
+        except (ImportError, OSError, RuntimeError, ValueError) as exc:
+            self.failed_figures["Spatial"] = f"{type(exc).__name__}: {exc}"
+            print(f"Spatial map not drawn: {self.failed_figures['Spatial']}")
+        else:
+            image_paths["Spatial"] = plot_rendering.image_path("Spatial_Global", output_dir, fmt)
+            jobs.append(plot_rendering.spatial_job(world_map, image_paths["Spatial"], dpi))
+        # Figures whose data did not change are served from the figure cache
+        plot_rendering.render_all(jobs, max_workers=plot_workers,
+                                  cache_dir=os.path.join(self.cache_dir, 'plots'))
+        return image_paths
+
+# Shared by every run_analysis call, so repeated runs reuse the cached stages
+PIPELINE = AnalysisPipeline()
+
+
+def run_analysis(filter_year, hazard="Tropical Storm/Cyclone", match_mode="exact", window=1,
+                 output_dir=None, dpi=300, fmt="png", render=True, progress=None, chunksize=None,
+                 plot_workers=None, allow_download=True):
+    """
+    Run the EM-DAT vs Wikimpacts comparison for one year threshold.
+
+    Args:
+        filter_year (int): Keep L3 rows whose start year is after this year.
+        hazard (str): Main_Event to analyse.
+        match_mode (str): 'exact' or 'fuzzy' EM-DAT matching.
+        window (int): Tolerance in months of the fuzzy mode.
+        output_dir (str, optional): Folder of the figures. Defaults to Images/.
+        dpi (int): Resolution of the figures.
+        fmt (str): File format of the figures.
+        render (bool): Draw the figures; if False only PIPELINE.results is filled.
+        progress (callable, optional): Called with the name of each stage as it starts.
+        chunksize (int, optional): Stream the impact tables this many rows at
+            a time, for databases that do not fit in memory.
+        plot_workers (int, optional): Processes drawing the figures.
+        allow_download (bool): Download the country layer of the map if
+            there is no local copy.
+
+    Returns:
+        dict: Impact type ('Deaths', 'Injuries', 'Damage') or 'Spatial' -> image path.
+
+    To measure the runs, set ``PIPELINE.metrics = pipeline_metrics.PipelineMetrics()``.
+    """
+    return PIPELINE.run(filter_year, hazard, match_mode, window, output_dir, dpi, fmt, render,
+                        progress, chunksize, plot_workers, allow_download)
+
+
 if __name__ == "__main__":
-    run_analysis()
\ No newline at end of file
+    # Headless runs and year sweeps: same options as analysis_cli.py, e.g. --years 1900:2020:10
+    import sys
+    import analysis_cli
+    sys.exit(analysis_cli.main())
@@ -1,3 +1,4 @@
+import logging
 import sqlite3
 import pandas as pd
 import data_processing_functions as dpf
@@ -5,6 +6,9 @@ import os
 import geopandas as gpd
 import matplotlib.pyplot as plt
 
+# Show the GID cleaning report of dpf.clean_dataframe (DEBUG adds the column diagnostics)
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
 # Task 1------- Connecting to Data base using dynamic paths
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
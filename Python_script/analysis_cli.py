@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Headless command line of the analysis, with year-threshold sweeps.
+
+    python analysis_cli.py --years 1900
+    python analysis_cli.py --years 1900:2020 --workers 8 --output-dir /data/sweeps/nightly
+    python analysis_cli.py --years 1900:2000:10 2005 --hazards "Tropical Storm/Cyclone" Flood
+    python analysis_cli.py --list-hazards
+    python analysis_cli.py --years 1990 --offline --project-root /data/impact_project
+
+For every hazard, the stages that do not depend on the year threshold (DB
+load, event filter, GID cleaning, EM-DAT index) run once in this process.
+The year-dependent tail (year filter, aggregation, L3/L2 merge, EM-DAT
+match, figures) then runs for every year in a pool of worker processes
+that start from these stages. Each run writes its figures, numbers and log
+to <output-dir>/<hazard>/year_<year>/, and sweep.json lists every run.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import WORKINGFILE_PhiRu_FUNCTION as backend
+
+DEFAULT_HAZARD = "Tropical Storm/Cyclone"
+
+_WORKER_PIPELINE = None  # pipeline of a worker process, see _init_worker
+
+
+def parse_years(specs):
+    """
+    Expand year thresholds given as single years, lists and ranges.
+
+    Args:
+        specs (list of str): e.g. ["1900:2020:10", "1995,2005"]. A range
+            'start:stop' or 'start:stop:step' includes stop.
+
+    Returns:
+        list of int: The distinct years, sorted.
+
+    Raises:
+        ValueError: For a malformed spec or a step that is not positive.
+    """
+    years = set()
+    for spec in specs:
+        for part in str(spec).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if ":" not in part:
+                years.add(int(part))
+                continue
+            bounds = [int(bound) for bound in part.split(":")]
+            if len(bounds) not in (2, 3):
+                raise ValueError(f"Year range {part!r} is not start:stop or start:stop:step.")
+            start, stop, step = bounds if len(bounds) == 3 else bounds + [1]
+            if step <= 0:
+                raise ValueError(f"Year range {part!r} needs a positive step.")
+            years.update(range(start, stop + 1, step))
+    return sorted(years)
+
+
+def hazard_slug(hazard):
+    """Folder name of a hazard type, e.g. 'Tropical Storm/Cyclone' -> 'Tropical_Storm_Cyclone'."""
+    return re.sub(r"[^0-9A-Za-z]+", "_", hazard).strip("_")
+
+
+def run_dir(output_dir, hazard, filter_year):
+    """Output folder of one run: <output_dir>/<hazard>/year_<filter_year>."""
+    return os.path.join(output_dir, hazard_slug(hazard), f"year_{filter_year}")
+
+
+def write_results(results, directory):
+    """
+    Write the numbers of a run next to its figures.
+
+    Args:
+        results (dict): AnalysisPipeline.results of the run.
+        directory (str): Output folder of the run.
+
+    Returns:
+        dict: Impact type -> {'matched_rows', 'categories'} (the counts of
+        each difference category, as plotted).
+    """
+    impacts = {}
+    for impact_type, value in results.items():
+        if impact_type == "Spatial":
+            value.to_csv(os.path.join(directory, "spatial_comparison.csv"), index=False)
+            continue
+        matched, counts = value
+        impacts[impact_type] = {"matched_rows": len(matched), "categories": counts}
+    return impacts
+
+
+def run_one(pipeline, task, settings):
+    """
+    Run one (hazard, year) and write its outputs.
+
+    The printed output of the run goes to run.log in its folder, the
+    summary to summary.json. A failing run does not stop the sweep: its
+    summary has status 'error' and the message. A figure that could not be
+    drawn (e.g. no country layer for the map) only fails itself: it is
+    listed under 'failed_figures'.
+
+    Args:
+        pipeline (WORKINGFILE_PhiRu_FUNCTION.AnalysisPipeline): Pipeline
+            holding the shared stages of the hazard.
+        task (tuple): (hazard, filter_year).
+        settings (dict): Options of the sweep, see sweep().
+
+    Returns:
+        dict: Summary with 'hazard', 'filter_year', 'output_dir', 'status',
+        'seconds' and 'impacts' (or 'error'), plus 'failed_figures' if any.
+    """
+    hazard, filter_year = task
+    directory = run_dir(settings["output_dir"], hazard, filter_year)
+    os.makedirs(directory, exist_ok=True)
+    summary = {"hazard": hazard, "filter_year": filter_year, "output_dir": directory}
+    start = time.perf_counter()
+    with open(os.path.join(directory, "run.log"), 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            pipeline.run(filter_year, hazard, settings["match_mode"], settings["window"],
+                         output_dir=directory, dpi=settings["dpi"], fmt=settings["fmt"],
+                         render=settings["render"], chunksize=settings["chunksize"],
+                         plot_workers=1,  # the sweep already keeps every CPU busy
+                         allow_download=settings["allow_download"])
+            summary["status"] = "ok"
+            summary["impacts"] = write_results(pipeline.results, directory)
+            if pipeline.failed_figures:
+                summary["failed_figures"] = dict(pipeline.failed_figures)
+        except Exception as exc:
+            summary["status"] = "error"
+            summary["error"] = f"{type(exc).__name__}: {exc}"
+            traceback.print_exc(file=log)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(directory, "summary.json"), 'w', encoding='utf-8') as fh:
+        json.dump(summary, fh, indent=2)
+    return summary
+
+
+def _init_worker(project_root, stages):
+    """Worker process: a pipeline that starts from the shared stages."""
+    global _WORKER_PIPELINE
+    _WORKER_PIPELINE = backend.AnalysisPipeline(project_root)
+    _WORKER_PIPELINE.use_stages(stages)
+
+
+def _run_in_worker(task, settings):
+    return run_one(_WORKER_PIPELINE, task, settings)
+
+
+def _pool_context():
+    """fork on Linux (the workers inherit the shared stages without copying them), else spawn."""
+    if sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _failed(task, settings, message):
+    hazard, filter_year = task
+    return {"hazard": hazard, "filter_year": filter_year,
+            "output_dir": run_dir(settings["output_dir"], hazard, filter_year),
+            "status": "error", "error": message, "seconds": 0.0}
+
+
+def sweep(hazards, years, settings, workers=None, pipeline=None, log=print):
+    """
+    Run the analysis for every (hazard, year) pair.
+
+    Args:
+        hazards (list of str): Main_Event values to analyse.
+        years (list of int): Year thresholds.
+        settings (dict): 'output_dir', 'match_mode', 'window', 'dpi', 'fmt',
+            'render', 'allow_download' (of the country layer, see
+            AnalysisPipeline.run) and 'chunksize' (streaming mode: nothing
+            is shared, every run reads the tables itself).
+        workers (int, optional): Worker processes. Defaults to the number
+            of CPUs; 1 runs everything in this process.
+        pipeline (WORKINGFILE_PhiRu_FUNCTION.AnalysisPipeline, optional):
+            Pipeline computing the shared stages. Defaults to a new one on
+            the repository.
+        log (callable): Progress output.
+
+    Returns:
+        list of dict: Summaries of the runs (see run_one), by hazard and year.
+    """
+    pipeline = pipeline or backend.AnalysisPipeline()
+    workers = workers or os.cpu_count() or 1
+    total = len(hazards) * len(years)
+    summaries = []
+
+    for hazard in hazards:
+        tasks = [(hazard, filter_year) for filter_year in years]
+        stages = {}
+        if not settings["chunksize"]:
+            log(f"Preparing {hazard} (load, filter, GID cleaning, EM-DAT index) ...")
+            try:
+                stages = pipeline.prepare(hazard, settings["match_mode"], settings["window"])
+            except Exception as exc:
+                message = f"{type(exc).__name__}: {exc}"
+                log(f"{hazard}: preparation failed ({message}), skipped")
+                summaries.extend(_failed(task, settings, message) for task in tasks)
+                continue
+
+        n_workers = min(workers, len(tasks))
+        if n_workers <= 1:
+            done = (run_one(pipeline, task, settings) for task in tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(n_workers, mp_context=_pool_context(),
+                                           initializer=_init_worker,
+                                           initargs=(pipeline.project_root, stages))
+            futures = {executor.submit(_run_in_worker, task, settings): task for task in tasks}
+
+            def collect():
+                for future in as_completed(futures):
+                    try:
+                        yield future.result()
+                    except Exception as exc:  # the worker process died
+                        yield _failed(futures[future], settings, f"{type(exc).__name__}: {exc}")
+            done = collect()
+        try:
+            for summary in done:
+                summaries.append(summary)
+                state = (f"ok in {summary['seconds']:.1f}s" if summary["status"] == "ok"
+                         else f"FAILED ({summary['error']})")
+                if summary.get("failed_figures"):
+                    state += f", not drawn: {', '.join(summary['failed_figures'])}"
+                log(f"[{len(summaries)}/{total}] {summary['hazard']} {summary['filter_year']}: {state}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    order = {hazard: i for i, hazard in enumerate(hazards)}
+    summaries.sort(key=lambda summary: (order[summary["hazard"]], summary["filter_year"]))
+    return summaries
+
+
+def main(argv=None):
+    """Command line entry point; returns the exit code (1 if a run failed)."""
+    parser = argparse.ArgumentParser(
+        description="Run the EM-DAT vs Wikimpacts comparison without the GUI, "
+                    "for one or many year thresholds and hazard types.")
+    parser.add_argument("--years", nargs="+", default=["1900"],
+                        help="year thresholds: years, comma lists or inclusive ranges "
+                             "start:stop[:step], e.g. 1900:2020:10 (default: 1900)")
+    parser.add_argument("--hazards", nargs="+", default=[DEFAULT_HAZARD],
+                        help=f"Main_Event values to analyse (default: {DEFAULT_HAZARD!r})")
+    parser.add_argument("--match-mode", choices=("exact", "fuzzy"), default="exact",
+                        help="EM-DAT matching (default: exact)")
+    parser.add_argument("--window", type=int, default=1,
+                        help="tolerance in months of the fuzzy matching (default: 1)")
+    parser.add_argument("--output-dir",
+                        help="root of the per-run folders (default: Images/sweeps in the project)")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes (default: one per CPU; 1 runs in this process)")
+    parser.add_argument("--dpi", type=int, default=300, help="resolution of the figures (default: 300)")
+    parser.add_argument("--fmt", default="png", help="file format of the figures (default: png)")
+    parser.add_argument("--no-plots", action="store_true", help="only write the numbers")
+    parser.add_argument("--offline", action="store_true",
+                        help="never download the country layer of the spatial map; "
+                             "it must then be in Data/ or Data/cache/geometry")
+    parser.add_argument("--chunksize", type=int,
+                        help="streaming mode: read the impact tables this many rows at a time")
+    parser.add_argument("--project-root", help="folder holding Data/ (default: the repository)")
+    parser.add_argument("--list-hazards", action="store_true",
+                        help="print the Main_Event values of the database and exit")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="log the GID cleaning (-v) and its diagnostics (-vv)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+                        format="%(message)s")
+
+    try:
+        years = parse_years(args.years)
+    except ValueError as exc:
+        parser.error(str(exc))
+    pipeline = backend.AnalysisPipeline(args.project_root)
+    known = pipeline.event_index().hazards()
+    if args.list_hazards:
+        print("\n".join(known))
+        return 0
+    unknown = [hazard for hazard in args.hazards if hazard not in known]
+    if unknown:
+        parser.error(f"unknown hazard(s) {', '.join(map(repr, unknown))}, "
+                     f"choose from {', '.join(map(repr, known))}")
+    output_dir = os.path.abspath(args.output_dir or os.path.join(pipeline.project_root, 'Images', 'sweeps'))
+    settings = {"output_dir": output_dir, "match_mode": args.match_mode, "window": args.window,
+                "dpi": args.dpi, "fmt": args.fmt, "render": not args.no_plots,
+                "allow_download": not args.offline, "chunksize": args.chunksize}
+
+    start = time.perf_counter()
+    summaries = sweep(args.hazards, years, settings, args.workers, pipeline)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "sweep.json"), 'w', encoding='utf-8') as fh:
+        json.dump({"hazards": args.hazards, "years": years, "settings": settings,
+                   "seconds": round(time.perf_counter() - start, 3), "runs": summaries}, fh, indent=2)
+
+    failed = [summary for summary in summaries if summary["status"] != "ok"]
+    print(f"{len(summaries) - len(failed)} of {len(summaries)} runs done in "
+          f"{time.perf_counter() - start:.1f}s, results in {output_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Background analysis jobs for the GUI.
+
+run_analysis runs in a separate worker process, so the Tkinter window never
+waits on it and a stale run can be killed. The worker is kept alive between
+jobs, so its pipeline keeps the cached stages (DB load, GID cleaning, ...).
+Progress is streamed back as events on a queue that the GUI polls.
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+
+import pipeline_metrics
+
+try:  # optional: kills the plot processes of a worker that does not stop in time
+    import psutil
+except ImportError:
+    psutil = None
+
+# Seconds a cancelled worker gets to stop its plot processes before it is killed
+CANCEL_TIMEOUT = 5
+
+# Events put on the event queue by the worker:
+#   ("progress", job_id, stage)   stage: 'load', 'filter', 'clean', 'merge', 'match', 'plot'
+#   ("metrics", job_id, summary)  summary: per-stage timings, see pipeline_metrics.format_summary
+#   ("done", job_id, image_paths)
+#   ("error", job_id, message)
+# and added by the manager itself:
+#   ("cancelled", job_id)
+
+
+def _worker_main(requests, events):
+    """Worker process: run the submitted analyses one after the other."""
+    import WORKINGFILE_PhiRu_FUNCTION as backend  # heavy imports stay in the worker
+
+    def stop(signum, frame):
+        # cancel() -> terminate(): exit normally, so atexit shuts the plot pool down
+        events.cancel_join_thread()  # nobody reads the events of this job any more
+        raise SystemExit(1)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Every run is measured and logged to Data/logs/pipeline_metrics.jsonl
+    backend.PIPELINE.metrics = pipeline_metrics.PipelineMetrics()
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job_id, kwargs = request
+        try:
+            paths = backend.run_analysis(
+                progress=lambda stage: events.put(("progress", job_id, stage)), **kwargs)
+            events.put(("metrics", job_id,
+                        pipeline_metrics.format_summary(backend.PIPELINE.metrics.summary())))
+            events.put(("done", job_id, paths))
+        except Exception as exc:
+            events.put(("error", job_id, f"{type(exc).__name__}: {exc}"))
+
+
+def _kill_children(pid):
+    """Kill the processes started by a process (its plot pool); needs psutil."""
+    if psutil is None:
+        return
+    try:
+        children = psutil.Process(pid).children(recursive=True)
+    except psutil.NoSuchProcess:
+        return
+    for child in children:
+        try:
+            child.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+
+class AnalysisJobManager:
+    """
+    Runs one analysis at a time in a persistent worker process.
+
+    A job submitted while another one runs is queued; if several are
+    submitted meanwhile only the last one is kept (coalesced), and a job
+    identical to the running one is ignored. cancel() stops the worker and
+    its plot processes; a new one is started with the next job.
+
+    All methods are meant to be called from the GUI thread.
+    """
+
+    def __init__(self):
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._requests = None
+        self._events = None
+        self._ids = itertools.count(1)
+        self.current = None  # (job_id, kwargs) of the running job
+        self.pending = None  # kwargs of the job to start next
+
+    @property
+    def busy(self):
+        """True while a job runs or waits."""
+        return self.current is not None or self.pending is not None
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        self._requests = self._context.Queue()
+        self._events = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main, args=(self._requests, self._events), name="analysis-worker")
+        self._process.start()
+
+    def _start(self, kwargs):
+        self._ensure_worker()
+        job_id = next(self._ids)
+        self.current = (job_id, kwargs)
+        self._requests.put((job_id, kwargs))
+        return job_id
+
+    def submit(self, **kwargs):
+        """
+        Ask for an analysis with the keyword arguments of run_analysis.
+
+        Returns:
+            bool: True if the job started or was queued behind the running
+            job, False if it was ignored (identical to the running job).
+        """
+        if self.current is None:
+            self._start(kwargs)
+            return True
+        if kwargs == self.current[1]:
+            self.pending = None
+            return False
+        self.pending = kwargs  # replaces any earlier queued request
+        return True
+
+    def cancel(self):
+        """
+        Stop the running job (and drop the queued one).
+
+        The worker is asked to exit (SIGTERM), which also shuts down its
+        plot processes. If it is still alive after CANCEL_TIMEOUT seconds,
+        it is killed together with its child processes.
+
+        Returns:
+            list: The ("cancelled", job_id) event of the killed job, if any.
+        """
+        self.pending = None
+        if self.current is None:
+            return []
+        job_id = self.current[0]
+        self.current = None
+        self._stop_worker(kill=True)
+        return [("cancelled", job_id)]
+
+    def poll(self):
+        """
+        Collect the events of the running job without blocking.
+
+        Events of jobs that were cancelled are dropped. When a job ends, the
+        queued job (if any) is started.
+
+        Returns:
+            list of tuple: Events, oldest first.
+        """
+        if self._events is None or self.current is None:
+            return []
+        events = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if self.current is None or event[1] != self.current[0]:
+                continue
+            events.append(event)
+            if event[0] in ("done", "error"):
+                self.current = None
+
+        if self.current is not None and not self._process.is_alive():
+            # The worker died without reporting (e.g. out of memory)
+            events.append(("error", self.current[0],
+                           f"Analysis process exited with code {self._process.exitcode}"))
+            self.current = None
+
+        if self.current is None and self.pending is not None:
+            kwargs, self.pending = self.pending, None
+            self._start(kwargs)
+        return events
+
+    def _stop_worker(self, kill=False):
+        if self._process is None:
+            return
+        if kill:
+            if os.name == "nt":
+                _kill_children(self._process.pid)  # terminate() cannot be handled there
+            self._process.terminate()
+        else:
+            self._requests.put(None)
+        self._process.join(timeout=CANCEL_TIMEOUT)
+        if self._process.is_alive():
+            _kill_children(self._process.pid)
+            self._process.kill()
+            self._process.join()
+        self._process = None
+        self._requests = self._events = None
+
+    def shutdown(self):
+        """Stop the worker process."""
+        self.pending = None
+        self._stop_worker(kill=self.current is not None)
+        self.current = None
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Benchmarks of the analysis pipeline on synthetic impactdb/EM-DAT data.
+
+Run from the Python_script folder:
+
+    python -m benchmarks run                         # 10k, 1M and 10M rows
+    python -m benchmarks run --sizes 10k,1M --repeat 5 -o new.json
+    python -m benchmarks compare old.json new.json   # exit code 1 on a regression
+
+The 10M-row size needs several GB of memory; the generated databases are
+kept in Data/cache/benchmarks and reused by later runs.
+"""
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Command line of the benchmarks: python -m benchmarks {run,compare} ..."""
+import argparse
+import json
+import sys
+
+from benchmarks import bench, synthetic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    run.add_argument("--sizes", default="10k,1M,10M",
+                     help="comma-separated numbers of level-3 rows (default: 10k,1M,10M)")
+    run.add_argument("--only", help="comma-separated benchmarks (default: all of "
+                     + ", ".join(bench.BENCHMARKS) + ")")
+    run.add_argument("--repeat", type=int, default=3, help="timed calls per benchmark (default: 3)")
+    run.add_argument("--seed", type=int, default=0, help="seed of the synthetic data (default: 0)")
+    run.add_argument("--memory", action="store_true",
+                     help="also record the allocation peak of one extra call (tracemalloc)")
+    run.add_argument("--work-dir", help="folder of the generated databases")
+    run.add_argument("-o", "--output", help="JSON report (default: Data/benchmarks/<commit>.json)")
+
+    cmp = commands.add_parser("compare", help="compare two JSON reports")
+    cmp.add_argument("old", help="baseline report")
+    cmp.add_argument("new", help="report to check")
+    cmp.add_argument("--threshold", type=float, default=0.10,
+                     help="relative slow-down counted as a regression (default: 0.10)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = bench.run_benchmarks(
+            sizes=[synthetic.parse_size(size) for size in args.sizes.split(",")],
+            names=args.only.split(",") if args.only else None,
+            repeat=args.repeat, seed=args.seed, trace_memory=args.memory, work_dir=args.work_dir)
+        print(f"Results written to {bench.write_results(report, args.output)}")
+        return 0
+
+    with open(args.old, 'r', encoding='utf-8') as fh:
+        old = json.load(fh)
+    with open(args.new, 'r', encoding='utf-8') as fh:
+        new = json.load(fh)
+    rows = bench.compare(old, new, args.threshold)
+    print(bench.format_comparison(rows))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
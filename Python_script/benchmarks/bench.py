@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Timed benchmarks of data_processing_functions and run_analysis.
+
+Every benchmark times one call on synthetic data (see synthetic.py) of a
+given size, several times; the inputs are prepared outside the timed call.
+The results are written as JSON with the commit and library versions, so
+two runs can be compared with compare().
+"""
+import datetime
+import functools
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data_processing_functions as dpf
+import impactdb_cache as dbc
+import impactdb_loader as loader
+import impactdb_schema as schema
+
+from benchmarks import synthetic
+
+try:  # pyarrow is optional, only reported
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+MERGE_KEYS = ["Impact_Type", "Event_ID", "Administrative_Area_GID"]
+HAZARD = "Tropical Storm/Cyclone"
+FILTER_YEAR = 1900
+RESULTS_FORMAT = 1
+
+
+def default_work_dir():
+    """Return the folder of the generated projects (Data/cache/benchmarks)."""
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(os.path.dirname(script_dir), 'Data', 'cache', 'benchmarks')
+
+
+def default_output_dir():
+    """Return the folder of the result files (Data/benchmarks)."""
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(os.path.dirname(script_dir), 'Data', 'benchmarks')
+
+
+class SyntheticData:
+    """
+    Inputs of the benchmarks at one size, built on first use.
+
+    The frames are those the pipeline has at each step: loaded with the
+    compact dtypes, stacked into long frames keyed by 'Impact_Type'.
+
+    Args:
+        n_rows (int): Number of level-3 rows, see synthetic.iter_tables.
+        seed (int): Seed of the generator.
+        work_dir (str): Folder of the generated project (run_analysis only).
+    """
+
+    def __init__(self, n_rows, seed=0, work_dir=None):
+        self.n_rows = n_rows
+        self.seed = seed
+        self.work_dir = work_dir or default_work_dir()
+
+    @functools.cached_property
+    def tables(self):
+        """Table name -> DataFrame with the compact dtypes."""
+        tables = {}
+        for name, table in synthetic.iter_tables(self.n_rows, self.seed):
+            table = table.drop(columns=[col for col in ("country", "_country") if col in table])
+            tables[name] = schema.apply_schema(table)
+        return tables
+
+    def _stacked(self, family):
+        frames = {loader.table_category(name): table for name, table in self.tables.items()
+                  if dbc.table_family(name) == family and loader.table_category(name)}
+        columns = dbc.PIPELINE_COLUMNS[family]
+        return schema.stack_frames({category: frames[category][columns] for category in frames},
+                                   "Impact_Type", loader.IMPACT_CATEGORIES)
+
+    @functools.cached_property
+    def L1_dates(self):
+        """Event_ID and dates of the events of HAZARD (input of fill_dates)."""
+        L1 = self.tables["Total_Summary_Information"]
+        return L1.loc[L1["Main_Event"] == HAZARD, ["Event_ID"] + dbc.DATE_COLUMNS].reset_index(drop=True)
+
+    @functools.cached_property
+    def L3_tc(self):
+        """Level-3 rows of the HAZARD events, dates not filled, GIDs raw."""
+        return dpf.filter_L3_tc(self._stacked("Specific"), self.L1_dates["Event_ID"].unique())
+
+    @functools.cached_property
+    def gids(self):
+        """Raw level-3 GID strings, one per row (object dtype, as read from SQLite)."""
+        return self.L3_tc["Administrative_Area_GID"].astype(object)
+
+    @functools.cached_property
+    def L3_clean(self):
+        """L3_tc with filled dates and cleaned GIDs (input of aggregate_by_eventID)."""
+        return dpf.clean_dataframe(dpf.fill_dates(self.L3_tc, self.L1_dates, dbc.DATE_COLUMNS))
+
+    @functools.cached_property
+    def merged(self):
+        """n_rows rows of level-3/level-2 numbers (input of rel_diff_between_data_levels)."""
+        rng = np.random.default_rng([self.seed, 2])
+        numbers = synthetic._impact_numbers(self.n_rows, rng)
+        other = synthetic._impact_numbers(self.n_rows, rng, scale=numbers["Num_Max"])
+        return pd.DataFrame({**{f"{col}_L3": values for col, values in numbers.items()},
+                             **{f"{col}_L2": values for col, values in other.items()}})
+
+    @functools.cached_property
+    def project_root(self):
+        """Project folder with the synthetic database and EM-DAT workbook."""
+        root = os.path.join(self.work_dir, f"impactdb_{self.n_rows}_seed{self.seed}")
+        return synthetic.make_project(root, self.n_rows, self.seed)
+
+
+# --- Benchmarks: each returns (prepare, run); run(*prepare()) is timed ---
+def bench_clean_dataframe(data):
+    def prepare():
+        dpf.GID_CACHE.clear()  # every call parses its GIDs
+        return (data.L3_tc,)
+    return prepare, dpf.clean_dataframe
+
+
+def bench_gid_row_wise(data):
+    """Reference of normalize_gids: get_single_valid_gid applied row by row."""
+    return (lambda: (data.gids,)), lambda gids: gids.map(dpf.get_single_valid_gid)
+
+
+def bench_normalize_gids(data):
+    def prepare():
+        dpf.GID_CACHE.clear()
+        return (data.gids,)
+    return prepare, dpf.normalize_gids
+
+
+def bench_aggregate_by_eventID(data):
+    return (lambda: (data.L3_clean,),
+            lambda df: dpf.aggregate_by_eventID(df, group_cols=MERGE_KEYS))
+
+
+def bench_fill_dates(data):
+    return (lambda: (data.L3_tc, data.L1_dates, dbc.DATE_COLUMNS)), dpf.fill_dates
+
+
+def bench_rel_diff_between_data_levels(data):
+    return (lambda: (data.merged, "Num_Max")), dpf.rel_diff_between_data_levels
+
+
+def bench_run_analysis(data):
+    """Whole analysis without the figures, from the on-disk snapshots (built beforehand)."""
+    import WORKINGFILE_PhiRu_FUNCTION as backend
+
+    backend.AnalysisPipeline(data.project_root).run(FILTER_YEAR, HAZARD, render=False)
+
+    def prepare():
+        dpf.GID_CACHE.clear()
+        return (backend.AnalysisPipeline(data.project_root),)
+    return prepare, lambda pipeline: pipeline.run(FILTER_YEAR, HAZARD, render=False)
+
+
+BENCHMARKS = {
+    "clean_dataframe": bench_clean_dataframe,
+    "gid_row_wise": bench_gid_row_wise,
+    "normalize_gids": bench_normalize_gids,
+    "aggregate_by_eventID": bench_aggregate_by_eventID,
+    "fill_dates": bench_fill_dates,
+    "rel_diff_between_data_levels": bench_rel_diff_between_data_levels,
+    "run_analysis": bench_run_analysis,
+}
+
+
+def time_call(prepare, run, repeat=3, trace_memory=False):
+    """
+    Time run(*prepare()) several times.
+
+    Args:
+        prepare (callable): Returns the arguments of run; not timed.
+        run (callable): The timed call.
+        repeat (int): Number of timed calls.
+        trace_memory (bool): Also measure the peak Python allocations of one
+            extra, untimed call with tracemalloc.
+
+    Returns:
+        dict: 'rows' (length of the first DataFrame argument), 'times_s',
+        'min_s', 'median_s' and, with trace_memory, 'alloc_peak_mb'.
+    """
+    times, rows = [], None
+    for _ in range(repeat):
+        args = prepare()
+        rows = next((len(arg) for arg in args if isinstance(arg, (pd.DataFrame, pd.Series))), None)
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+        del args
+
+    result = {"rows": rows, "times_s": [round(t, 6) for t in times],
+              "min_s": round(min(times), 6), "median_s": round(statistics.median(times), 6)}
+    if trace_memory:
+        args = prepare()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(*args)
+            result["alloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def environment():
+    """Commit, library versions and machine of this run."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=30,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    return {"commit": git("rev-parse", "HEAD") or None,
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__,
+            "pyarrow": pyarrow.__version__ if pyarrow is not None else None}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, repeat=3, seed=0, trace_memory=False,
+                   work_dir=None, log=print):
+    """
+    Run the benchmarks at every size.
+
+    Args:
+        sizes (iterable of int): Numbers of level-3 rows.
+        names (list of str, optional): Benchmarks to run. Defaults to all of BENCHMARKS.
+        repeat (int): Timed calls per benchmark and size.
+        seed (int): Seed of the synthetic data.
+        trace_memory (bool): Also record the allocation peak, see time_call.
+        work_dir (str, optional): Folder of the generated projects.
+        log (callable): Progress output, e.g. print; None for silence.
+
+    Returns:
+        dict: {'format', 'environment', 'settings', 'results'} where results
+        is a list of dicts with 'benchmark', 'size' and the timings.
+
+    Raises:
+        KeyError: For an unknown benchmark name.
+    """
+    names = list(names or BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise KeyError(f"Unknown benchmark {name!r}, choose from {', '.join(BENCHMARKS)}")
+
+    results = []
+    for size in sizes:
+        data = SyntheticData(size, seed, work_dir)
+        for name in names:
+            prepare, run = BENCHMARKS[name](data)
+            result = {"benchmark": name, "size": size,
+                      **time_call(prepare, run, repeat, trace_memory)}
+            results.append(result)
+            if log:
+                log(f"{name:<30} {size:>10,} rows  min {result['min_s']:.4f}s  "
+                    f"median {result['median_s']:.4f}s")
+        del data
+        gc.collect()
+    return {"format": RESULTS_FORMAT, "environment": environment(),
+            "settings": {"sizes": list(sizes), "repeat": repeat, "seed": seed,
+                         "generator_version": synthetic.GENERATOR_VERSION},
+            "results": results}
+
+
+def write_results(report, path=None):
+    """
+    Write a run_benchmarks report as JSON.
+
+    Args:
+        report (dict): Output of run_benchmarks.
+        path (str, optional): File to write. Defaults to
+            Data/benchmarks/<short commit>.json (or 'workdir.json').
+
+    Returns:
+        str: The path written.
+    """
+    if path is None:
+        commit = report["environment"]["commit"]
+        name = commit[:10] if commit else "workdir"
+        if report["environment"]["dirty"]:
+            name += "-dirty"
+        path = os.path.join(default_output_dir(), name + ".json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    return path
+
+
+def compare(old, new, threshold=0.10):
+    """
+    Compare two reports benchmark by benchmark.
+
+    The fastest call ('min_s') is compared: it is the least affected by
+    other work on the machine.
+
+    Args:
+        old (dict): Baseline report (run_benchmarks output or loaded JSON).
+        new (dict): Report to check.
+        threshold (float): Relative slow-down counted as a regression
+            (0.10: more than 10% slower).
+
+    Returns:
+        list of dict: One row per (benchmark, size) present in both reports,
+        with 'old_s', 'new_s', 'ratio' (new / old) and 'regression'.
+    """
+    baseline = {(r["benchmark"], r["size"]): r for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = baseline.get((result["benchmark"], result["size"]))
+        if before is None:
+            continue
+        ratio = result["min_s"] / before["min_s"] if before["min_s"] else float("inf")
+        rows.append({"benchmark": result["benchmark"], "size": result["size"],
+                     "old_s": before["min_s"], "new_s": result["min_s"],
+                     "ratio": round(ratio, 4), "regression": ratio > 1 + threshold})
+    return rows
+
+
+def format_comparison(rows):
+    """Text table of compare() rows."""
+    lines = [f"{'benchmark':<30} {'size':>10} {'old s':>10} {'new s':>10} {'ratio':>7}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['benchmark']:<30} {row['size']:>10,} {row['old_s']:>10.4f} "
+                     f"{row['new_s']:>10.4f} {row['ratio']:>7.2f}{flag}")
+    return "\n".join(lines)
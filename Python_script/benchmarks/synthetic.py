@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Synthetic impactdb and EM-DAT files for the benchmarks.
+
+The real database is not in the repository, so the benchmarks run on
+generated data with the same tables and columns and with the value mixes
+the pipeline has to deal with:
+    - GID strings that are single codes, subdivisions, plain strings,
+      several countries, empty lists, missing or invalid;
+    - level-3 rows without dates (filled from level 1) and partial dates;
+    - level-2 rows of the same events and countries, so the L3/L2 merge
+      and the EM-DAT match find pairs.
+Every value is drawn from a seeded numpy Generator: the same (n_rows, seed)
+always gives the same tables, on every machine.
+"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import emdat_ingest
+import impactdb_cache as dbc
+
+# Bump when the generated data changes, so cached projects are rebuilt
+GENERATOR_VERSION = 2
+
+DB_NAME = "impactdb.v1.0.2.dg_filled.db"
+EMDAT_NAME = "EMDAT.xlsx"
+
+HAZARDS = ["Tropical Storm/Cyclone", "Flood", "Extratropical Storm/Cyclone", "Drought"]
+HAZARD_WEIGHTS = [0.4, 0.3, 0.2, 0.1]
+
+# 'Displaced' is not analysed: its tables must be skipped by the loader
+CATEGORIES = ("Deaths", "Injuries", "Damage", "Displaced")
+
+ISO_CODES = np.array([
+    "USA", "MEX", "CUB", "HTI", "DOM", "JAM", "BHS", "HND", "NIC", "GTM",
+    "CHN", "JPN", "KOR", "PRK", "TWN", "PHL", "VNM", "LAO", "KHM", "THA",
+    "MMR", "BGD", "IND", "LKA", "PAK", "OMN", "YEM", "MDG", "MOZ", "MUS",
+    "AUS", "NZL", "FJI", "VUT", "TON", "WSM", "PNG", "SLB", "CAN", "BMU"], dtype=object)
+
+# Subdivisions per country in the GIDs ('USA.1_1' ... 'USA.30_1')
+SUBDIVISIONS = 30
+
+# GID templates and their share of the rows. {c} country, {o} another
+# country, {k}/{k2} subdivisions, {l} country in lower case; None is a
+# missing cell.
+L3_GID_TEMPLATES = [
+    ("['{c}']", 0.35),
+    ("['{c}.{k}_1']", 0.20),
+    ("{c}", 0.08),
+    ("['{c}', '{o}']", 0.10),            # several countries: rejected
+    ("['{c}.{k}_1', '{c}.{k2}_1']", 0.05),  # several codes: rejected
+    ("[]", 0.05),
+    (None, 0.05),
+    ("['X{k}']", 0.05),                   # invalid code
+    ("['{l}']", 0.04),
+    ('["{c}"]', 0.03),
+]
+L2_GID_TEMPLATES = [
+    ("[['{c}']]", 0.35),
+    ("[['{c}.{k}_1'], ['{o}']]", 0.20),
+    ("[['{c}.{k}_1']]", 0.15),
+    ("[['{c}', '{o}']]", 0.10),          # several countries in the first list: rejected
+    ("[['{c}'], ['{o}']]", 0.05),
+    ("[]", 0.05),
+    (None, 0.05),
+    ("[['X{k}']]", 0.05),
+]
+
+# EM-DAT has tens of thousands of records, whatever the size of the impactdb
+EMDAT_ROWS = 25_000
+
+
+def parse_size(text):
+    """Turn '10k', '1M' or '250000' into a number of rows."""
+    text = str(text).strip().upper().replace("_", "")
+    scale = {"K": 1_000, "M": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("KM")) * scale)
+
+
+def _gid_vocabulary(templates):
+    """Every string of the templates, indexed by (template, country, subdivision)."""
+    n = len(ISO_CODES)
+    vocab = []
+    for template, _ in templates:
+        for c in range(n):
+            for k in range(1, SUBDIVISIONS + 1):
+                if template is None:
+                    vocab.append(None)
+                    continue
+                vocab.append(template.format(
+                    c=ISO_CODES[c], o=ISO_CODES[(c + 1) % n], l=ISO_CODES[c].lower(),
+                    k=k, k2=k % SUBDIVISIONS + 1))
+    return np.array(vocab, dtype=object)
+
+
+_VOCABULARY = {}
+
+
+def gid_strings(countries, rng, instance=False):
+    """
+    Raw GID strings for rows of the given countries.
+
+    Args:
+        countries (numpy.ndarray): Position in ISO_CODES of each row's country.
+        rng (numpy.random.Generator): Source of randomness.
+        instance (bool): Level-2 (nested list) strings instead of level-3 ones.
+
+    Returns:
+        numpy.ndarray: Object array of strings and None.
+    """
+    templates = L2_GID_TEMPLATES if instance else L3_GID_TEMPLATES
+    if instance not in _VOCABULARY:
+        _VOCABULARY[instance] = _gid_vocabulary(templates)
+    weights = np.array([weight for _, weight in templates])
+    template = rng.choice(len(templates), size=len(countries), p=weights / weights.sum())
+    subdivision = rng.integers(SUBDIVISIONS, size=len(countries))
+    position = (template * len(ISO_CODES) + countries) * SUBDIVISIONS + subdivision
+    return _VOCABULARY[instance][position]
+
+
+def _with_missing(values, rng, share):
+    """Nullable integer copy of values with a share of missing entries."""
+    values = pd.array(values, dtype="Int64")
+    values[rng.random(len(values)) < share] = pd.NA
+    return values
+
+
+def make_events(n_events, rng):
+    """
+    Level-1 events: Event_ID, Main_Event, dates and a country.
+
+    Returns:
+        pandas.DataFrame: One row per event with the Total_Summary_Information
+        columns and 'country' (position in ISO_CODES, not written to the db).
+    """
+    start_year = rng.integers(1880, 2024, size=n_events)
+    start_month = rng.integers(1, 13, size=n_events)
+    end = start_month - 1 + rng.integers(0, 3, size=n_events)  # lasts up to two more months
+    events = pd.DataFrame({
+        "Event_ID": np.char.add("E", np.char.zfill(np.arange(n_events).astype(str), 7)).astype(object),
+        "Event_Names": "synthetic",
+        "Main_Event": rng.choice(HAZARDS, size=n_events, p=HAZARD_WEIGHTS).astype(object),
+        "Hazards": "synthetic",
+        "Start_Date_Year": pd.array(start_year, dtype="Int64"),
+        "Start_Date_Month": _with_missing(start_month, rng, 0.10),
+        "Start_Date_Day": _with_missing(rng.integers(1, 29, size=n_events), rng, 0.30),
+        "End_Date_Year": pd.array(start_year + end // 12, dtype="Int64"),
+        "End_Date_Month": _with_missing(end % 12 + 1, rng, 0.10),
+        "End_Date_Day": _with_missing(rng.integers(1, 29, size=n_events), rng, 0.50),
+    })
+    events["country"] = rng.integers(len(ISO_CODES), size=n_events)
+    return events
+
+
+def _impact_numbers(n_rows, rng, scale=None):
+    """Num_Min/Num_Max/Num_Approx columns, with missing values and zeros."""
+    base = rng.lognormal(3.0, 2.0, size=n_rows) if scale is None else scale
+    base = np.where(rng.random(n_rows) < 0.05, 0.0, np.floor(base))
+    numbers = {
+        "Num_Min": base,
+        "Num_Max": np.floor(base * (1 + rng.random(n_rows))),
+        "Num_Approx": np.round(base * (0.8 + 0.4 * rng.random(n_rows))),
+    }
+    for col, share in (("Num_Min", 0.2), ("Num_Max", 0.2), ("Num_Approx", 0.5)):
+        numbers[col] = np.where(rng.random(n_rows) < share, np.nan, numbers[col])
+    return numbers
+
+
+def specific_table(events, n_rows, rng):
+    """
+    Level-3 rows (Specific_Instance_Per_Administrative_Area_* table).
+
+    A quarter of the rows have no dates at all (the pipeline fills them
+    from level 1); 15% of the GIDs name another country than the event's.
+    """
+    event = rng.integers(len(events), size=n_rows)
+    countries = events["country"].to_numpy()[event]
+    countries = np.where(rng.random(n_rows) < 0.15, rng.integers(len(ISO_CODES), size=n_rows), countries)
+    table = pd.DataFrame({
+        "Event_ID": events["Event_ID"].to_numpy()[event],
+        "Administrative_Area_Norm": ISO_CODES[countries],
+        "Administrative_Area_GID": gid_strings(countries, rng),
+    })
+    no_dates = rng.random(n_rows) < 0.25
+    for col in dbc.DATE_COLUMNS:
+        values = events[col].array.take(event)
+        values[no_dates] = pd.NA
+        table[col] = values
+    table = table.assign(**_impact_numbers(n_rows, rng))
+    table["Num_Unit"] = "synthetic"
+    table["_country"] = countries  # dropped before writing, used for the level-2 rows
+    return table
+
+
+def instance_table(specific, n_rows, rng):
+    """
+    Level-2 rows (Instance_Per_Administrative_Areas_* table).
+
+    Rows repeat the event and country of random level-3 rows, with impact
+    numbers that differ from level 3 by a random factor.
+    """
+    source = rng.integers(len(specific), size=n_rows)
+    countries = specific["_country"].to_numpy()[source]
+    table = pd.DataFrame({
+        "Event_ID": specific["Event_ID"].to_numpy()[source],
+        "Administrative_Areas_Norm": ISO_CODES[countries],
+        "Administrative_Areas_GID": gid_strings(countries, rng, instance=True),
+    })
+    for col in dbc.DATE_COLUMNS:
+        table[col] = specific[col].array.take(source)
+    scale = np.nan_to_num(specific["Num_Max"].to_numpy()[source], nan=10.0)
+    return table.assign(**_impact_numbers(n_rows, rng, scale=scale * rng.lognormal(0.0, 0.5, size=n_rows)))
+
+
+def iter_tables(n_rows, seed=0):
+    """
+    Generate the tables of a synthetic impactdb, one at a time.
+
+    Args:
+        n_rows (int): Total number of level-3 rows, split evenly between the
+            impact categories. Level 2 gets half as many rows, level 1 one
+            event per 20 level-3 rows.
+        seed (int): Seed of the generator.
+
+    Yields:
+        tuple: (table name, DataFrame), Total tables first.
+    """
+    rng = np.random.default_rng(seed)
+    events = make_events(max(100, n_rows // 20), rng)
+    yield "Total_Summary_Information", events
+    yield "Total_Deaths", pd.DataFrame({"Event_ID": events["Event_ID"], **_impact_numbers(len(events), rng)})
+
+    per_table = -(-n_rows // len(CATEGORIES))
+    for category in CATEGORIES:
+        specific = specific_table(events, per_table, rng)
+        yield f"Specific_Instance_Per_Administrative_Area_{category}", specific
+        yield f"Instance_Per_Administrative_Areas_{category}", instance_table(specific, per_table // 2, rng)
+
+
+def emdat_frame(events, n_rows=EMDAT_ROWS, seed=0):
+    """
+    EM-DAT records of random events (all hazard types), in the workbook layout.
+
+    Each record is a different event, so a small database gets one record
+    per event rather than many copies of the same ones.
+
+    Args:
+        events (pandas.DataFrame): Events from make_events.
+        n_rows (int): Number of records, at most one per event.
+        seed (int): Seed of the generator.
+
+    Returns:
+        pandas.DataFrame: 'DisNo.', 'Disaster Type' and the EMDAT_COLUMNS.
+    """
+    rng = np.random.default_rng([seed, 1])
+    n_rows = min(n_rows, len(events))
+    event = np.sort(rng.choice(len(events), size=n_rows, replace=False))
+    numbers = _impact_numbers(n_rows, rng)
+    damage = np.where(rng.random(n_rows) < 0.5, np.nan, rng.lognormal(8.0, 2.0, size=n_rows))
+    emdat = pd.DataFrame({
+        "DisNo.": [f"{i:07d}" for i in range(n_rows)],
+        "Disaster Type": events["Main_Event"].to_numpy()[event],
+        "ISO": ISO_CODES[events["country"].to_numpy()[event]],
+        "Start Year": events["Start_Date_Year"].array.take(event),
+        "Start Month": events["Start_Date_Month"].array.take(event),
+        "End Year": events["End_Date_Year"].array.take(event),
+        "End Month": events["End_Date_Month"].array.take(event),
+        "Total Deaths": numbers["Num_Max"],
+        "No. Injured": np.where(rng.random(n_rows) < 0.6, np.nan, numbers["Num_Min"]),
+        "Total Damage ('000 US$)": damage,
+        "Total Damage, Adjusted ('000 US$)": damage * 1.3,
+    })
+    return emdat
+
+
+def write_impactdb(path, n_rows, seed=0):
+    """
+    Write a synthetic impactdb SQLite file.
+
+    Args:
+        path (str): File to create (replaced if it exists).
+        n_rows (int): Number of level-3 rows, see iter_tables.
+        seed (int): Seed of the generator.
+
+    Returns:
+        pandas.DataFrame: The level-1 events (for write_emdat).
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    events = None
+    with sqlite3.connect(path) as conn:
+        for table_name, table in iter_tables(n_rows, seed):
+            if events is None:
+                events = table
+            table = table.drop(columns=[col for col in ("country", "_country") if col in table])
+            table.to_sql(table_name, conn, index=False, chunksize=100_000)
+    conn.close()
+    return events
+
+
+def write_emdat(path, events, n_rows=EMDAT_ROWS, seed=0):
+    """Write a synthetic EM-DAT workbook (needs openpyxl, as pandas.read_excel)."""
+    n_rows = min(n_rows, 1_048_575)  # rows of an Excel sheet
+    emdat_frame(events, n_rows, seed).to_excel(path, sheet_name=emdat_ingest.SHEET_NAME, index=False)
+
+
+def make_project(root, n_rows, seed=0):
+    """
+    Create (or reuse) a project folder with a synthetic database and EM-DAT.
+
+    The folder has the layout expected by AnalysisPipeline(project_root):
+    Data/impactdb.v1.0.2.dg_filled.db and Data/EMDAT.xlsx. Files generated
+    earlier with the same size, seed and GENERATOR_VERSION are kept.
+
+    Args:
+        root (str): Project folder.
+        n_rows (int): Number of level-3 rows, see iter_tables.
+        seed (int): Seed of the generator.
+
+    Returns:
+        str: root.
+    """
+    data_dir = os.path.join(root, 'Data')
+    manifest_path = os.path.join(data_dir, 'synthetic.json')
+    manifest = {"version": GENERATOR_VERSION, "n_rows": n_rows, "seed": seed}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as fh:
+            if json.load(fh) == manifest:
+                return root
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(data_dir, exist_ok=True)
+    events = write_impactdb(os.path.join(data_dir, DB_NAME), n_rows, seed)
+    write_emdat(os.path.join(data_dir, EMDAT_NAME), events, seed=seed)
+    with open(manifest_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+    return root
@@ -7,10 +7,23 @@ Created on Thu Dec 18 18:33:01 2025
 import numpy as np
 import pandas as pd
 import ast # This library turns string "[...]" into list [...]
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
-import geopandas as gpd
+import logging
+import re
+from collections import OrderedDict
+from impactdb_schema import align_categories, concat_frames
+from impactdb_events import EventIndex
+
+logger = logging.getLogger(__name__)
+
+
+class _Lazy:
+    """Log argument computed only if the record is emitted, e.g. _Lazy(df.head)."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return str(self.func())
 
 # ------------ USED IN TASK 3 ------------ 
 def filter_L3_tc(df, tc_events):
@@ -18,12 +31,14 @@ def filter_L3_tc(df, tc_events):
     Filter a DataFrame to include only level-3 tropical cyclone events.
 
     The function selects rows whose 'Event_ID' is present in the provided
-    list of tropical cyclone event identifiers.
+    list of tropical cyclone event identifiers. With an EventIndex the
+    membership test is a binary search in its sorted Event_IDs.
 
     Args:
         df (pandas.DataFrame): Input DataFrame containing an 'Event_ID' column.
-        tc_events (list or set): Collection of Event_IDs corresponding to
-            level-3 tropical cyclone events.
+        tc_events (list, set or impactdb_events.EventIndex): Collection of
+            Event_IDs corresponding to level-3 tropical cyclone events, e.g.
+            ``event_index.for_hazard("Tropical Storm/Cyclone")``.
 
     Returns:
         pandas.DataFrame: Filtered DataFrame containing only rows associated
@@ -32,6 +47,8 @@ def filter_L3_tc(df, tc_events):
     Raises:
         KeyError: If the 'Event_ID' column is not present in the DataFrame.
     """
+    if isinstance(tc_events, EventIndex):
+        return df[tc_events.contains(df["Event_ID"])].copy()
     return df[df["Event_ID"].isin(tc_events)].copy()
 
 def fill_dates(L3_tc, L1_TC_dates, date_cols):
@@ -40,22 +57,34 @@ def fill_dates(L3_tc, L1_TC_dates, date_cols):
 
     The function merges level-3 tropical cyclone data with level-1 reference
     dates on 'Event_ID'. For each specified date column, missing values in the
-    level-3 data are filled using the corresponding level-1 values.
+    level-3 data are filled using the corresponding level-1 values. With an
+    EventIndex the dates are looked up in its arrays instead of merged.
 
     Args:
         L3_tc (pandas.DataFrame): Level-3 event data containing date columns
             and an 'Event_ID' column.
-        L1_TC_dates (pandas.DataFrame): Level-1 reference data providing
-            fallback date values, keyed by 'Event_ID'.
+        L1_TC_dates (pandas.DataFrame or impactdb_events.EventIndex): Level-1
+            reference data providing fallback date values, keyed by 'Event_ID'.
         date_cols (list of str): List of date column names to be filled.
 
     Returns:
         pandas.DataFrame: DataFrame with missing level-3 date values filled
-        using level-1 reference dates.
+        using level-1 reference dates. Column dtypes (categorical Event_ID,
+        nullable integer dates) are preserved.
 
     Raises:
         KeyError: If required columns are missing from the input DataFrames.
     """
+    if isinstance(L1_TC_dates, EventIndex):
+        positions = L1_TC_dates.lookup(L3_tc["Event_ID"])
+        filled = L3_tc.copy()
+        for col in date_cols:
+            fallback = pd.Series(L1_TC_dates.date_values(col, positions), index=filled.index)
+            filled[col] = filled[col].fillna(fallback)
+        return filled
+
+    # Same categories on both sides, otherwise the merged Event_ID turns into object
+    L3_tc, L1_TC_dates = align_categories(L3_tc, L1_TC_dates, ["Event_ID"])
     merged = L3_tc.merge(L1_TC_dates, on="Event_ID", how="left", suffixes=("", "_L1"))
     for col in date_cols:
         merged[col] = merged[col].fillna(merged[f"{col}_L1"])
@@ -69,8 +98,7 @@ def filter_year(df, year):
     Filter a DataFrame to include only rows after a specified year.
 
     The function keeps rows where the 'Start_Date_Year' value is strictly
-    greater than the provided year. If the year is not an integer, the
-    function prints an error message and returns nothing.
+    greater than the provided year.
 
     Args:
         df (pandas.DataFrame): DataFrame containing a 'Start_Date_Year' column.
@@ -84,12 +112,119 @@ def filter_year(df, year):
         TypeError: If the year argument is not of type int.
     """
     
-    if type(year) == int:
-        year_mask = df["Start_Date_Year"]>year
-        return df[year_mask].copy()
-    else:
-        print ("Year must be an int data type")
-        
+    if type(year) != int:
+        raise TypeError(f"Year must be an int data type, got {type(year).__name__}")
+    # Missing years (<NA> in nullable integer columns) never pass the filter
+    year_mask = (df["Start_Date_Year"]>year).fillna(False).astype(bool)
+    return df[year_mask].copy()
+
+# ------------ USED IN TASKS 3-4 ------------ 
+class FilterPlan:
+    """
+    Lazy version of the filter_L3_tc -> fill_dates -> filter_year chain.
+
+    The steps are only recorded when they are added. apply() then computes
+    the event mask, looks the missing dates up in the level-1 dates and
+    evaluates the year predicate on the filled years, and materializes a
+    single output frame. Only the kept rows are copied, once.
+
+    Both the event membership and the date lookup go through an EventIndex
+    (binary searches in its sorted Event_IDs); pass one to share it between
+    plans, e.g. one per hazard type.
+
+    Example:
+        plan = FilterPlan().keep_events(tc_events).fill_dates_from(L1_TC_dates, date_cols).after_year(1900)
+        L3_Deaths_TC_1900 = plan.apply(L3_Deaths)
+
+        tc_index = event_index.for_hazard("Tropical Storm/Cyclone")
+        plan = FilterPlan().keep_events(tc_index).fill_dates_from(tc_index, date_cols)
+    """
+
+    def __init__(self):
+        self.events = None
+        self.dates = None
+        self.date_cols = []
+        self.year = None
+
+    def keep_events(self, tc_events):
+        """Keep only rows whose 'Event_ID' is in tc_events (as filter_L3_tc)."""
+        if not isinstance(tc_events, EventIndex):
+            tc_events = EventIndex(pd.DataFrame({"Event_ID": list(tc_events)}), date_cols=[])
+        self.events = tc_events
+        return self
+
+    def fill_dates_from(self, L1_TC_dates, date_cols):
+        """
+        Fill missing date values from the level-1 dates (as fill_dates).
+
+        Unlike the merge in fill_dates, the dates are looked up by Event_ID,
+        so an event listed several times in L1_TC_dates uses its first row
+        instead of duplicating the level-3 rows.
+
+        Args:
+            L1_TC_dates (pandas.DataFrame or impactdb_events.EventIndex):
+                Level-1 dates keyed by 'Event_ID'.
+            date_cols (list of str): Date columns to fill.
+        """
+        if not isinstance(L1_TC_dates, EventIndex):
+            L1_TC_dates = EventIndex(L1_TC_dates, date_cols=date_cols)
+        self.dates = L1_TC_dates
+        self.date_cols = list(date_cols)
+        return self
+
+    def after_year(self, year):
+        """
+        Keep only rows whose (filled) 'Start_Date_Year' is greater than year.
+
+        Raises:
+            TypeError: If year is not an int.
+        """
+        if type(year) != int:
+            raise TypeError("Year must be an int data type")
+        self.year = year
+        return self
+
+    def apply(self, df):
+        """
+        Run the recorded steps on a level-3 DataFrame in one pass.
+
+        Args:
+            df (pandas.DataFrame): Level-3 event data with 'Event_ID' and
+                the date columns.
+
+        Returns:
+            pandas.DataFrame: The kept rows with filled dates (new RangeIndex).
+            Column order and dtypes are those of df.
+        """
+        # 1. Event membership: binary search of every row's event
+        if self.events is None:
+            rows = np.arange(len(df))
+        else:
+            rows = np.flatnonzero(self.events.contains(df["Event_ID"]))
+
+        # 2. Date back-fill: each row's event looked up in the L1 date arrays
+        filled = {}
+        if self.dates is not None:
+            positions = self.dates.lookup(df["Event_ID"].take(rows))
+            for col in self.date_cols:
+                current = df[col].take(rows)
+                fallback = self.dates.date_values(col, positions)
+                filled[col] = current.fillna(pd.Series(fallback, index=current.index))
+
+        # 3. Year predicate on the filled years
+        if self.year is not None:
+            years = filled.get("Start_Date_Year", df["Start_Date_Year"].take(rows))
+            keep = (years > self.year).fillna(False).to_numpy(dtype=bool)
+            rows = rows[keep]
+            filled = {col: values[keep] for col, values in filled.items()}
+
+        # 4. Single materialization of the surviving rows
+        out = df.take(rows)
+        out.index = pd.RangeIndex(len(out))
+        for col, values in filled.items():
+            out[col] = values.array
+        return out
+
 # ------------ USED IN TASK 5 ------------ 
 def get_single_valid_gid(gid_entry):#Checks every single GID at a time
     """
@@ -112,9 +247,26 @@ def get_single_valid_gid(gid_entry):#Checks every single GID at a time
         ValueError: If the input cannot be converted to a list using ast.literal_eval.
     """
 #Handle empty or missing cells -> return NaN
-    if gid_entry is None or (isinstance(gid_entry, float) and np.isnan(gid_entry)):
+    if _is_missing_gid(gid_entry):
         return np.nan 
 
+    valid_codes = _valid_gid_codes(_gid_elements(gid_entry))
+
+    # 5. Enforce "Single Valid GID"
+    #    Only accept rows with EXACTLY ONE valid country code
+    if len(valid_codes) == 1:
+        return valid_codes[0]  # Return the clean code (ex: 'CHN')
+    else:
+        return np.nan  # If zero or multiple codes found -> discard row
+
+
+def _is_missing_gid(gid_entry):
+    """True for an empty cell (None or NaN)."""
+    return gid_entry is None or (isinstance(gid_entry, float) and np.isnan(gid_entry))
+
+
+def _gid_elements(gid_entry):
+    """Steps 1-3 of get_single_valid_gid: the raw entry as a flat list of strings."""
     #Convert strings that LOOK like lists into real Python lists
         #Examples:
             #    "['USA']"      -> ['USA']
@@ -149,7 +301,11 @@ def get_single_valid_gid(gid_entry):#Checks every single GID at a time
                 flat_list.append(e)
         # Convert all elements to strings and remove NaNs
         elements = [str(e) for e in flat_list if pd.notna(e)]
+    return elements
 
+
+def _valid_gid_codes(elements):
+    """Step 4 of get_single_valid_gid: the valid 3-letter codes among the elements."""
     # 4. Extract valid 3-letter country codes
     valid_codes = []  # Start an empty list to store valid country codes
     
@@ -164,15 +320,396 @@ def get_single_valid_gid(gid_entry):#Checks every single GID at a time
         # Must be exactly 3 letters AND contain only letters
         if len(code) == 3 and code.isalpha():
             valid_codes.append(code)
+    return valid_codes
 
-    # 5. Enforce "Single Valid GID"
-    #    Only accept rows with EXACTLY ONE valid country code
-    if len(valid_codes) == 1:
-        return valid_codes[0]  # Return the clean code (ex: 'CHN')
+
+def get_single_valid_gid_instance(gid_entry):
+    """
+    Extract a single valid 3-letter country GID from a raw level-2 entry.
+
+    Level-2 (Instance) entries hold a list of lists, e.g. "[['USA'], ['MEX']]".
+    Only the first inner list is kept before applying get_single_valid_gid.
+
+    Args:
+        gid_entry (str, list, or None): Raw administrative areas identifier.
+
+    Returns:
+        str or numpy.nan: A single cleaned 3-letter country code, otherwise np.nan.
+
+    Raises:
+        ValueError: If a string entry is not a valid Python literal.
+    """
+    return get_single_valid_gid(_instance_entry(gid_entry))
+
+
+def _instance_entry(gid_entry):
+    """Keep the first inner list of a level-2 entry, as get_single_valid_gid input."""
+    # Convert string "[['USA']]" -> [['USA']]
+    if isinstance(gid_entry, str):
+        gid_entry = ast.literal_eval(gid_entry)
+    # Flatten [['USA']] -> ['USA']
+    if isinstance(gid_entry, list) and len(gid_entry) > 0:
+        gid_entry = gid_entry[0]
+    # Convert 'USA' -> "['USA']" (string)
+    if isinstance(gid_entry, str):
+        gid_entry = str([gid_entry])
+    return gid_entry
+
+
+# Building blocks of the list literals found in the GID columns.
+# Anything that does not match them exactly is handed to the row-wise functions above.
+_WS = r"[ \t\n\r\f]*"  # whitespace allowed inside brackets by the Python tokenizer
+_GID_ITEM = r"""(?:'[^'\\\n\r]*'|"[^"\\\n\r]*")"""  # 'USA' or "USA", no escapes
+_GID_ITEM_CAPTURE = r"""'([^'\\\n\r]*)'|"([^"\\\n\r]*)\""""
+_GID_INNER_LIST = rf"\[{_WS}(?:{_GID_ITEM}(?:{_WS},{_WS}{_GID_ITEM})*{_WS},?)?{_WS}\]"
+_GID_ELEMENT = rf"(?:{_GID_ITEM}|{_GID_INNER_LIST})"
+_GID_LIST_LITERAL = rf"[ \t]*\[{_WS}(?:{_GID_ELEMENT}(?:{_WS},{_WS}{_GID_ELEMENT})*{_WS},?)?{_WS}\]{_WS}"
+_GID_FIRST_ELEMENT = rf"^[ \t]*\[{_WS}({_GID_ELEMENT})"
+
+
+def _valid_codes(items):
+    """Return the cleaned 3-letter code of each item, or NaN where it is not valid."""
+    codes = items.str.strip().str[:3].str.upper()
+    valid = (codes.str.len() == 3) & codes.str.isalpha()
+    return codes.where(valid)
+
+
+def _single_code_per_group(items, groups, n_groups):
+    """Keep the code of each group that contains exactly one valid code."""
+    codes = _valid_codes(items)
+    found = codes.notna().to_numpy()
+    counts = np.bincount(groups[found], minlength=n_groups)
+    result = np.full(n_groups, np.nan, dtype=object)
+    single = counts[groups[found]] == 1
+    result[groups[found][single]] = codes.to_numpy()[found][single]
+    return result
+
+
+def _list_items(literals):
+    """Extract every quoted item of the list literals, with the literal's position."""
+    items = literals.reset_index(drop=True).str.extractall(_GID_ITEM_CAPTURE)
+    # One of the two quote styles matched; both are NaN for an empty item ('' or "")
+    values = pd.Series(np.where(items[0].notna(), items[0], items[1].fillna("")), dtype=object)
+    return values, items.index.get_level_values(0).to_numpy(dtype=np.int64)
+
+
+def _normalize_strings(strings, instance):
+    """Normalize distinct raw GID strings; returns an object array aligned with them."""
+    row_wise = get_single_valid_gid_instance if instance else get_single_valid_gid
+    result = np.full(len(strings), np.nan, dtype=object)
+    has_bracket = strings.str.contains("[", regex=False).to_numpy(dtype=bool)
+    is_list = has_bracket & strings.str.fullmatch(_GID_LIST_LITERAL).to_numpy(dtype=bool)
+
+    # 1. Plain strings such as "USA" or "AUS.10": the whole string is the only element
+    if not instance:
+        result[~has_bracket] = _valid_codes(strings[~has_bracket]).to_numpy()
+
+    # 2. List literals: count the valid codes among the flattened elements
+    list_literals = strings[is_list]
+    if instance:
+        # Keep only the first element: either 'USA' or ['USA', 'USA.1_1']
+        list_literals = list_literals.str.extract(_GID_FIRST_ELEMENT, expand=False).fillna("[]")
+    items, groups = _list_items(list_literals)
+    result[is_list] = _single_code_per_group(items, groups, len(list_literals))
+
+    # 3. Everything else goes through the row-wise function
+    handled = is_list if instance else (is_list | ~has_bracket)
+    for i in np.flatnonzero(~handled):
+        result[i] = row_wise(strings.iat[i])
+    return result
+
+
+class GidCache:
+    """
+    Bounded LRU table of already parsed GID strings.
+
+    Raw 'Administrative_Area(s)_GID' strings repeat heavily, both within a
+    table and between runs, so their parsed code is kept keyed on the raw
+    string. When the table is full, the least recently used entry is dropped.
+
+    Args:
+        maxsize (int): Maximum number of raw strings kept.
+    """
+
+    def __init__(self, maxsize=200_000):
+        self.maxsize = maxsize
+        self._table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._table)
+
+    def lookup(self, keys):
+        """
+        Look up several keys at once.
+
+        Args:
+            keys (list): Keys to look up, as (raw string, instance flag) tuples.
+
+        Returns:
+            tuple: (values, found) object array of cached codes and boolean
+            mask of the keys that were cached.
+        """
+        values = np.full(len(keys), np.nan, dtype=object)
+        found = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            if key in self._table:
+                self._table.move_to_end(key)
+                values[i] = self._table[key]
+                found[i] = True
+        n_found = int(found.sum())
+        self.hits += n_found
+        self.misses += len(keys) - n_found
+        return values, found
+
+    def store(self, keys, values):
+        """Add parsed codes to the table, evicting the oldest entries if needed."""
+        if self.maxsize <= 0:
+            return
+        for key, value in zip(keys, values):
+            self._table[key] = value
+            self._table.move_to_end(key)
+        while len(self._table) > self.maxsize:
+            self._table.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return the hit/miss counters as a dict."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._table), "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Empty the table and reset the counters."""
+        self._table.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+# Shared by every clean_dataframe call (L2 and L3, all categories, repeated runs)
+GID_CACHE = GidCache()
+
+
+def normalize_gids(values, instance=False, cache=GID_CACHE):
+    """
+    Vectorized version of get_single_valid_gid for a whole GID column.
+
+    Every distinct raw value is parsed at most once: strings already seen
+    are served from the shared GidCache, the others are parsed together.
+    List literals made of quoted codes (e.g. "['USA']",
+    "[['CHN.12_1'], ['MEX']]") and plain strings (e.g. "USA") are handled
+    with regex extraction over the pandas string accessor; anything else
+    (escapes, other Python literals, non-string values) falls back to the
+    row-wise function, so the accept/reject rules are exactly the ones of
+    get_single_valid_gid.
+
+    Args:
+        values (pandas.Series): Raw 'Administrative_Area_GID' or
+            'Administrative_Areas_GID' values.
+        instance (bool): True for level-2 (Instance) columns, which are
+            parsed with get_single_valid_gid_instance.
+        cache (GidCache or None): Table of parsed strings. None disables it.
+
+    Returns:
+        pandas.Series: Cleaned 3-letter country codes (object dtype) with
+        np.nan for rejected entries, aligned with ``values``.
+
+    Raises:
+        ValueError: In instance mode, if a string entry is not a valid
+            Python literal (same as get_single_valid_gid_instance).
+    """
+    row_wise = get_single_valid_gid_instance if instance else get_single_valid_gid
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _normalize_categorical(values, instance, cache)
+    try:
+        positions, uniques = pd.factorize(values, use_na_sentinel=True)
+    except TypeError:  # unhashable entries (real lists): no shortcut possible
+        return values.apply(row_wise).astype(object)
+
+    uniques = np.asarray(uniques, dtype=object)
+    result = np.full(len(uniques), np.nan, dtype=object)
+    is_str = np.array([type(u) is str for u in uniques], dtype=bool)
+
+    # 1. Strings: served from the cache, the missing ones are parsed together
+    str_positions = np.flatnonzero(is_str)
+    keys = [(u, instance) for u in uniques[is_str]]
+    if cache is not None:
+        cached, found = cache.lookup(keys)
     else:
-        return np.nan  # If zero or multiple codes found -> discard row
+        cached, found = np.full(len(keys), np.nan, dtype=object), np.zeros(len(keys), dtype=bool)
+    result[str_positions[found]] = cached[found]
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        parsed = _normalize_strings(pd.Series(uniques[str_positions[missing]], dtype=object), instance)
+        result[str_positions[missing]] = parsed
+        if cache is not None:
+            cache.store([keys[i] for i in missing], parsed)
+
+    # 2. Other values (lists, numbers, ...) go through the row-wise function
+    for i in np.flatnonzero(~is_str):
+        result[i] = row_wise(uniques[i])
+
+    cleaned = np.full(len(positions), np.nan, dtype=object)
+    present = positions >= 0
+    cleaned[present] = result[positions[present]]
+    return pd.Series(cleaned, index=values.index, name=values.name, dtype=object)
+
+
+def _normalize_categorical(values, instance, cache):
+    """normalize_gids for a categorical column: only the categories are parsed."""
+    categories = normalize_gids(pd.Series(values.cat.categories, dtype=object), instance, cache)
+    new_categories = pd.Index(categories.dropna().unique()).sort_values()
+    # Old category code -> new category code (-1 for rejected GIDs)
+    recode = np.full(len(categories) + 1, -1, dtype=np.int64)
+    valid = categories.notna().to_numpy()
+    recode[:-1][valid] = new_categories.get_indexer(categories[valid])
+    codes = recode[values.cat.codes.to_numpy()]  # code -1 (missing) hits the trailing -1
+    cleaned = pd.Categorical.from_codes(codes, categories=new_categories)
+    return pd.Series(cleaned, index=values.index, name=values.name)
+
+
+# Why a GID entry is rejected by get_single_valid_gid(_instance):
+#   'missing'   empty cell or empty list
+#   'multiple'  more than one valid 3-letter code
+#   'invalid'   no valid code (e.g. "12", "['U S']") or not a valid literal
+REJECTION_REASONS = ("missing", "multiple", "invalid")
+
+
+def gid_rejection_reason(gid_entry, instance=False):
+    """
+    Tell why a raw GID entry has no single valid code.
+
+    Args:
+        gid_entry (str, list, or None): Raw entry rejected by normalize_gids.
+        instance (bool): True for level-2 (Instance) entries.
+
+    Returns:
+        str: One of REJECTION_REASONS.
+    """
+    if _is_missing_gid(gid_entry) or gid_entry is pd.NA:
+        return "missing"
+    try:
+        if instance:
+            gid_entry = _instance_entry(gid_entry)
+        elements = _gid_elements(gid_entry)
+    except (ValueError, SyntaxError, TypeError):
+        return "invalid"
+    if not elements:
+        return "missing"
+    return "multiple" if len(_valid_gid_codes(elements)) > 1 else "invalid"
+
+
+def count_gid_rejections(values, instance=False):
+    """
+    Count rejected GID entries per reason.
+
+    Every distinct raw value is classified once (for a categorical column,
+    every category), so the cost depends on the number of distinct rejected
+    values, not on the number of rows.
+
+    Args:
+        values (pandas.Series): Raw GID values of the rejected rows.
+        instance (bool): True for level-2 (Instance) columns.
+
+    Returns:
+        dict: Reason (see REJECTION_REASONS) -> number of rows.
+    """
+    counts = dict.fromkeys(REJECTION_REASONS, 0)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, distinct = values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+    else:
+        try:
+            codes, distinct = pd.factorize(values, use_na_sentinel=True)
+        except TypeError:  # unhashable entries (real lists)
+            codes, distinct = np.arange(len(values)), values.to_numpy(dtype=object)
+    counts["missing"] += int((codes < 0).sum())
+    rows = np.bincount(codes[codes >= 0], minlength=len(distinct))
+    used = np.flatnonzero(rows)
+    distinct, rows = distinct[used], rows[used]
+
+    is_str = np.array([type(value) is str for value in distinct], dtype=bool)
+    reasons = np.empty(len(distinct), dtype=object)
+    reasons[is_str] = _rejection_reasons(pd.Series(distinct[is_str], dtype=object), instance)
+    for i in np.flatnonzero(~is_str):
+        reasons[i] = gid_rejection_reason(distinct[i], instance)
+    for reason in REJECTION_REASONS:
+        counts[reason] += int(rows[reasons == reason].sum())
+    return counts
+
+
+def _rejection_reasons(strings, instance):
+    """gid_rejection_reason for distinct rejected strings, list literals vectorized."""
+    reasons = np.full(len(strings), "invalid", dtype=object)
+    has_bracket = strings.str.contains("[", regex=False).to_numpy(dtype=bool)
+    is_list = has_bracket & strings.str.fullmatch(_GID_LIST_LITERAL).to_numpy(dtype=bool)
+
+    # 1. List literals: no element -> missing, several valid codes -> multiple
+    list_literals = strings[is_list]
+    if instance:
+        list_literals = list_literals.str.extract(_GID_FIRST_ELEMENT, expand=False).fillna("[]")
+    items, groups = _list_items(list_literals)
+    n_items = np.bincount(groups, minlength=len(list_literals))
+    n_valid = np.bincount(groups[_valid_codes(items).notna().to_numpy()], minlength=len(list_literals))
+    reasons[is_list] = np.where(n_items == 0, "missing", np.where(n_valid > 1, "multiple", "invalid"))
+
+    # 2. Plain level-3 strings hold a single element, so a rejected one is invalid;
+    #    everything else goes through the row-wise function
+    rest = ~is_list if instance else (has_bracket & ~is_list)
+    for i in np.flatnonzero(rest):
+        reasons[i] = gid_rejection_reason(strings.iat[i], instance)
+    return reasons
+
+
+class RejectionStats:
+    """
+    Running totals of the rows dropped by the GID cleaning, per column and reason.
+
+    Cheap enough to stay on in production: only rejected rows are
+    classified, once per distinct value (see count_gid_rejections).
+    """
+
+    def __init__(self):
+        self.rows_in = {}   # column -> rows cleaned
+        self.dropped = {}   # column -> {reason: rows dropped}
+
+    def record(self, column, rows_in, counts):
+        """Add the counts of one cleaned frame (or chunk)."""
+        self.rows_in[column] = self.rows_in.get(column, 0) + rows_in
+        totals = self.dropped.setdefault(column, dict.fromkeys(REJECTION_REASONS, 0))
+        for reason, n in counts.items():
+            totals[reason] += n
+
+    def stats(self):
+        """
+        Return the totals as a dict.
+
+        Returns:
+            dict: 'rows_in', 'dropped' and one entry per reason, summed over
+            the columns, plus 'by_column': column -> the same for that column.
+        """
+        def totals(columns):
+            counts = {reason: sum(self.dropped[col][reason] for col in columns)
+                      for reason in REJECTION_REASONS}
+            return {"rows_in": sum(self.rows_in[col] for col in columns),
+                    "dropped": sum(counts.values()), **counts}
+
+        columns = list(self.rows_in)
+        return {**totals(columns), "by_column": {col: totals([col]) for col in columns}}
+
+    def clear(self):
+        """Reset the counters."""
+        self.rows_in = {}
+        self.dropped = {}
+
 
-def clean_dataframe(df):
+# Default counters of clean_dataframe / drop_invalid_gids: shared and never
+# reset, pass a RejectionStats of your own for per-run figures
+GID_REJECTIONS = RejectionStats()
+
+
+def clean_dataframe(df, stats=GID_REJECTIONS):
     
     """
     Clean and standardize the administrative area GID column in a DataFrame.
@@ -183,9 +720,16 @@ def clean_dataframe(df):
     to obtain a single valid GID per row, and removes rows with invalid or
     missing GID values.
 
+    The dropped rows are counted per reason in stats and reported on the
+    module logger at INFO level; the column diagnostics are only formatted
+    when DEBUG is enabled.
+
     Args:
         df (pandas.DataFrame): Input DataFrame containing administrative area
             identifier columns and event-level data.
+        stats (RejectionStats or None): Where the dropped rows are counted,
+            e.g. the per-run counters of AnalysisPipeline. Defaults to
+            GID_REJECTIONS; None skips the counting.
 
     Returns:
         pandas.DataFrame: Cleaned DataFrame with a standardized administrative
@@ -201,73 +745,169 @@ def clean_dataframe(df):
     # 1. IDENTIFY THE COLUMN
     if 'Administrative_Area_GID' in df_clean.columns:
         target_col = 'Administrative_Area_GID'
-
-        print("TARGET COLUMN:", target_col)
-        print("FIRST VALUES:\n", df_clean[target_col].head())
-        print("COLUMN DTYPE:", df_clean[target_col].dtype)
-        print("PYTHON TYPE OF VALUE:", type(df_clean[target_col].iloc[2]))
-
     elif 'Administrative_Areas_GID' in df_clean.columns:
         target_col = 'Administrative_Areas_GID'
+    else:
+        logger.error("Neither GID column found.")
+        return df_clean
 
-        #Step 1: Convert string "[['USA']]" -> [['USA']]
-        df_clean[target_col] = df_clean[target_col].apply(
-            lambda x: ast.literal_eval(x) if isinstance(x, str) else x
-        )
+    # Debug: what we are dealing with (only formatted when DEBUG is on)
+    logger.debug("Detected column: %s (dtype %s, first value of type %s)\nFirst values:\n%s",
+                 target_col, df_clean[target_col].dtype,
+                 _Lazy(lambda: _first_value_type(df_clean[target_col])),
+                 _Lazy(df_clean[target_col].head))
+    rows_before = len(df_clean)
+    
+    # A-B. Clean the GID column and drop the rows without a single valid GID
+    df_clean, counts = _drop_invalid_gids(df_clean, target_col)
+    if stats is not None:
+        stats.record(target_col, rows_before, counts)
+    
+    logger.info("%s: kept %d of %d rows (dropped: %d missing, %d multiple codes, %d invalid format)",
+                target_col, len(df_clean), rows_before,
+                counts["missing"], counts["multiple"], counts["invalid"])
+    return df_clean
 
-        #Step 2: Flatten [['USA']] -> ['USA']
-        df_clean[target_col] = df_clean[target_col].apply(
-            lambda x: x[0] if isinstance(x, list) and len(x) > 0 else x
-        )
 
-        #Step 3: Convert ['USA'] -> "['USA']" (string)
-        df_clean[target_col] = df_clean[target_col].apply(
-            lambda x: str([x]) if isinstance(x, str) else x
-        )
+def _first_value_type(values):
+    """Python type of the first non-missing value, or None for an all-missing column."""
+    present = values.dropna()
+    return type(present.iloc[0]) if len(present) else None
 
-        print("TARGET COLUMN:", target_col)
-        print("FIRST VALUES:\n", df_clean[target_col].head())
-        print("COLUMN DTYPE:", df_clean[target_col].dtype)
-        print("PYTHON TYPE OF VALUE:", type(df_clean[target_col].iloc[2]))
 
-    else:
-        print("Error: Neither GID column found.")
-        return df_clean
+def drop_invalid_gids(df, target_col, stats=GID_REJECTIONS):
+    """
+    Normalize a GID column and drop the rows without a single valid GID.
 
-    #return df_clean
-    
-    # Debug: Confirm which column is being used
-    print(f"Detected column: {target_col}")
-    
-    # Debug: Print before cleaning to see what we are dealing with
-    print(f"Rows before cleaning: {len(df_clean)}")
-    
+    This is the cleaning step of clean_dataframe, without its logging, for
+    callers that clean many small frames (e.g. the chunks of the streaming
+    mode). The dropped rows are still counted.
+
+    Args:
+        df (pandas.DataFrame): Frame to clean; modified in place.
+        target_col (str): 'Administrative_Area_GID' or 'Administrative_Areas_GID'.
+        stats (RejectionStats or None): Where the dropped rows are counted.
+            None skips the counting.
+
+    Returns:
+        pandas.DataFrame: The rows with a valid GID.
+    """
+    rows_before = len(df)
+    df, counts = _drop_invalid_gids(df, target_col, count=stats is not None)
+    if stats is not None:
+        stats.record(target_col, rows_before, counts)
+    return df
+
+
+def _drop_invalid_gids(df, target_col, count=True):
+    """drop_invalid_gids returning (rows kept, rejection counts or None)."""
+    instance = target_col == 'Administrative_Areas_GID'
+    raw = df[target_col]
     # A. Clean the GID column
-    # Apply the complex cleaning function to every row in the 'Administrative_Area_GID' column
-    df_clean[target_col] = df_clean[target_col].apply(get_single_valid_gid) 
+    # Vectorized get_single_valid_gid (level 2 keeps only the first inner list, [['USA']] -> ['USA'])
+    df[target_col] = normalize_gids(raw, instance=instance)
     
     # B. Filter out the NaNs
     # Remove any row where the GID cleaning process returned NaN (discarding bad/multiple GID rows)
-    df_clean = df_clean.dropna(subset=[target_col]) 
-    
-    # Debug: Print after cleaning
-    print(f"Rows after cleaning: {len(df_clean)}")
-    return df_clean
+    counts = None
+    if count:
+        counts = count_gid_rejections(raw[df[target_col].isna().to_numpy()], instance)
+    return df.dropna(subset=[target_col]), counts
+
+
+# Impact columns summed by aggregate_by_eventID; every other column keeps its first value
+SUM_COLUMNS = ['Num_Min', 'Num_Max', 'Num_Approx']
 
 
-def aggregate_by_eventID(df_clean):
+def group_codes(df, group_cols, sort=True):
+    """
+    Factorize the key combinations of a DataFrame into integer group numbers.
+
+    Args:
+        df (pandas.DataFrame): Rows to group.
+        group_cols (list of str): Key columns.
+        sort (bool): Number the groups in sorted key order, as groupby does
+            (categorical keys in category order). If False, in order of
+            first occurrence.
+
+    Returns:
+        tuple: (codes, n_groups). codes is an int64 array with the group of
+        every row, -1 for rows with a missing key (dropped, as by groupby).
+    """
+    n_rows = len(df)
+    key_codes = [pd.factorize(df[col], sort=sort)[0] for col in group_cols]
+    missing = np.zeros(n_rows, dtype=bool)
+    for col_codes in key_codes:
+        missing |= col_codes < 0
+    kept = ~missing
+
+    # Pack the keys into one int64 (mixed radix, first key most significant),
+    # so sorting the packed numbers sorts the key combinations
+    combined = np.zeros(int(kept.sum()), dtype=np.int64)
+    bound = 1
+    for col_codes in key_codes:
+        kept_codes = col_codes[kept]
+        radix = int(kept_codes.max(initial=0)) + 1
+        if bound * radix >= 2 ** 62:
+            # Would overflow: renumber the combinations seen so far first
+            combined, uniques = pd.factorize(combined, sort=sort)
+            bound = max(len(uniques), 1)
+        combined = combined * radix + kept_codes
+        bound *= radix
+    # Only the unique combinations are sorted, never the rows
+    combined, uniques = pd.factorize(combined, sort=sort)
+
+    codes = np.full(n_rows, -1, dtype=np.int64)
+    codes[kept] = combined
+    return codes, len(uniques)
+
+
+def _first_rows(codes, n_groups, mask=None):
+    """Position of the first row of every group (among the mask rows), -1 if none."""
+    valid = codes >= 0 if mask is None else (codes >= 0) & mask
+    positions = np.flatnonzero(valid)
+    first = np.full(n_groups, -1, dtype=np.int64)
+    # Assigned in reverse: the earliest position of each group is written last
+    first[codes[positions[::-1]]] = positions[::-1]
+    return first
+
+
+def _group_sum(values, codes, n_groups):
+    """Sum a numeric column per group, skipping missing values as groupby.sum() does."""
+    valid = codes >= 0
+    data = values.to_numpy(dtype='float64', na_value=np.nan)
+    data = np.where(np.isnan(data), 0.0, data)
+    # astype: bincount returns int64 for empty input, even with weights
+    sums = np.bincount(codes[valid], weights=data[valid], minlength=n_groups).astype('float64')
+    if pd.api.types.is_integer_dtype(values.dtype):
+        # Integer impacts stay integers (nullable ones keep their dtype)
+        return pd.array(np.rint(sums).astype(np.int64), dtype=values.dtype)
+    return sums
+
+
+def aggregate_by_eventID(df_clean, group_cols=None, sort=True):
     
     """
     Aggregate event-level data while preventing unintended summation of date fields.
 
-    The function groups the input DataFrame by event ID and administrative area,
-    applying column-specific aggregation rules. Numerical impact columns are summed,
-    while all other columns retain their first observed value to avoid invalid
-    aggregations (e.g., adding years).
+    The function groups the input DataFrame by event ID and administrative area.
+    Numerical impact columns (SUM_COLUMNS) are summed, while all other columns
+    retain their first non-missing value to avoid invalid aggregations
+    (e.g., adding years).
+
+    The keys are factorized into integer group numbers once; the sums are
+    np.bincount calls and the other columns are taken in one go at the first
+    row of every group, so text columns are never reduced group by group.
+    The result is the same as groupby(...).agg({...: 'sum', ...: 'first'}).
 
     Args:
         df_clean (pandas.DataFrame): Cleaned DataFrame containing event-level data
             with numerical impact columns and metadata.
+        group_cols (list of str, optional): Grouping keys. Defaults to
+            ['Event_ID', 'Administrative_Area_GID']; prepend 'Impact_Type' to
+            aggregate several impact types in one pass.
+        sort (bool): Return the groups sorted by key, as groupby does. False
+            keeps them in order of first occurrence, which skips the sorting.
 
     Returns:
         pandas.DataFrame: Aggregated DataFrame with one row per event ID and
@@ -276,32 +916,115 @@ def aggregate_by_eventID(df_clean):
     """
     
     # 1. Define the columns we are grouping by
-    group_cols = ['Event_ID', 'Administrative_Area_GID'] # The keys that must be identical to form a group
-    
-    # 2. Create the "Rule Book" for aggregation
-    agg_rules = {} # This dictionary tells Pandas what math to do for each column
-    
-    # Loop through every column to decide what to do with it
-    for col in df_clean.columns:
-        if col in group_cols:
-            continue # Skip the grouping keys—they are handled automatically by groupby
-            
-        # If it is a Numerical Impact column -> SUM it
-        if col in ['Num_Min', 'Num_Max', 'Num_Approx']:
-            agg_rules[col] = 'sum' # Add the numbers together
-            
-        # For Dates and everything else -> KEEP FIRST value
-        # (This prevents adding 1992 + 1992)
-        else:
-            agg_rules[col] = 'first' # Just take the first value found in the group
+    if group_cols is None:
+        group_cols = ['Event_ID', 'Administrative_Area_GID'] # The keys that must be identical to form a group
+
+    # 2. Number the groups: one integer code per row
+    codes, n_groups = group_codes(df_clean, group_cols, sort=sort)
+    first = _first_rows(codes, n_groups)
+
+    # 3. Keys and 'first' columns: a single take at the first row of every group
+    value_cols = [col for col in df_clean.columns if col not in group_cols]
+    first_cols = [col for col in value_cols if col not in SUM_COLUMNS]
+    df_agg = df_clean.take(first).reset_index(drop=True)
+
+    # 'first' skips missing values: where the first row has none, look further
+    for col in first_cols:
+        missing = df_agg[col].isna().to_numpy()
+        if missing.any():
+            present = df_clean[col].notna().to_numpy()
+            first_present = _first_rows(codes, n_groups, mask=present)[missing]
+            found = first_present >= 0
+            if found.any():
+                rows = np.flatnonzero(missing)[found]
+                df_agg.iloc[rows, df_agg.columns.get_loc(col)] = \
+                    df_clean[col].take(first_present[found]).to_numpy()
+
+    # 4. Numerical impact columns -> SUM them (replaces the taken first values)
+    for col in value_cols:
+        if col in SUM_COLUMNS:
+            df_agg[col] = _group_sum(df_clean[col], codes, n_groups)
+
+    # Same column order as the input
+    return df_agg[list(group_cols) + value_cols]
+
+class ChunkAggregator:
+    """
+    aggregate_by_eventID over a table read in chunks.
 
-    # 3. Apply the rules
-    # Groups the rows, applies the specific SUM/FIRST rules, and flattens the result
-    df_agg = df_clean.groupby(group_cols).agg(agg_rules).reset_index()
-    
-    return df_agg
+    Each chunk is reduced to one partial row per key (sums and first
+    values) as it arrives. When the buffered partials exceed max_rows they
+    are merged again, so memory is bounded by the number of distinct keys
+    plus one chunk, whatever the number of rows read. Sums of partial sums
+    and the first non-missing of the partial first values (in chunk order)
+    give the same result as aggregating the whole table at once.
+
+    Args:
+        group_cols (list of str, optional): Grouping keys, as in aggregate_by_eventID.
+        max_rows (int): Buffered partial rows that trigger a merge.
+
+    Example:
+        aggregator = ChunkAggregator(['Event_ID', 'Administrative_Area_GID'])
+        for chunk in chunks:
+            aggregator.add(chunk)
+        L3_aggregated = aggregator.result()
+    """
+
+    def __init__(self, group_cols=None, max_rows=1_000_000):
+        self.group_cols = group_cols
+        self.max_rows = max_rows
+        self._partials = []
+        self._rows = 0
+
+    def add(self, chunk):
+        """Aggregate one chunk into the running partial results."""
+        if len(chunk) == 0:
+            return
+        partial = aggregate_by_eventID(chunk, self.group_cols, sort=False)
+        self._partials.append(partial)
+        self._rows += len(partial)
+        if self._rows > self.max_rows and len(self._partials) > 1:
+            self._compact()
+
+    def _compact(self):
+        merged = aggregate_by_eventID(concat_frames(self._partials), self.group_cols, sort=False)
+        self._partials = [merged]
+        self._rows = len(merged)
+        # Many distinct keys: merge less often rather than at every chunk
+        self.max_rows = max(self.max_rows, 2 * self._rows)
+
+    def result(self, sort=True):
+        """
+        Return the aggregate of every chunk added so far.
+
+        Args:
+            sort (bool): Sort the groups by key, as aggregate_by_eventID.
+
+        Returns:
+            pandas.DataFrame or None: One row per key, or None if no rows
+            were added.
+        """
+        if not self._partials:
+            return None
+        return aggregate_by_eventID(concat_frames(self._partials), self.group_cols, sort=sort)
 
 # ------------ USED IN TASK 6 ------------ 
+def semi_join(df, other, on):
+    """
+    Keep the rows of df whose key combination also occurs in other.
+
+    Args:
+        df (pandas.DataFrame): Rows to filter.
+        other (pandas.DataFrame): Rows providing the allowed keys.
+        on (list of str): Key columns present in both frames.
+
+    Returns:
+        pandas.DataFrame: Filtered copy of df, in its original order.
+    """
+    keep = pd.MultiIndex.from_frame(df[on]).isin(pd.MultiIndex.from_frame(other[on].drop_duplicates()))
+    return df[keep].copy()
+
+
 def rel_diff_between_data_levels(df, col):
     '''
     Compute the relative difference between level 3 and level 2 data.
@@ -343,20 +1066,30 @@ def rel_diff_between_data_levels(df, col):
         default=normal_case)
 
 # ------------ USED IN TASK 7 ------------
-def process_and_plot_impacts(df, category_name, emdat_col):
+# Bins of the relative difference and their labels:
+#   < -0.5       -> -50% less
+#   -0.5 to -0.3 -> -30% less
+#   -0.3 to 0.3  -> Perfect Match
+#   0.3 to 0.5   -> +30% more
+#   > 0.5        -> +50% more
+IMPACT_BINS = [-np.inf, -0.5, -0.3, 0.3, 0.5, np.inf]
+IMPACT_LABELS = ['-50% less', '-30% less', '"Perfect" Match', '+30% more', '+50% more']
+
+
+def compare_impacts(df, emdat_col):
     """
-    Calculate Wikimpacts mean, compare against EM-DAT, categorize differences, and plot results.
+    Calculate Wikimpacts mean, compare against EM-DAT and categorize differences.
 
     The function performs the following steps:
         1. Computes the row-wise mean of 'Num_Min' and 'Num_Max' as 'Wikimpact_Mean'.
         2. Calculates the relative difference between Wikimpacts and EM-DAT values.
         3. Categorizes the differences into bins representing over- or under-estimation.
-        4. Plots a bar chart of the counts per category and saves the figure.
 
     Args:
         df (pandas.DataFrame): Input DataFrame containing 'Num_Min', 'Num_Max', and EM-DAT columns.
-        category_name (str): Name of the category for labeling the plot and file.
-        emdat_col (str): Name of the column in df containing EM-DAT values for comparison.
+        emdat_col (str or dict): Name of the column in df containing EM-DAT values for
+            comparison, or a mapping 'Impact_Type' value -> column, to compare
+            several impact types of a long frame in one pass.
 
     Returns:
         pandas.DataFrame: DataFrame with added columns 'Wikimpact_Mean', 'Relative_Diff',
@@ -364,7 +1097,6 @@ def process_and_plot_impacts(df, category_name, emdat_col):
 
     Raises:
         KeyError: If required columns ('Num_Min', 'Num_Max', or emdat_col) are missing from df.
-        ValueError: If EM-DAT values contain zeros leading to invalid relative difference calculations.
     """
     df = df.copy()
     
@@ -377,7 +1109,15 @@ def process_and_plot_impacts(df, category_name, emdat_col):
     
     # Extract series for easier handling
     wiki_val = df['Wikimpact_Mean']
-    emdat_val = df[emdat_col]
+    if isinstance(emdat_col, dict):
+        # Long frame: each row is compared with the EM-DAT column of its impact type
+        impact_type = df['Impact_Type'].to_numpy(dtype=object)
+        emdat_val = pd.Series(
+            np.select([impact_type == t for t in emdat_col],
+                      [df[col].to_numpy(dtype='float64') for col in emdat_col.values()], default=np.nan),
+            index=df.index)
+    else:
+        emdat_val = df[emdat_col]
     
     # Define logic for division
     # Case A: Both are 0 -> 0 diff (Perfect Match)
@@ -405,80 +1145,145 @@ def process_and_plot_impacts(df, category_name, emdat_col):
     # Drop rows where we couldn't calculate a difference (NaNs)
     df = df.dropna(subset=['Relative_Diff'])
 
-    # 3. Sort into 5 categories
-    # Bins: 
-    #   < -0.5       -> -50% less
-    #   -0.5 to -0.3 -> -30% less
-    #   -0.3 to 0.3  -> Perfect Match
-    #   0.3 to 0.5   -> +30% more
-    #   > 0.5        -> +50% more
-    
-    bins = [-np.inf, -0.5, -0.3, 0.3, 0.5, np.inf]
-    labels = ['-50% less', '-30% less', '"Perfect" Match', '+30% more', '+50% more']
-    
-    df['Impact_Category'] = pd.cut(df['Relative_Diff'], bins=bins, labels=labels)
+    # 3. Sort into the 5 categories of IMPACT_BINS
+    df['Impact_Category'] = pd.Categorical.from_codes(
+        impact_bin_codes(df['Relative_Diff'].to_numpy()), categories=IMPACT_LABELS, ordered=True)
+    return df
 
-    # 4. Visualization
-    plt.figure(figsize=(10, 6))
-    
-    # Count the values for the plot
-    ax = sns.countplot(x='Impact_Category', data=df, hue='Impact_Category', legend=False, palette='viridis', order=labels, dodge=False)
-    
-    # Formatting
-    plt.title(f'Comparison of {category_name}: EM-DAT vs Wikimpacts', fontsize=15)
-    plt.xlabel('Impact Difference Category', fontsize=12)
-    plt.ylabel('Count of Events', fontsize=12)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    
-    # Add count labels on top of bars
-    for p in ax.patches:
-        ax.annotate(f'{int(p.get_height())}', 
-                    (p.get_x() + p.get_width() / 2., p.get_height()), 
-                    ha = 'center', va = 'center', 
-                    xytext = (0, 9), 
-                    textcoords = 'offset points')
-
-    # Save the plot
-    
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(current_dir)
-    filename = f"EM_DAT_Wikimpacts_{category_name}_comparison.png"
-    image_path = os.path.join(project_root, 'Images', filename)
-
-    plt.savefig(image_path, dpi=300)
-    print(f"Plot saved: {filename}")
-    #plt.show() # Optional: Show plot in IDE
-    
+
+def impact_bin_codes(relative_diff):
+    """
+    Find the IMPACT_BINS interval of each relative difference.
+
+    Intervals are closed on the right, like pd.cut: -0.5 falls in
+    '-50% less' and 0.3 in '"Perfect" Match'.
+
+    Args:
+        relative_diff (numpy.ndarray): Relative differences.
+
+    Returns:
+        numpy.ndarray: Index into IMPACT_LABELS, or -1 for NaN and -inf
+        (outside the first interval, which is open on the left).
+    """
+    inner_edges = np.asarray(IMPACT_BINS[1:-1])
+    codes = np.digitize(relative_diff, inner_edges, right=True)
+    outside = np.isnan(relative_diff) | (relative_diff == -np.inf)
+    return np.where(outside, -1, codes)
+
+
+def impact_category_counts(df):
+    """
+    Count the rows of each difference category, in plot order.
+
+    Args:
+        df (pandas.DataFrame): Output of compare_impacts.
+
+    Returns:
+        dict: Label of IMPACT_LABELS -> number of rows.
+    """
+    codes = np.asarray(df['Impact_Category'].cat.codes)
+    counts = np.bincount(codes[codes >= 0], minlength=len(IMPACT_LABELS))
+    return dict(zip(IMPACT_LABELS, counts.tolist()))
+
+
+def compute_impacts(df, emdat_col):
+    """
+    Compare Wikimpacts against EM-DAT without plotting anything.
+
+    Args:
+        df (pandas.DataFrame): Input DataFrame containing 'Num_Min', 'Num_Max', and EM-DAT columns.
+        emdat_col (str): Name of the column in df containing EM-DAT values for comparison.
+
+    Returns:
+        tuple: (df, counts), the categorized frame of compare_impacts and the
+        number of rows per label of IMPACT_LABELS.
+    """
+    df = compare_impacts(df, emdat_col)
+    return df, impact_category_counts(df)
+
+
+def compute_impacts_by_type(df, emdat_cols):
+    """
+    Compare every impact type of a long frame with EM-DAT in one pass.
+
+    Args:
+        df (pandas.DataFrame): Matched rows with an 'Impact_Type' column.
+        emdat_cols (dict): Impact type -> EM-DAT column to compare with.
+
+    Returns:
+        dict: Impact type -> (frame, counts) as returned by compute_impacts,
+        for the types of emdat_cols; the frames have no 'Impact_Type' column.
+    """
+    compared = compare_impacts(df[df['Impact_Type'].isin(list(emdat_cols))], emdat_cols)
+    types = compared['Impact_Type'].to_numpy(dtype=object)
+    results = {}
+    for impact_type in emdat_cols:
+        part = compared[types == impact_type].drop(columns='Impact_Type')
+        results[impact_type] = (part, impact_category_counts(part))
+    return results
+
+
+def process_and_plot_impacts(df, category_name, emdat_col, dpi=300, fmt="png", output_dir=None):
+    """
+    Compare Wikimpacts against EM-DAT and save the bar chart of the differences.
+
+    See compare_impacts for the comparison; the figure is saved as
+    EM_DAT_Wikimpacts_<category_name>_comparison.<fmt>.
+
+    Args:
+        df (pandas.DataFrame): Input DataFrame containing 'Num_Min', 'Num_Max', and EM-DAT columns.
+        category_name (str): Name of the category for labeling the plot and file.
+        emdat_col (str): Name of the column in df containing EM-DAT values for comparison.
+        dpi (int): Resolution of the saved figure.
+        fmt (str): File format of the saved figure.
+        output_dir (str, optional): Folder of the figure. Defaults to Images/.
+
+    Returns:
+        pandas.DataFrame: DataFrame with added columns 'Wikimpact_Mean', 'Relative_Diff',
+        and 'Impact_Category' reflecting the comparison results.
+
+    Raises:
+        KeyError: If required columns ('Num_Min', 'Num_Max', or emdat_col) are missing from df.
+    """
+    import plot_rendering  # matplotlib is only loaded when something is drawn
+
+    df, counts = compute_impacts(df, emdat_col)
+    path = plot_rendering.image_path(category_name, output_dir, fmt)
+    plot_rendering.render_all(
+        [plot_rendering.impact_job(category_name, counts, path, dpi)],
+        max_workers=1)
     return df
 # ------------ USED IN TASK 8 ------------
-def process_and_plot_spatial_differences(emdat, L2_Deaths_filter, L2_Injuries_filter, L2_Damage_filter):
+def spatial_comparison(emdat, *L2_frames):
     """
-    Computes country-level differences between EM-DAT and Wikimpacts
-    and generates a global spatial comparison map.
+    Computes country-level differences between EM-DAT and Wikimpacts.
 
-    Saves the figure into the Images folder.
+    Args:
+        emdat (pandas.DataFrame): EM-DAT records with an 'ISO' column.
+        *L2_frames (pandas.DataFrame): L2 rows with 'Administrative_Area_GID',
+            e.g. the Deaths, Injuries and Damage frames or one long frame.
+
+    Returns:
+        pandas.DataFrame: One row per ISO with 'emdat_count',
+        'wikimpacts_count' and their 'difference'.
     """
 
     # 1. Aggregate EM-DAT impacts by country
     emdat_country_counts = (
-        emdat.groupby("ISO")
+        emdat.groupby("ISO", observed=True)
         .size()
         .reset_index(name="emdat_count")
     )
 
     # 2. Aggregate Wikimpacts impacts by country
     wikimpacts_country_counts = pd.concat(
-        [
-            L2_Deaths_filter[["Administrative_Area_GID"]],
-            L2_Injuries_filter[["Administrative_Area_GID"]],
-            L2_Damage_filter[["Administrative_Area_GID"]]
-        ],
+        [L2[["Administrative_Area_GID"]] for L2 in L2_frames],
         ignore_index=True
     )
 
     wikimpacts_country_counts = (
         wikimpacts_country_counts
-        .groupby("Administrative_Area_GID")
+        .groupby("Administrative_Area_GID", observed=True)
         .size()
         .reset_index(name="wikimpacts_count")
         .rename(columns={"Administrative_Area_GID": "ISO"})
@@ -489,54 +1294,63 @@ def process_and_plot_spatial_differences(emdat, L2_Deaths_filter, L2_Injuries_fi
         wikimpacts_country_counts,
         on="ISO",
         how="outer"
-    ).fillna(0)
+    ).fillna({"emdat_count": 0, "wikimpacts_count": 0})  # ISO may be categorical: counts only
 
     # 4. Compute difference
     spatial_comparison["difference"] = (
         spatial_comparison["wikimpacts_count"] -
         spatial_comparison["emdat_count"]
     )
+    return spatial_comparison
 
-    # 5. Load world geometry
-    world = gpd.read_file(
-        "https://naturalearth.s3.amazonaws.com/110m_cultural/ne_110m_admin_0_countries.zip"
-    )
 
-    # 6. Merge with world map
-    world_map = world.merge(
+def spatial_world_map(spatial_comparison, world=None):
+    """
+    Attach the country-level differences to the world geometry.
+
+    Args:
+        spatial_comparison (pandas.DataFrame): Output of spatial_comparison.
+        world (geopandas.GeoDataFrame, optional): Country polygons with an
+            'ISO_A3' column. Defaults to geometry_provider.load_countries().
+
+    Returns:
+        geopandas.GeoDataFrame: World polygons with the comparison columns.
+    """
+    # Load world geometry (local copy, parsed once per process)
+    if world is None:
+        import geometry_provider  # geopandas is only imported by runs that draw the map
+        world = geometry_provider.load_countries()
+
+    return world.merge(
         spatial_comparison,
         left_on="ISO_A3",
         right_on="ISO",
         how="left"
     )
 
-    # 7. Plot
-    fig, ax = plt.subplots(1, 1, figsize=(16, 9))
-
-    world_map.plot(
-        column="difference",
-        cmap="coolwarm",
-        linewidth=0.4,
-        edgecolor="black",
-        legend=True,
-        legend_kwds={"label": "Wikimpacts − EM-DAT"},
-        missing_kwds={"color": "lightgrey"},
-        ax=ax
-    )
 
-    ax.set_title(
-        "Spatial Differences Between EM-DAT and Wikimpacts\n(Tropical Cyclone Impacts)",
-        fontsize=16
-    )
-    ax.axis("off")
+def process_and_plot_spatial_differences(emdat, *L2_frames, world=None, dpi=300, fmt="png", output_dir=None):
+    """
+    Computes country-level differences between EM-DAT and Wikimpacts
+    and generates a global spatial comparison map.
+
+    Saves the figure into the Images folder.
+
+    Args:
+        emdat (pandas.DataFrame): EM-DAT records with an 'ISO' column.
+        *L2_frames (pandas.DataFrame): L2 rows with 'Administrative_Area_GID'.
+        world (geopandas.GeoDataFrame, optional): Country polygons with an
+            'ISO_A3' column. Defaults to geometry_provider.load_countries().
+        dpi (int): Resolution of the saved figure.
+        fmt (str): File format of the saved figure.
+        output_dir (str, optional): Folder of the figure. Defaults to Images/.
+    """
+    import plot_rendering  # matplotlib is only loaded when something is drawn
 
-    # 8. Save figure
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(current_dir)
-    filename = "EM_DAT_Wikimpacts_Spatial_Global_comparison.png"
-    image_path = os.path.join(project_root, "Images", filename)
+    comparison = spatial_comparison(emdat, *L2_frames)
+    world_map = spatial_world_map(comparison, world)
 
-    plt.savefig(image_path, dpi=300, bbox_inches="tight")
-    print(f"Spatial plot saved: {filename}")
+    path = plot_rendering.image_path("Spatial_Global", output_dir, fmt)
+    plot_rendering.render_all([plot_rendering.spatial_job(world_map, path, dpi)], max_workers=1)
 
-    return spatial_comparison
\ No newline at end of file
+    return comparison
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+EM-DAT ingest: reads only the needed columns of EMDAT.xlsx once and keeps
+them as a typed Arrow file, so later runs skip the Excel parsing.
+"""
+import json
+import os
+
+import pandas as pd
+
+from impactdb_cache import file_fingerprint, fingerprint_matches
+
+try:  # pyarrow is optional: without it the workbook is parsed on every call
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+SHEET_NAME = "EM-DAT Data"
+
+# Columns used for matching and plotting
+EMDAT_COLUMNS = [
+    "ISO",
+    "Start Year", "Start Month",
+    "End Year", "End Month", 'Total Deaths', 'No. Injured', "Total Damage ('000 US$)", "Total Damage, Adjusted ('000 US$)"]
+
+EMDAT_DTYPES = {
+    "ISO": "category",
+    "Start Year": "Int16", "Start Month": "Int8",
+    "End Year": "Int16", "End Month": "Int8",
+    'Total Deaths': "float64", 'No. Injured': "float64",
+    "Total Damage ('000 US$)": "float64", "Total Damage, Adjusted ('000 US$)": "float64"}
+
+# EM-DAT column compared with each Wikimpacts impact type
+EMDAT_IMPACT_COLUMNS = {
+    "Deaths": 'Total Deaths',
+    "Injuries": 'No. Injured',
+    "Damage": "Total Damage, Adjusted ('000 US$)"}
+
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """Return the project-level cache folder (Data/cache/emdat)."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'Data', 'cache', 'emdat')
+
+
+def read_emdat_excel(path, sheet_name=SHEET_NAME):
+    """
+    Parse the EM-DAT workbook, keeping only the columns we use.
+
+    Args:
+        path (str): Path of EMDAT.xlsx.
+        sheet_name (str): Sheet holding the disaster records.
+
+    Returns:
+        pandas.DataFrame: EM-DAT columns of EMDAT_COLUMNS with EMDAT_DTYPES.
+    """
+    emdat = pd.read_excel(path, sheet_name=sheet_name, usecols=EMDAT_COLUMNS)
+    return emdat[EMDAT_COLUMNS].astype(EMDAT_DTYPES)
+
+
+def load_emdat(path, cache_dir=None):
+    """
+    Load the EM-DAT columns, from the Arrow cache when it is still valid.
+
+    The cache is invalidated by the workbook's mtime and hash: an untouched
+    file is never hashed, a copied file with the same content is reused.
+
+    Args:
+        path (str): Path of EMDAT.xlsx.
+        cache_dir (str, optional): Folder of the cache. Defaults to
+            Data/cache/emdat in the project root.
+
+    Returns:
+        pandas.DataFrame: EM-DAT columns of EMDAT_COLUMNS with EMDAT_DTYPES.
+    """
+    if pa is None:
+        return read_emdat_excel(path)
+
+    cache_dir = cache_dir or default_cache_dir()
+    table_path = os.path.join(cache_dir, "EMDAT.arrow")
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+
+    manifest = None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        pass
+
+    if (manifest is not None and manifest.get("version") == CACHE_VERSION
+            and manifest.get("columns") == EMDAT_COLUMNS
+            and fingerprint_matches(path, manifest["fingerprint"])
+            and os.path.exists(table_path)):
+        with pa.memory_map(table_path, 'r') as source:
+            return pa_ipc.open_file(source).read_all().to_pandas()
+
+    # Cache miss: parse the workbook once and store the typed columns
+    emdat = read_emdat_excel(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = table_path + ".tmp"
+    arrow_table = pa.Table.from_pandas(emdat, preserve_index=False)
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa_ipc.new_file(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+    os.replace(tmp_path, table_path)
+    with open(manifest_path, 'w', encoding='utf-8') as fh:
+        json.dump({"version": CACHE_VERSION, "columns": EMDAT_COLUMNS,
+                   "fingerprint": file_fingerprint(path)}, fh, indent=2)
+    return emdat
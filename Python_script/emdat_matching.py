@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Matching of Wikimpacts L2 rows to EM-DAT records.
+
+EmdatIndex packs the 5-column key (ISO, start year/month, end year/month)
+into one int64 and keeps the EM-DAT keys sorted, so every impact category
+is matched by binary search against the same index.
+
+EmdatIntervalIndex is the fuzzy alternative: dates become month intervals
+and a L2 row matches the EM-DAT records of its ISO whose dates are within
+a window of months, scored by how far apart they are.
+"""
+import numpy as np
+import pandas as pd
+
+# Key columns on both sides, in matching order
+L2_KEYS = ["Administrative_Area_GID", "Start_Date_Year", "Start_Date_Month", "End_Date_Year", "End_Date_Month"]
+EMDAT_KEYS = ["ISO", "Start Year", "Start Month", "End Year", "End Month"]
+
+# Bit layout of the packed key: ISO | start year | start month | end year | end month
+_YEAR_BITS = 13   # year + 1 (0 = missing), years 0..8190
+_MONTH_BITS = 4   # month + 1 (0 = missing), months 0..14
+_ISO_BITS = 15    # position in the sorted EM-DAT ISO list + 1
+_FIELD_BITS = [_ISO_BITS, _YEAR_BITS, _MONTH_BITS, _YEAR_BITS, _MONTH_BITS]
+
+# Matching modes understood by make_index
+MATCH_MODES = ("exact", "fuzzy")
+
+
+def _encode_numbers(values, bits):
+    """
+    Encode a year or month column as small non-negative integers.
+
+    Missing values become 0 (so that, as in pandas merges, missing matches
+    missing); other values are stored as value + 1.
+
+    Returns:
+        tuple: (codes, ok) int64 codes and mask of the encodable rows.
+    """
+    numbers = pd.Series(values).to_numpy(dtype="float64", na_value=np.nan)
+    missing = np.isnan(numbers)
+    ok = missing | ((numbers >= 0) & (numbers < (1 << bits) - 1) & (numbers == np.floor(numbers)))
+    codes = np.where(missing | ~ok, 0, numbers + 1).astype(np.int64)
+    return codes, ok
+
+
+def _join_rows(df, emdat, left_rows, emdat_rows, suffixes):
+    """Put the selected df rows and EM-DAT rows side by side."""
+    left = df.take(left_rows)
+    right = emdat.take(emdat_rows)
+    left.index = right.index = pd.RangeIndex(len(left_rows))
+    overlap = left.columns.intersection(right.columns)
+    if len(overlap):
+        left = left.rename(columns={c: f"{c}{suffixes[0]}" for c in overlap})
+        right = right.rename(columns={c: f"{c}{suffixes[1]}" for c in overlap})
+    return pd.concat([left, right], axis=1)
+
+
+def _record_unmatched(unmatched, df, left_rows, category, by):
+    """Store the number of df rows without any match, per category or per group."""
+    if category is None and by is None:
+        return
+    matched = np.zeros(len(df), dtype=bool)
+    matched[left_rows] = True
+    if by is None:
+        unmatched[category] = int((~matched).sum())
+        return
+    groups = pd.Series(~matched).groupby(np.asarray(df[by], dtype=object), sort=False).sum()
+    for group, count in groups.items():
+        unmatched[group] = int(count)
+
+
+def _month_range(years, months):
+    """
+    Turn a year and month column into a range of month ordinals.
+
+    A known month gives a one-month range; a missing month covers the whole
+    year. Rows without a year get NaN bounds.
+
+    Returns:
+        tuple: (low, high) float arrays of year * 12 + month - 1.
+    """
+    years = pd.Series(years).to_numpy(dtype="float64", na_value=np.nan)
+    months = pd.Series(months).to_numpy(dtype="float64", na_value=np.nan)
+    low = np.where(np.isnan(months), years * 12, years * 12 + months - 1)
+    high = np.where(np.isnan(months), years * 12 + 11, low)
+    return low, high
+
+
+def _intervals(df, keys):
+    """
+    Month intervals of the rows of df.
+
+    Returns:
+        tuple: (start_low, start_high, end_low, end_high) float arrays. A
+        missing end date is taken equal to the start date.
+    """
+    start_low, start_high = _month_range(df[keys[1]], df[keys[2]])
+    end_low, end_high = _month_range(df[keys[3]], df[keys[4]])
+    no_end = np.isnan(end_low)
+    end_low = np.where(no_end, start_low, end_low)
+    end_high = np.where(no_end, start_high, end_high)
+    return start_low, start_high, end_low, end_high
+
+
+def _gap(low_a, high_a, low_b, high_b):
+    """Months between two ranges (0 if they overlap)."""
+    return np.maximum(0, np.maximum(low_b - high_a, low_a - high_b))
+
+
+def _pack(fields):
+    """Pack the per-column codes into one int64 key."""
+    key = np.zeros(len(fields[0]), dtype=np.int64)
+    for codes, bits in zip(fields, _FIELD_BITS):
+        key = (key << bits) | codes
+    return key
+
+
+class EmdatIndex:
+    """
+    Sorted index of the EM-DAT records on their packed 5-column key.
+
+    Built once from the EM-DAT frame and probed by every impact category.
+    match() gives the same rows, in the same order, as an inner merge of
+    the L2 frame with EM-DAT on the five key columns.
+
+    EM-DAT rows without ISO, or with a year outside 0..8190, cannot be
+    packed and are left out of the index (counted in ``skipped``).
+
+    Args:
+        emdat (pandas.DataFrame): EM-DAT records with the EMDAT_KEYS columns.
+        keys (list of str): EM-DAT key columns, in matching order.
+    """
+
+    def __init__(self, emdat, keys=EMDAT_KEYS):
+        self.emdat = emdat.reset_index(drop=True)
+        self.keys = list(keys)
+        self.unmatched = {}  # category -> number of L2 rows without an EM-DAT record
+
+        iso = self.emdat[self.keys[0]]
+        self.isos = pd.Index(np.asarray(iso.dropna().unique(), dtype=object)).sort_values()
+        packed, ok = self._pack_frame(self.emdat, self.keys)
+        ok &= iso.notna().to_numpy()
+        self.skipped = int((~ok).sum())
+
+        rows = np.flatnonzero(ok)
+        order = np.argsort(packed[rows], kind="stable")  # stable: ties keep EM-DAT order
+        self.sorted_keys = packed[rows][order]
+        self.sorted_rows = rows[order]
+
+    def _pack_frame(self, df, keys):
+        """Pack the key columns of df; returns (keys, packable mask)."""
+        iso_codes = self.isos.get_indexer(np.asarray(df[keys[0]], dtype=object)) + 1
+        ok = iso_codes > 0  # ISO unknown to EM-DAT: can never match
+        fields = [iso_codes.astype(np.int64)]
+        for col, bits in zip(keys[1:], _FIELD_BITS[1:]):
+            codes, col_ok = _encode_numbers(df[col], bits)
+            fields.append(codes)
+            ok &= col_ok
+        return _pack(fields), ok
+
+    def lookup(self, df, keys=L2_KEYS):
+        """
+        Find the EM-DAT records matching each row of df.
+
+        Args:
+            df (pandas.DataFrame): Frame holding the key columns.
+            keys (list of str): Key columns of df, in matching order.
+
+        Returns:
+            tuple: (left_rows, emdat_rows) aligned positional indices of the
+            matching pairs, ordered by left row then EM-DAT row.
+        """
+        packed, ok = self._pack_frame(df, keys)
+        start = np.searchsorted(self.sorted_keys, packed, side="left")
+        stop = np.searchsorted(self.sorted_keys, packed, side="right")
+        counts = np.where(ok, stop - start, 0)
+
+        left_rows = np.repeat(np.arange(len(df)), counts)
+        # Offset of each pair inside its block of equal keys
+        offsets = np.arange(len(left_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        emdat_rows = self.sorted_rows[np.repeat(start, counts) + offsets]
+        return left_rows, emdat_rows
+
+    def match(self, df, category=None, keys=L2_KEYS, suffixes=("_x", "_y"), by=None):
+        """
+        Inner-join df with the EM-DAT records on the five key columns.
+
+        Args:
+            df (pandas.DataFrame): L2 rows to match.
+            category (str, optional): Impact category; if given, the number
+                of unmatched rows is recorded under it in ``unmatched``.
+            keys (list of str): Key columns of df, in matching order.
+            suffixes (tuple of str): Added to columns present on both sides.
+            by (str, optional): Column of df (e.g. 'Impact_Type'); if given,
+                unmatched rows are recorded per value of that column.
+
+        Returns:
+            pandas.DataFrame: df columns followed by the EM-DAT columns,
+            one row per matching pair.
+        """
+        left_rows, emdat_rows = self.lookup(df, keys)
+        _record_unmatched(self.unmatched, df, left_rows, category, by)
+
+        return _join_rows(df, self.emdat, left_rows, emdat_rows, suffixes)
+
+    def report(self):
+        """Return a one-line summary of the unmatched rows per category."""
+        parts = [f"{category}: {count}" for category, count in self.unmatched.items()]
+        return "Unmatched L2 rows per category -> " + ", ".join(parts)
+
+
+class EmdatIntervalIndex:
+    """
+    Per-ISO sorted index of the EM-DAT date intervals, for fuzzy matching.
+
+    A L2 row and an EM-DAT record are candidates when they share the ISO,
+    their start dates are at most ``window`` months apart and their
+    intervals overlap once widened by ``window`` months. A missing month
+    stands for the whole year. Each candidate gets a distance (start gap +
+    end gap, in months) and a score 1 / (1 + distance).
+
+    The records are sorted on (ISO, start month), so the candidates of a
+    row are found with two binary searches instead of a cross join.
+    EM-DAT records without ISO or start year are left out (``skipped``).
+
+    Args:
+        emdat (pandas.DataFrame): EM-DAT records with the EMDAT_KEYS columns.
+        window (int): Tolerance in months.
+        keys (list of str): EM-DAT key columns, in matching order.
+    """
+
+    def __init__(self, emdat, window=1, keys=EMDAT_KEYS):
+        if not isinstance(window, (int, np.integer)) or window < 0:
+            raise ValueError(f"window must be a non-negative number of months, got {window!r}")
+        self.emdat = emdat.reset_index(drop=True)
+        self.window = int(window)
+        self.keys = list(keys)
+        self.unmatched = {}  # category -> number of L2 rows without an EM-DAT record
+
+        iso = self.emdat[self.keys[0]]
+        self.isos = pd.Index(np.asarray(iso.dropna().unique(), dtype=object)).sort_values()
+        iso_codes, start_low, start_high, end_low, end_high = self._locate(self.emdat, self.keys)
+        ok = (iso_codes > 0) & ~np.isnan(start_low)
+        self.skipped = int((~ok).sum())
+
+        rows = np.flatnonzero(ok)
+        sort_keys = self._sort_keys(iso_codes[rows], start_low[rows])
+        order = np.argsort(sort_keys, kind="stable")
+        self.sorted_keys = sort_keys[order]
+        self.sorted_rows = rows[order]
+        self.start_low, self.start_high = start_low, start_high
+        self.end_low, self.end_high = end_low, end_high
+
+    def _locate(self, df, keys):
+        """ISO codes (0 = unknown) and month intervals of the rows of df."""
+        iso_codes = self.isos.get_indexer(np.asarray(df[keys[0]], dtype=object)) + 1
+        return (iso_codes,) + _intervals(df, keys)
+
+    @staticmethod
+    def _sort_keys(iso_codes, months):
+        """Combine ISO and month ordinal into one sortable float key."""
+        return iso_codes * float(1 << 20) + months
+
+    def candidates(self, df, keys=L2_KEYS):
+        """
+        List every scored candidate pair.
+
+        Args:
+            df (pandas.DataFrame): Frame holding the key columns.
+            keys (list of str): Key columns of df, in matching order.
+
+        Returns:
+            pandas.DataFrame: Columns 'left_row', 'emdat_row' (positions),
+            'distance' and 'score', ordered by left row then EM-DAT row.
+        """
+        iso_codes, start_low, start_high, end_low, end_high = self._locate(df, keys)
+        ok = (iso_codes > 0) & ~np.isnan(start_low)
+        w = self.window
+
+        # A record's start range spans at most 12 months, so every candidate
+        # starts in [start_low - w - 11, start_high + w] for the same ISO
+        lo = np.searchsorted(self.sorted_keys, self._sort_keys(iso_codes, start_low - w - 11), side="left")
+        hi = np.searchsorted(self.sorted_keys, self._sort_keys(iso_codes, start_high + w), side="right")
+        counts = np.where(ok, hi - lo, 0)
+
+        left_rows = np.repeat(np.arange(len(df)), counts)
+        offsets = np.arange(len(left_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        emdat_rows = self.sorted_rows[np.repeat(lo, counts) + offsets]
+
+        start_gap = _gap(start_low[left_rows], start_high[left_rows],
+                         self.start_low[emdat_rows], self.start_high[emdat_rows])
+        end_gap = _gap(end_low[left_rows], end_high[left_rows],
+                       self.end_low[emdat_rows], self.end_high[emdat_rows])
+        # Widened intervals must overlap: each one starts before the other ends
+        overlap = ((self.start_low[emdat_rows] <= end_high[left_rows] + w)
+                   & (start_low[left_rows] <= self.end_high[emdat_rows] + w))
+        keep = (start_gap <= w) & overlap
+
+        pairs = pd.DataFrame({"left_row": left_rows[keep], "emdat_row": emdat_rows[keep],
+                              "distance": (start_gap + end_gap)[keep].astype(np.int64)})
+        pairs["score"] = 1.0 / (1.0 + pairs["distance"])
+        return pairs.sort_values(["left_row", "emdat_row"], kind="stable", ignore_index=True)
+
+    def match(self, df, category=None, keys=L2_KEYS, best=True, suffixes=("_x", "_y"), by=None):
+        """
+        Join df with the EM-DAT records matched within the window.
+
+        Args:
+            df (pandas.DataFrame): L2 rows to match.
+            category (str, optional): Impact category; if given, the number
+                of unmatched rows is recorded under it in ``unmatched``.
+            keys (list of str): Key columns of df, in matching order.
+            best (bool): Keep only the best-scoring record of each row (the
+                first EM-DAT record on ties). If False, keep every candidate.
+            suffixes (tuple of str): Added to columns present on both sides.
+            by (str, optional): Column of df; if given, unmatched rows are
+                recorded per value of that column.
+
+        Returns:
+            pandas.DataFrame: df columns, EM-DAT columns and the
+            'match_distance' and 'match_score' of each pair.
+        """
+        pairs = self.candidates(df, keys)
+        if best:
+            order = np.lexsort((pairs["emdat_row"], pairs["distance"], pairs["left_row"]))
+            pairs = pairs.take(order)
+            pairs = pairs[~pairs["left_row"].duplicated()].sort_values("left_row", ignore_index=True)
+        _record_unmatched(self.unmatched, df, pairs["left_row"].to_numpy(), category, by)
+
+        matched = _join_rows(df, self.emdat, pairs["left_row"].to_numpy(),
+                             pairs["emdat_row"].to_numpy(), suffixes)
+        matched["match_distance"] = pairs["distance"].to_numpy()
+        matched["match_score"] = pairs["score"].to_numpy()
+        return matched
+
+    report = EmdatIndex.report
+
+
+def make_index(emdat, match_mode="exact", window=1):
+    """
+    Build the EM-DAT index for a matching mode.
+
+    Args:
+        emdat (pandas.DataFrame): EM-DAT records.
+        match_mode (str): 'exact' (5-key equality) or 'fuzzy' (month window).
+        window (int): Tolerance in months, used by the fuzzy mode.
+
+    Returns:
+        EmdatIndex or EmdatIntervalIndex: Index with a match() method.
+
+    Raises:
+        ValueError: If match_mode is unknown.
+    """
+    if match_mode == "exact":
+        return EmdatIndex(emdat)
+    if match_mode == "fuzzy":
+        return EmdatIntervalIndex(emdat, window=window)
+    raise ValueError(f"Unknown match_mode {match_mode!r}, expected one of {MATCH_MODES}")
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Country geometry for the spatial comparison map.
+
+The Natural Earth country layer is read from a local copy (bundled in
+Data/ or cached in Data/cache/geometry) and kept in memory for the rest of
+the process. Without a local copy it is downloaded once into the cache
+folder; with allow_download=False (offline hosts) the error names the file
+to add to Data/ instead.
+"""
+import os
+
+import geopandas as gpd
+
+NATURAL_EARTH_URL = "https://naturalearth.s3.amazonaws.com/110m_cultural/ne_110m_admin_0_countries.zip"
+LAYER_NAME = "ne_110m_admin_0_countries"
+
+# Files looked for in the Data folder, in this order
+BUNDLED_SUFFIXES = (".zip", ".shp", ".gpkg")
+
+# Parsed layers of this process: (crs, simplify) -> GeoDataFrame
+_LAYERS = {}
+
+
+def default_data_dir():
+    """Return the Data folder of the repository."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), 'Data')
+
+
+def default_cache_dir(data_dir=None):
+    """Return the cache folder of the layer (<data_dir>/cache/geometry)."""
+    return os.path.join(data_dir or default_data_dir(), 'cache', 'geometry')
+
+
+def bundled_layer(data_dir=None):
+    """
+    Find a copy of the Natural Earth layer shipped in the Data folder.
+
+    Args:
+        data_dir (str, optional): Data folder of the project. Defaults to
+            the one of the repository.
+
+    Returns:
+        str or None: Path of the first existing file, or None.
+    """
+    for suffix in BUNDLED_SUFFIXES:
+        path = os.path.join(data_dir or default_data_dir(), LAYER_NAME + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _cache_path(cache_dir, crs, simplify):
+    """Name of the on-disk copy of one variant of the layer."""
+    crs_tag = str(crs).replace(":", "") if crs else "source"
+    simplify_tag = f"_s{simplify:g}" if simplify else ""
+    return os.path.join(cache_dir, f"{LAYER_NAME}_{crs_tag}{simplify_tag}.feather")
+
+
+def _read_cached(path):
+    """Read a cached layer, or return None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return gpd.read_feather(path)
+    except (ImportError, OSError, ValueError):
+        return None
+
+
+def _write_cached(world, path):
+    """Store a layer in the cache; skipped if pyarrow is not installed."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        world.to_feather(tmp_path)
+        os.replace(tmp_path, path)
+    except (ImportError, OSError):
+        pass
+
+
+def missing_layer_message(data_dir=None):
+    """Explain where the country layer is expected and where to get it."""
+    expected = " or ".join(LAYER_NAME + suffix for suffix in BUNDLED_SUFFIXES)
+    folder = data_dir or default_data_dir()
+    return (f"No local country layer found: expected {expected} in {folder}. "
+            f"Download it from {NATURAL_EARTH_URL} and save it there.")
+
+
+def _read_source(data_dir, cache_dir, allow_download):
+    """
+    Read the full-resolution layer: bundled file, cached copy or download.
+
+    Raises:
+        FileNotFoundError: If no local copy exists and downloading is off
+            or fails.
+    """
+    path = bundled_layer(data_dir)
+    if path is not None:
+        return gpd.read_file(path)
+
+    source_cache = _cache_path(cache_dir, None, None)
+    world = _read_cached(source_cache)
+    if world is not None:
+        return world
+
+    if not allow_download:
+        raise FileNotFoundError(missing_layer_message(data_dir))
+    try:
+        world = gpd.read_file(NATURAL_EARTH_URL)
+    except (OSError, RuntimeError, ValueError) as exc:  # offline: URL, GDAL or driver errors
+        raise FileNotFoundError(f"{missing_layer_message(data_dir)} (download failed: {exc})") from exc
+    # Keep the download, so the next runs work offline
+    _write_cached(world, source_cache)
+    return world
+
+
+def load_countries(crs=None, simplify=None, persist=True, cache_dir=None, allow_download=True,
+                   data_dir=None):
+    """
+    Return the Natural Earth country layer, parsed once per process.
+
+    Args:
+        crs (str, optional): Project the layer to this CRS (e.g. "EPSG:8857").
+            Defaults to the source CRS (EPSG:4326).
+        simplify (float, optional): Tolerance of the geometry simplification,
+            in units of the target CRS. Defaults to no simplification.
+        persist (bool): Store the projected/simplified layer in the cache
+            folder, so later processes read it directly.
+        cache_dir (str, optional): Cache folder. Defaults to
+            <data_dir>/cache/geometry.
+        allow_download (bool): Download the layer when there is no local
+            copy; the download is kept in the cache folder, so only the
+            first run needs the network. False for offline hosts.
+        data_dir (str, optional): Data folder looked in for a bundled copy
+            (e.g. that of AnalysisPipeline.project_root). Defaults to the
+            Data folder of the repository.
+
+    Returns:
+        geopandas.GeoDataFrame: Country polygons with their 'ISO_A3' code.
+            Shared by the callers, so copy it before modifying it.
+
+    Raises:
+        FileNotFoundError: If no local copy exists and allow_download is
+            False or the download fails. The message names the expected file.
+    """
+    key = (crs, simplify)
+    if key in _LAYERS:
+        return _LAYERS[key]
+
+    cache_dir = cache_dir or default_cache_dir(data_dir)
+    variant_cache = _cache_path(cache_dir, crs, simplify)
+    world = _read_cached(variant_cache) if (crs or simplify) and persist else None
+
+    if world is None:
+        world = _read_source(data_dir, cache_dir, allow_download)
+        if crs:
+            world = world.to_crs(crs)
+        if simplify:
+            world["geometry"] = world.geometry.simplify(simplify, preserve_topology=True)
+        if (crs or simplify) and persist:
+            _write_cached(world, variant_cache)
+
+    _LAYERS[key] = world
+    return world
+
+
+def clear():
+    """Forget the layers kept in memory."""
+    _LAYERS.clear()
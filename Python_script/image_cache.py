@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Display cache for the result figures shown in the GUI.
+
+Every figure is decoded once and reduced to a pyramid of half-size levels.
+A display size is then resampled from the smallest level that is still
+larger than it, and the resulting PhotoImage objects are kept in an LRU
+keyed on (category, size), so switching views does not touch the disk.
+"""
+import os
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+
+def fit_size(image_size, box):
+    """
+    Largest size with the image's aspect ratio that fits in a box.
+
+    Args:
+        image_size (tuple): (width, height) of the image.
+        box (tuple): (width, height) available.
+
+    Returns:
+        tuple: (width, height), at least 1x1.
+    """
+    scale = min(box[0] / image_size[0], box[1] / image_size[1])
+    return (max(1, int(image_size[0] * scale)), max(1, int(image_size[1] * scale)))
+
+
+class ImagePyramid:
+    """
+    A decoded image and its successive half-size reductions.
+
+    Args:
+        path (str): Image file.
+        min_size (int): Stop halving once a side gets below this many pixels.
+    """
+
+    def __init__(self, path, min_size=256):
+        with Image.open(path) as image:
+            full = image.convert("RGB")
+        self.size = full.size
+        self.levels = [full]
+        while min(self.levels[-1].size) // 2 >= min_size:
+            # reduce() averages 2x2 blocks: much cheaper than a LANCZOS pass
+            self.levels.append(self.levels[-1].reduce(2))
+
+    def scaled(self, size):
+        """Return the image resampled to size, from the closest larger level."""
+        source = self.levels[0]
+        for level in self.levels:
+            if level.size[0] >= size[0] and level.size[1] >= size[1]:
+                source = level
+        if source.size == size:
+            return source
+        return source.resize(size, Image.Resampling.LANCZOS)
+
+
+class ImageCache:
+    """
+    LRU of display-ready PhotoImage objects, keyed on (category, size).
+
+    Decoded pyramids are kept per file (path and mtime), so a resize only
+    resamples an already decoded level. PhotoImage objects belong to Tk:
+    use the cache from the GUI thread only.
+
+    Args:
+        maxsize (int): Number of PhotoImage objects kept.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._photos = OrderedDict()    # (category, size) -> (file key, PhotoImage)
+        self._pyramids = {}             # category -> (file key, ImagePyramid)
+
+    @staticmethod
+    def _file_key(path):
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+    def pyramid(self, category, path):
+        """Return the decoded pyramid of a category's figure."""
+        file_key = self._file_key(path)
+        entry = self._pyramids.get(category)
+        if entry is None or entry[0] != file_key:
+            entry = (file_key, ImagePyramid(path))
+            self._pyramids[category] = entry
+        return entry[1]
+
+    def photo(self, category, path, box):
+        """
+        Return the figure of a category scaled to fit a box.
+
+        Args:
+            category (str): 'Deaths', 'Injuries', 'Damage' or 'Spatial'.
+            path (str): Figure file of the category.
+            box (tuple): (width, height) available for the image.
+
+        Returns:
+            PIL.ImageTk.PhotoImage: Image ready for a Tk widget.
+        """
+        file_key = self._file_key(path)
+        key = (category, tuple(box))
+        entry = self._photos.get(key)
+        if entry is not None and entry[0] == file_key:
+            self._photos.move_to_end(key)
+            return entry[1]
+
+        pyramid = self.pyramid(category, path)
+        photo = ImageTk.PhotoImage(pyramid.scaled(fit_size(pyramid.size, box)))
+        self._photos[key] = (file_key, photo)
+        self._photos.move_to_end(key)
+        while len(self._photos) > self.maxsize:
+            self._photos.popitem(last=False)
+        return photo
+
+    def clear(self):
+        """Forget every decoded image."""
+        self._photos.clear()
+        self._pyramids.clear()
@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Columnar on-disk cache of the impactdb SQLite tables.
+
+The first run snapshots every Total*, Specific* and Instance* table into an
+uncompressed Arrow IPC file, reading BUILD_CHUNK_ROWS rows at a time so the
+build never holds a whole table in memory. Later runs memory-map those files
+and only materialise the columns the pipeline actually uses.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+try:  # pyarrow is optional: without it every read goes straight to SQLite
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+try:  # file locks serialising snapshot builds between processes
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Table families read by run_analysis (prefix of the table name)
+TABLE_FAMILIES = ("Total", "Specific", "Instance")
+
+# Columns the pipeline uses from each table family
+DATE_COLUMNS = [
+    "Start_Date_Year", "Start_Date_Month", "Start_Date_Day",
+    "End_Date_Year", "End_Date_Month", "End_Date_Day"]
+
+IMPACT_COLUMNS = ["Num_Min", "Num_Max", "Num_Approx"]
+
+PIPELINE_COLUMNS = {
+    "Total": ["Event_ID", "Main_Event"] + DATE_COLUMNS,
+    "Specific": ["Event_ID", "Administrative_Area_GID"] + DATE_COLUMNS + IMPACT_COLUMNS,
+    "Instance": ["Event_ID", "Administrative_Areas_GID"] + DATE_COLUMNS + IMPACT_COLUMNS,
+}
+
+MANIFEST_NAME = "manifest.json"
+CACHE_VERSION = 1
+
+# Rows read from SQLite at a time while the snapshot is built
+BUILD_CHUNK_ROWS = 100_000
+
+
+def default_cache_dir():
+    """Return the project-level cache folder (Data/cache/impactdb)."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'Data', 'cache', 'impactdb')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-256 digest of a file, reading it in chunks.
+
+    Args:
+        path (str): Path of the file to hash.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Describe a file by its size, modification time and content hash.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        dict: Keys 'size', 'mtime_ns' and 'sha256'.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_hash(path)}
+
+
+def fingerprint_matches(path, recorded):
+    """
+    Check whether a file still matches a previously recorded fingerprint.
+
+    Size and mtime are compared first, so an untouched file is never hashed.
+    If only the mtime moved (e.g. the file was copied), the hash decides.
+
+    Args:
+        path (str): Path of the file.
+        recorded (dict or None): Fingerprint from :func:`file_fingerprint`.
+
+    Returns:
+        bool: True if the file content is unchanged.
+    """
+    if not recorded or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != recorded.get("size"):
+        return False
+    if stat.st_mtime_ns == recorded.get("mtime_ns"):
+        return True
+    return file_hash(path) == recorded.get("sha256")
+
+
+@contextlib.contextmanager
+def build_lock(path):
+    """
+    Hold an exclusive lock on a lock file while the block runs.
+
+    Used so that two processes (GUI worker, command line, sweep workers)
+    never build the same snapshot at once. Without fcntl or msvcrt the
+    block runs unlocked.
+
+    Args:
+        path (str): Lock file, created if needed.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a+b') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)  # retries for 10 s, then raises
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def table_family(table_name):
+    """Return the table family ('Total', 'Specific', 'Instance') or None."""
+    for family in TABLE_FAMILIES:
+        if table_name.startswith(family):
+            return family
+    return None
+
+
+def list_tables(conn):
+    """
+    List the Total*, Specific* and Instance* tables of the database.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the impact database.
+
+    Returns:
+        list of str: Table names, in sqlite_master order.
+    """
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+    return [name for (name,) in rows if table_family(name)]
+
+
+def table_columns(conn, table_name):
+    """Return the column names of a table, in SELECT * order."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")]
+
+
+def write_arrow_file(conn, table_name, path, chunksize=None):
+    """
+    Write a table to an Arrow IPC file, one chunk of rows at a time.
+
+    Only one chunk is held in memory. The file takes the schema of the first
+    chunk and later chunks are cast to it. When a later chunk needs a wider
+    type (int64 -> double once NULLs show up, null -> string, ...), the file
+    is written again with the widened schema from the first row on, so the
+    snapshot has the types a whole-table conversion would give.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the impact database.
+        table_name (str): Table to write.
+        path (str): Arrow file to (over)write.
+        chunksize (int, optional): Rows per chunk. Defaults to BUILD_CHUNK_ROWS.
+
+    Returns:
+        tuple: Column names (list of str) and number of rows written.
+
+    Raises:
+        pyarrow.ArrowInvalid, pyarrow.ArrowTypeError: If a column mixes SQLite
+            types that have no common Arrow type.
+    """
+    chunksize = chunksize or BUILD_CHUNK_ROWS
+    schema = None
+    while True:
+        widened, rows = None, 0
+        with pa.OSFile(path, 'wb') as sink:
+            writer = None
+            for chunk in pd.read_sql(f"SELECT * FROM {table_name};", conn, chunksize=chunksize):
+                batch = pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None)
+                if schema is None:
+                    schema = batch.schema
+                elif not batch.schema.equals(schema):
+                    unified = pa.unify_schemas([schema, batch.schema], promote_options="permissive")
+                    if not unified.equals(schema):
+                        widened = unified
+                        break
+                    batch = batch.cast(schema)
+                if writer is None:
+                    writer = pa_ipc.new_file(sink, schema)
+                writer.write_table(batch)
+                rows += len(batch)
+            if writer is not None:
+                writer.close()
+        if widened is None:
+            return list(schema.names), rows
+        schema = widened
+
+
+class ImpactDBCache:
+    """
+    Snapshot of the impactdb tables stored as memory-mappable Arrow files.
+
+    The snapshot is keyed on the database fingerprint (size, mtime, SHA-256).
+    When the database changes, the next :meth:`refresh` rebuilds it. Tables
+    that cannot be converted to Arrow (mixed SQLite types in one column) are
+    recorded as uncached and are read from SQLite instead.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+        cache_dir (str, optional): Folder holding the snapshot. Defaults to
+            Data/cache/impactdb in the project root.
+    """
+
+    def __init__(self, db_path, cache_dir=None):
+        self.db_path = db_path
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.manifest = None
+
+    @property
+    def enabled(self):
+        """True if pyarrow is installed and the snapshot can be used."""
+        return pa is not None
+
+    def _manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def _table_path(self, table_name):
+        return os.path.join(self.cache_dir, f"{table_name}.arrow")
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != CACHE_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest, folder):
+        path = os.path.join(folder, MANIFEST_NAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # a reader never sees a half-written manifest
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(tmp_path, path)
+
+    def is_fresh(self):
+        """Return True if a snapshot exists and matches the current database."""
+        manifest = self._load_manifest()
+        if manifest is None or not fingerprint_matches(self.db_path, manifest["fingerprint"]):
+            return False
+        # Copied database: same content, new mtime -> remember the new mtime
+        mtime_ns = os.stat(self.db_path).st_mtime_ns
+        if manifest["fingerprint"]["mtime_ns"] != mtime_ns:
+            manifest["fingerprint"]["mtime_ns"] = mtime_ns
+            self._write_manifest(manifest, self.cache_dir)
+        self.manifest = manifest
+        return True
+
+    def refresh(self):
+        """
+        Make sure the snapshot matches the database, rebuilding it if needed.
+
+        Returns:
+            bool: True if the snapshot was (re)built, False if it was reused
+            or if pyarrow is not available.
+        """
+        if not self.enabled or self.is_fresh():
+            return False
+        with build_lock(self._lock_path()):
+            if self.is_fresh():  # built by another process while we waited
+                return False
+            self._build()
+        return True
+
+    def _lock_path(self):
+        return self.cache_dir + ".lock"
+
+    def build(self):
+        """
+        Snapshot every Total*, Specific* and Instance* table to Arrow files.
+
+        Tables are copied chunk by chunk (see :func:`write_arrow_file`).
+        The snapshot is written to a temporary folder of its own and swapped
+        in at the end, so an interrupted build never leaves a half-written
+        cache. Builds hold a lock file next to the cache folder, so
+        concurrent processes build one after the other.
+        """
+        with build_lock(self._lock_path()):
+            self._build()
+
+    def _build(self):
+        fingerprint = file_fingerprint(self.db_path)
+        parent = os.path.dirname(os.path.abspath(self.cache_dir))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(self.cache_dir) + ".", suffix=".tmp",
+                                   dir=parent)
+        try:
+            manifest = self._write_tables(tmp_dir, fingerprint)
+            self._write_manifest(manifest, tmp_dir)
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.replace(tmp_dir, self.cache_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.manifest = manifest
+
+    def _write_tables(self, folder, fingerprint):
+        """Write the Arrow file of every table to folder; return the manifest."""
+        manifest = {"version": CACHE_VERSION, "fingerprint": fingerprint, "tables": {}}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for table_name in list_tables(conn):
+                path = os.path.join(folder, f"{table_name}.arrow")
+                try:
+                    columns, rows = write_arrow_file(conn, table_name, path)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    # Mixed types in one column: keep reading this table from SQLite
+                    if os.path.exists(path):
+                        os.remove(path)
+                    columns = table_columns(conn, table_name)
+                    manifest["tables"][table_name] = {"cached": False, "columns": columns}
+                    continue
+                manifest["tables"][table_name] = {"cached": True, "columns": columns,
+                                                  "rows": rows}
+        finally:
+            conn.close()
+        return manifest
+
+    def table_names(self):
+        """
+        Return the Total*, Specific* and Instance* table names.
+
+        Served from the manifest when the snapshot is fresh, otherwise read
+        from sqlite_master.
+        """
+        if self.manifest is not None:
+            return list(self.manifest["tables"])
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return list_tables(conn)
+        finally:
+            conn.close()
+
+    def is_cached(self, table_name):
+        """Return True if the table can be read from the snapshot."""
+        entry = (self.manifest or {}).get("tables", {}).get(table_name)
+        return entry is not None and entry["cached"]
+
+    def columns(self, table_name):
+        """Return the column names of a table."""
+        if self.manifest is not None and table_name in self.manifest["tables"]:
+            return list(self.manifest["tables"][table_name]["columns"])
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")]
+        finally:
+            conn.close()
+
+    def read_table(self, table_name, columns=None, filter=None):
+        """
+        Read one table, restricted to the requested columns.
+
+        Cached tables are memory-mapped, so only the selected column buffers
+        are touched: the filter is evaluated on the projected columns plus
+        the columns it refers to. Columns that do not exist in the table are
+        skipped.
+
+        Args:
+            table_name (str): Name of the table to read.
+            columns (list of str, optional): Columns to load. Defaults to all.
+            filter (pyarrow.compute.Expression, optional): Row filter applied
+                to the snapshot before conversion to pandas. Only supported
+                for cached tables.
+
+        Returns:
+            pandas.DataFrame: The table content.
+
+        Raises:
+            ValueError: If a filter is given for a table that is not cached.
+        """
+        if not self.is_cached(table_name):
+            if filter is not None:
+                raise ValueError(f"Table {table_name} is not cached, filter it in SQL instead.")
+            return self._read_sqlite(table_name, columns)
+
+        with pa.memory_map(self._table_path(table_name), 'r') as source:
+            arrow_table = pa_ipc.open_file(source).read_all()
+        if columns is not None:
+            columns = [c for c in columns if c in arrow_table.column_names]
+        if filter is not None:
+            # The scanner only reads the projected columns and those of the filter
+            return pa_ds.dataset(arrow_table).to_table(columns=columns, filter=filter).to_pandas()
+        if columns is not None:
+            arrow_table = arrow_table.select(columns)
+        return arrow_table.to_pandas()
+
+    def iter_table(self, table_name, columns=None, filter=None, chunksize=100_000):
+        """
+        Read a cached table in slices of at most chunksize rows.
+
+        The snapshot is memory-mapped, so only the rows of the current
+        slice are converted to pandas; the rest stays on disk.
+
+        Args:
+            table_name (str): Name of a cached table.
+            columns (list of str, optional): Columns to load. Defaults to all.
+            filter (pyarrow.compute.Expression, optional): Row filter applied
+                to each slice before conversion to pandas.
+            chunksize (int): Number of snapshot rows per slice.
+
+        Yields:
+            pandas.DataFrame: The surviving rows of each slice.
+
+        Raises:
+            ValueError: If the table is not cached.
+        """
+        if not self.is_cached(table_name):
+            raise ValueError(f"Table {table_name} is not cached, read it from SQLite in chunks instead.")
+        with pa.memory_map(self._table_path(table_name), 'r') as source:
+            arrow_table = pa_ipc.open_file(source).read_all()  # zero-copy view of the file
+            if columns is not None:
+                columns = [c for c in columns if c in arrow_table.column_names]
+            for offset in range(0, arrow_table.num_rows, chunksize):
+                piece = arrow_table.slice(offset, chunksize)
+                if filter is not None:
+                    piece = pa_ds.dataset(piece).to_table(columns=columns, filter=filter)
+                elif columns is not None:
+                    piece = piece.select(columns)
+                yield piece.to_pandas()
+
+    def _read_sqlite(self, table_name, columns=None):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if columns is None:
+                return pd.read_sql(f"SELECT * FROM {table_name};", conn)
+            existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")]
+            selected = ", ".join(f'"{c}"' for c in columns if c in existing)
+            return pd.read_sql(f"SELECT {selected} FROM {table_name};", conn)
+        finally:
+            conn.close()
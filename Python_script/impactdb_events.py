@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Event-level index of the level-1 (Total) tables.
+
+Every event of the database is stored once, in a sorted Event_ID array with
+aligned Main_Event and date arrays. Event membership and the date back-fill
+of the level-3 rows are then binary searches (np.searchsorted) in that
+array instead of isin() and merges, and the same index serves every hazard
+type: for_hazard() only selects the events of one Main_Event.
+"""
+import numpy as np
+import pandas as pd
+
+import impactdb_cache as dbc
+import impactdb_loader as loader
+import impactdb_queries as dbq
+import impactdb_schema as schema
+
+
+class EventIndex:
+    """
+    Sorted Event_IDs with the Main_Event and dates of each event.
+
+    The position of an event in ``event_ids`` is its integer event number:
+    lookup() turns Event_IDs into these numbers, and the aligned arrays are
+    read with them. An event listed in several level-1 rows keeps the
+    values of its first row.
+
+    Args:
+        L1 (pandas.DataFrame): Level-1 rows with 'Event_ID' and optionally
+            'Main_Event' and the date columns.
+        date_cols (list of str, optional): Date columns to keep. Defaults to
+            impactdb_cache.DATE_COLUMNS (those present in L1).
+    """
+
+    def __init__(self, L1, date_cols=None):
+        date_cols = dbc.DATE_COLUMNS if date_cols is None else date_cols
+        ids = np.asarray(L1["Event_ID"], dtype=object)
+        rows = np.flatnonzero(pd.notna(ids))
+        # Sorted unique Event_IDs and the first level-1 row of each
+        event_ids, first = np.unique(ids[rows], return_index=True)
+        first_rows = rows[first]
+        if pd.api.types.infer_dtype(event_ids, skipna=False) == "string":
+            # Fixed-width unicode: searchsorted compares in C, not str by str
+            event_ids = event_ids.astype(str)
+        self.event_ids = event_ids
+
+        if "Main_Event" in L1.columns:
+            self.main_event = pd.Categorical(L1["Main_Event"]).take(first_rows)
+        else:
+            self.main_event = None
+        self.dates = {col: L1[col].array.take(first_rows)
+                      for col in date_cols if col in L1.columns}
+        self._hazards = {}  # hazard -> EventIndex of its events
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    @classmethod
+    def _from_arrays(cls, event_ids, main_event, dates):
+        index = cls.__new__(cls)
+        index.event_ids = event_ids
+        index.main_event = main_event
+        index.dates = dates
+        index._hazards = {}
+        return index
+
+    def _search(self, values):
+        """Find distinct Event_IDs (object array, no missing values): position or -1."""
+        result = np.full(len(values), -1, dtype=np.int64)
+        if len(self.event_ids) == 0 or len(values) == 0:
+            return result
+        if self.event_ids.dtype.kind != "U":
+            # IDs that are not all strings: hash lookup instead
+            return pd.Index(self.event_ids, dtype=object).get_indexer(values)
+
+        # Binary search; only strings can match string Event_IDs
+        if pd.api.types.infer_dtype(values, skipna=False) == "string":
+            rows = np.arange(len(values))
+        else:
+            rows = np.flatnonzero([isinstance(value, str) for value in values])
+        values = values[rows].astype(str)
+        positions = np.searchsorted(self.event_ids, values)
+        positions = np.minimum(positions, len(self.event_ids) - 1)
+        result[rows] = np.where(self.event_ids[positions] == values, positions, -1)
+        return result
+
+    def lookup(self, event_ids):
+        """
+        Find the event number of every Event_ID.
+
+        Each distinct Event_ID is searched once: through the categories of a
+        categorical column, otherwise after factorizing the values.
+
+        Args:
+            event_ids (array-like or pandas.Series): Event_IDs to find.
+
+        Returns:
+            numpy.ndarray: int64 position in ``event_ids`` per value, -1 for
+            missing values and unknown events.
+        """
+        if isinstance(getattr(event_ids, "dtype", None), pd.CategoricalDtype):
+            categorical = pd.Categorical(event_ids)
+            codes, distinct = categorical.codes, categorical.categories
+        else:
+            codes, distinct = pd.factorize(np.asarray(event_ids, dtype=object))
+        distinct_positions = self._search(np.asarray(distinct, dtype=object))
+        return np.where(codes >= 0, distinct_positions[codes], -1).astype(np.int64)
+
+    def contains(self, event_ids):
+        """Return a boolean mask: True where the Event_ID is in the index."""
+        return self.lookup(event_ids) >= 0
+
+    def date_values(self, col, positions):
+        """
+        Read a date column at event positions.
+
+        Args:
+            col (str): Date column, e.g. 'Start_Date_Year'.
+            positions (numpy.ndarray): Positions from lookup().
+
+        Returns:
+            pandas.api.extensions.ExtensionArray: One value per position,
+            missing where the position is -1.
+        """
+        return self.dates[col].take(positions, allow_fill=True)
+
+    def for_hazard(self, hazard):
+        """
+        Return the index of the events of one hazard type.
+
+        Sub-indexes are kept, so asking again for the same hazard is free.
+
+        Args:
+            hazard (str): Main_Event, e.g. "Tropical Storm/Cyclone".
+
+        Returns:
+            EventIndex: The events whose Main_Event is hazard, still sorted.
+
+        Raises:
+            ValueError: If the index was built without a 'Main_Event' column.
+        """
+        if self.main_event is None:
+            raise ValueError("The event index has no 'Main_Event' column.")
+        if hazard not in self._hazards:
+            keep = np.flatnonzero(np.asarray(self.main_event == hazard, dtype=bool))
+            self._hazards[hazard] = EventIndex._from_arrays(
+                self.event_ids[keep], self.main_event.take(keep),
+                {col: values.take(keep) for col, values in self.dates.items()})
+        return self._hazards[hazard]
+
+    def hazards(self):
+        """Return the Main_Event values present in the index."""
+        if self.main_event is None:
+            return []
+        return list(self.main_event.remove_unused_categories().categories)
+
+
+def load_event_index(db_path, cache=None, max_workers=None):
+    """
+    Build the event index of every level-1 event of the database.
+
+    All hazard types are read, so the index only has to be rebuilt when
+    the database itself changes.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+        max_workers (int, optional): Number of worker threads.
+
+    Returns:
+        EventIndex: Index over the Total tables that have a 'Main_Event' column.
+    """
+    with loader.ReadOnlyConnectionPool(db_path) as pool:
+        if cache is not None:
+            table_names = cache.table_names()
+            columns_of = cache.columns
+        else:
+            conn = pool.connection()
+            table_names = dbc.list_tables(conn)
+            columns_by_name = {name: dbq.table_columns(conn, name) for name in table_names}
+            columns_of = columns_by_name.get
+
+        # No Main_Event filter: every hazard type goes into the index
+        queries = [dbq.TableQuery(name, dbc.PIPELINE_COLUMNS["Total"])
+                   for name in table_names
+                   if dbc.table_family(name) == "Total" and "Main_Event" in columns_of(name)]
+        frames, _ = loader.load_queries(pool, queries, cache, max_workers=max_workers)
+
+    if not frames:
+        return EventIndex(pd.DataFrame({"Event_ID": [], "Main_Event": []}))
+    L1 = schema.apply_schema(pd.concat(list(frames.values()), ignore_index=True))
+    return EventIndex(L1)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Parallel loader for the Total/Specific/Instance table families.
+
+The tables are independent, so they are read concurrently by a pool of
+worker threads. Every worker owns its own read-only SQLite connection.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import impactdb_cache as dbc
+import impactdb_queries as dbq
+import impactdb_schema as schema
+
+# Impact categories compared in the analysis
+IMPACT_CATEGORIES = ("Deaths", "Injuries", "Damage")
+
+
+def table_category(table_name):
+    """
+    Classify a Specific*/Instance* table into an impact category.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        str or None: 'Deaths', 'Injuries' or 'Damage', or None for tables
+        of other impact types.
+    """
+    for category in IMPACT_CATEGORIES:
+        if category in table_name:
+            return category
+    return None
+
+
+def read_only_uri(db_path):
+    """Return the SQLite URI opening db_path in read-only mode."""
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+class ReadOnlyConnectionPool:
+    """
+    One read-only SQLite connection per worker thread.
+
+    Connections are opened lazily the first time a thread asks for one and
+    are all closed by :meth:`close`.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+    """
+
+    def __init__(self, db_path):
+        self.uri = read_only_uri(db_path)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """Return the calling thread's connection, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Close every connection opened by the pool."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_queries(pool, queries, cache=None, event_ids=None, max_workers=None):
+    """
+    Run several table queries concurrently.
+
+    Args:
+        pool (ReadOnlyConnectionPool): Connections used by the workers.
+        queries (list of impactdb_queries.TableQuery): Queries to run.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+        event_ids (array-like, optional): Event_IDs for the semi-joins.
+        max_workers (int, optional): Number of worker threads.
+
+    Returns:
+        tuple: (frames, timings) where frames maps table name -> DataFrame
+        (with a 'source_table' column) in the order of ``queries``, and
+        timings is a list of dicts with 'table', 'rows', 'seconds' and
+        'source' ('snapshot' or 'sqlite').
+    """
+    def load_one(query):
+        start = time.perf_counter()
+        df = dbq.read_query(pool.connection(), query, cache, event_ids=event_ids)
+        df["source_table"] = query.table_name
+        source = "snapshot" if cache is not None and cache.is_cached(query.table_name) else "sqlite"
+        timing = {"table": query.table_name, "rows": len(df),
+                  "seconds": time.perf_counter() - start, "source": source}
+        return df, timing
+
+    if not queries:
+        return {}, []
+    max_workers = max_workers or min(len(queries), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(load_one, queries))
+
+    frames = {query.table_name: df for query, (df, _) in zip(queries, results)}
+    timings = [timing for _, timing in results]
+    return frames, timings
+
+
+def group_by_category(frames):
+    """
+    Concatenate per-table frames into one frame per impact category.
+
+    Args:
+        frames (dict): Table name -> DataFrame, as returned by load_queries.
+
+    Returns:
+        dict: Category ('Deaths', 'Injuries', 'Damage') -> DataFrame, with
+        the compact dtypes of impactdb_schema.
+    """
+    grouped = {}
+    for table_name, df in frames.items():
+        grouped.setdefault(table_category(table_name), []).append(df)
+    return {category: schema.apply_schema(pd.concat(dfs, ignore_index=True))
+            for category, dfs in grouped.items()}
+
+
+def build_queries(db_path, hazard, year_after=None, cache=None):
+    """
+    Build the level-1 queries of a hazard and the Specific/Instance queries of its events.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+        hazard (str): Main_Event to keep, e.g. "Tropical Storm/Cyclone".
+        year_after (int, optional): Year pushed down into the level-3 reads.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot providing
+            the table names and columns; otherwise read from sqlite_master.
+
+    Returns:
+        tuple: (L1_queries, impact_queries), lists of impactdb_queries.TableQuery.
+        The impact queries only cover tables of the IMPACT_CATEGORIES.
+    """
+    if cache is not None:
+        table_names = cache.table_names()
+        columns_of = cache.columns
+    else:
+        conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+        try:
+            table_names = dbc.list_tables(conn)
+            columns_by_name = {name: dbq.table_columns(conn, name) for name in table_names}
+        finally:
+            conn.close()
+        columns_of = columns_by_name.get
+
+    L1_queries = dbq.event_queries(
+        {name: columns_of(name) for name in table_names if dbc.table_family(name) == "Total"},
+        dbc.PIPELINE_COLUMNS["Total"], hazard)
+
+    impact_queries = []
+    for name in table_names:
+        family = dbc.table_family(name)
+        if family == "Total" or table_category(name) is None:
+            continue
+        impact_queries.append(dbq.TableQuery(
+            name, dbc.PIPELINE_COLUMNS[family], events_from=L1_queries,
+            year_after=year_after if family == "Specific" else None))
+    return L1_queries, impact_queries
+
+
+def load_impactdb(db_path, hazard, year_after=None, cache=None, max_workers=None):
+    """
+    Load the level-1, level-3 and level-2 tables needed by run_analysis.
+
+    Level 1 is read first, since its Event_IDs are needed to filter the
+    snapshot; the Specific and Instance tables are then read together.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+        hazard (str): Main_Event to keep, e.g. "Tropical Storm/Cyclone".
+        year_after (int, optional): Year pushed down into the level-3 reads.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+        max_workers (int, optional): Number of worker threads.
+
+    Returns:
+        tuple: (L1, L3, L2, timings). L1 is a DataFrame, L3 and L2 map
+        category -> DataFrame, timings lists the per-table load timings.
+        All frames use the compact dtypes of impactdb_schema.
+    """
+    L1_queries, impact_queries = build_queries(db_path, hazard, year_after, cache)
+
+    with ReadOnlyConnectionPool(db_path) as pool:
+        L1_frames, timings = load_queries(pool, L1_queries, cache, max_workers=max_workers)
+        L1 = schema.apply_schema(pd.concat(list(L1_frames.values()), ignore_index=True))
+        impact_frames, impact_timings = load_queries(
+            pool, impact_queries, cache, event_ids=L1["Event_ID"].unique(),
+            max_workers=max_workers)
+
+    L3 = group_by_category({name: df for name, df in impact_frames.items()
+                            if dbc.table_family(name) == "Specific"})
+    L2 = group_by_category({name: df for name, df in impact_frames.items()
+                            if dbc.table_family(name) == "Instance"})
+    return L1, L3, L2, timings + impact_timings
+
+
+def stream_impact_tables(db_path, hazard, family, event_ids, chunksize=100_000,
+                         year_after=None, cache=None):
+    """
+    Read the Specific or Instance tables of a hazard's events chunk by chunk.
+
+    The tables are read one after the other, in a single thread, so only
+    one chunk is in memory at a time. Used by the streaming mode of
+    run_analysis for databases that do not fit in memory.
+
+    Args:
+        db_path (str): Path of the impactdb SQLite file.
+        hazard (str): Main_Event whose events are read.
+        family (str): 'Specific' (level 3) or 'Instance' (level 2).
+        event_ids (array-like): Event_IDs of the hazard, used to filter the
+            snapshot (SQLite reads use the level-1 sub-query instead).
+        chunksize (int): Number of rows read at a time.
+        year_after (int, optional): Year pushed down into the level-3 reads.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+
+    Yields:
+        tuple: (category, chunk) with the impact category ('Deaths',
+        'Injuries', 'Damage') and a DataFrame in the compact dtypes of
+        impactdb_schema, with a 'source_table' column.
+    """
+    _, impact_queries = build_queries(db_path, hazard, year_after, cache)
+    with ReadOnlyConnectionPool(db_path) as pool:
+        for query in impact_queries:
+            if dbc.table_family(query.table_name) != family:
+                continue
+            for chunk in dbq.read_query_chunks(pool.connection(), query, chunksize,
+                                               cache, event_ids=event_ids):
+                chunk["source_table"] = query.table_name
+                yield table_category(query.table_name), schema.apply_schema(chunk)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Query builder for the impactdb tables.
+
+Instead of loading whole tables and filtering them in pandas, the hazard,
+event and year filters are turned into parameterized SQL, so only the rows
+that survive them are ever converted into DataFrames.
+"""
+import pandas as pd
+
+from impactdb_cache import DATE_COLUMNS, IMPACT_COLUMNS
+
+try:  # only needed to filter the Arrow snapshot, see TableQuery.arrow_filter
+    import pyarrow.compute as pc
+except ImportError:
+    pc = None
+
+
+def quote(identifier):
+    """Quote a table or column name for use in SQL."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def table_columns(conn, table_name):
+    """
+    Return the column names of a table.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the impact database.
+        table_name (str): Name of the table.
+
+    Returns:
+        list of str: Column names in table order.
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote(table_name)});")]
+
+
+class TableQuery:
+    """
+    Projection and filters for reading one impactdb table.
+
+    Args:
+        table_name (str): Name of the table to read.
+        columns (list of str): Columns to load. Columns missing from the
+            table are skipped.
+        main_event (str, optional): Keep only rows whose 'Main_Event' equals
+            this value (used on the Total* tables).
+        events_from (list of TableQuery, optional): Keep only rows whose
+            'Event_ID' is returned by one of these event queries (semi-join).
+        year_after (int, optional): Drop rows whose 'Start_Date_Year' is
+            known and not strictly greater than this year. Rows with a
+            missing year are kept, because run_analysis back-fills them
+            from level 1 before applying the final year filter.
+    """
+
+    def __init__(self, table_name, columns, main_event=None, events_from=None, year_after=None):
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.main_event = main_event
+        self.events_from = list(events_from or [])
+        self.year_after = year_after
+
+    def event_id_sql(self):
+        """
+        Build the sub-query returning the Event_IDs selected by this query.
+
+        Returns:
+            tuple: (sql, params) for ``SELECT Event_ID FROM ... WHERE ...``.
+        """
+        where, params = self._where(None)
+        return f"SELECT Event_ID FROM {quote(self.table_name)}{where}", params
+
+    def select_sql(self, existing_columns=None):
+        """
+        Build the SELECT statement for this query.
+
+        Args:
+            existing_columns (list of str, optional): Columns present in the
+                table; the projection is restricted to them.
+
+        Returns:
+            tuple: (sql, params) ready for ``pandas.read_sql``.
+        """
+        columns = self.columns
+        if existing_columns is not None:
+            columns = [c for c in columns if c in existing_columns]
+        projection = ", ".join(quote(c) for c in columns)
+        where, params = self._where(existing_columns)
+        return f"SELECT {projection} FROM {quote(self.table_name)}{where};", params
+
+    def arrow_filter(self, event_ids=None, existing_columns=None):
+        """
+        Build the same filters as :meth:`select_sql` as an Arrow expression.
+
+        The semi-join cannot be expressed on a single snapshot file, so the
+        Event_IDs returned by the event queries are passed in instead.
+
+        Args:
+            event_ids (array-like, optional): Event_IDs selected by
+                ``events_from``. Required if ``events_from`` is set.
+            existing_columns (list of str, optional): Columns present in the
+                table.
+
+        Returns:
+            pyarrow.compute.Expression or None: Filter expression, or None
+            if the query has no filters.
+        """
+        expressions = []
+        if self.main_event is not None:
+            expressions.append(pc.field("Main_Event") == self.main_event)
+        if self.events_from:
+            expressions.append(pc.field("Event_ID").isin(list(event_ids)))
+        if self.year_after is not None and self._has_year(existing_columns):
+            year = pc.field("Start_Date_Year")
+            expressions.append((year > self.year_after) | year.is_null())
+        if not expressions:
+            return None
+        expression = expressions[0]
+        for other in expressions[1:]:
+            expression = expression & other
+        return expression
+
+    def _has_year(self, existing_columns):
+        return existing_columns is None or "Start_Date_Year" in existing_columns
+
+    def _where(self, existing_columns):
+        clauses, params = [], []
+        if self.main_event is not None:
+            clauses.append("Main_Event = ?")
+            params.append(self.main_event)
+        if self.events_from:
+            sub_sqls = []
+            for event_query in self.events_from:
+                sub_sql, sub_params = event_query.event_id_sql()
+                sub_sqls.append(sub_sql)
+                params.extend(sub_params)
+            clauses.append(f"Event_ID IN ({' UNION '.join(sub_sqls)})")
+        if self.year_after is not None and self._has_year(existing_columns):
+            clauses.append("(Start_Date_Year > ? OR Start_Date_Year IS NULL)")
+            params.append(self.year_after)
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+
+
+def event_queries(table_columns_by_name, columns, main_event):
+    """
+    Build the level-1 queries selecting one hazard type from the Total tables.
+
+    Only Total tables that have a 'Main_Event' column can match a hazard
+    type, so the others are left out.
+
+    Args:
+        table_columns_by_name (dict): Total table name -> list of its columns.
+        columns (list of str): Columns to load from each table.
+        main_event (str): Hazard type to keep, e.g. "Tropical Storm/Cyclone".
+
+    Returns:
+        list of TableQuery: One query per Total table with a 'Main_Event' column.
+    """
+    return [TableQuery(name, columns, main_event=main_event)
+            for name, existing in table_columns_by_name.items()
+            if "Main_Event" in existing]
+
+
+def read_query(conn, query, cache=None, event_ids=None):
+    """
+    Execute a TableQuery against SQLite and return the surviving rows.
+
+    If the table is in the Arrow snapshot, the filters are applied to the
+    memory-mapped table instead and only the surviving rows are converted.
+    Date and impact columns that come back entirely NULL are cast to float64,
+    so that a filtered read has the same dtypes as a full-table read.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the impact database.
+        query (TableQuery): Query to execute.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+        event_ids (array-like, optional): Event_IDs of the ``events_from``
+            queries, needed when reading from the snapshot.
+
+    Returns:
+        pandas.DataFrame: Rows and columns selected by the query.
+    """
+    if cache is not None and cache.is_cached(query.table_name):
+        existing = cache.columns(query.table_name)
+        return cache.read_table(query.table_name, query.columns,
+                                filter=query.arrow_filter(event_ids, existing))
+
+    sql, params = query.select_sql(table_columns(conn, query.table_name))
+    return _cast_null_columns(pd.read_sql(sql, conn, params=params))
+
+
+def read_query_chunks(conn, query, chunksize, cache=None, event_ids=None):
+    """
+    Execute a TableQuery chunk by chunk, like read_query.
+
+    SQLite rows are fetched chunksize at a time (read_sql with chunksize);
+    a cached table is sliced in the memory-mapped snapshot instead. Either
+    way, only one chunk is held in memory at a time.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the impact database.
+        query (TableQuery): Query to execute.
+        chunksize (int): Number of rows read at a time.
+        cache (impactdb_cache.ImpactDBCache, optional): Snapshot to read from.
+        event_ids (array-like, optional): Event_IDs of the ``events_from``
+            queries, needed when reading from the snapshot.
+
+    Yields:
+        pandas.DataFrame: Rows and columns selected by the query, per chunk.
+    """
+    if cache is not None and cache.is_cached(query.table_name):
+        existing = cache.columns(query.table_name)
+        yield from cache.iter_table(query.table_name, query.columns,
+                                    filter=query.arrow_filter(event_ids, existing),
+                                    chunksize=chunksize)
+        return
+
+    sql, params = query.select_sql(table_columns(conn, query.table_name))
+    for df in pd.read_sql(sql, conn, params=params, chunksize=chunksize):
+        yield _cast_null_columns(df)
+
+
+def _cast_null_columns(df):
+    """Cast date and impact columns that came back entirely NULL to float64."""
+    for col in DATE_COLUMNS + IMPACT_COLUMNS:
+        if col in df.columns and df[col].dtype == object and df[col].isna().all():
+            df[col] = df[col].astype("float64")
+    return df
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Compact dtypes for the impactdb tables.
+
+IDs, ISO codes and table names repeat a lot, so they are stored as
+categoricals; years, months and days fit in nullable small integers.
+The dtypes are assigned once at load time and kept through the pipeline.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Repeated strings -> categorical
+CATEGORY_COLUMNS = [
+    "Event_ID", "Main_Event", "source_table",
+    "Administrative_Area_GID", "Administrative_Areas_GID"]
+
+# Nullable integers, small enough for every realistic date
+INTEGER_COLUMNS = {
+    "Start_Date_Year": "Int16", "Start_Date_Month": "Int8", "Start_Date_Day": "Int8",
+    "End_Date_Year": "Int16", "End_Date_Month": "Int8", "End_Date_Day": "Int8"}
+
+
+def apply_schema(df):
+    """
+    Convert the known impactdb columns of a DataFrame to compact dtypes.
+
+    Columns that are missing are skipped. A date column whose values cannot
+    be stored as small integers (e.g. text or fractional values) is left
+    unchanged rather than altered.
+
+    Args:
+        df (pandas.DataFrame): Freshly loaded impactdb table(s).
+
+    Returns:
+        pandas.DataFrame: The same DataFrame, converted in place.
+    """
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in df.columns and df[col].dtype != dtype:
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def align_categories(left, right, columns):
+    """
+    Give the categorical columns of two DataFrames the same categories.
+
+    Merging on categoricals with different categories falls back to object
+    columns; with aligned categories the merge keys stay categorical.
+
+    Args:
+        left (pandas.DataFrame): First DataFrame.
+        right (pandas.DataFrame): Second DataFrame.
+        columns (list of str): Columns to align. Columns that are not
+            categorical on both sides are left unchanged.
+
+    Returns:
+        tuple: (left, right) shallow copies with aligned categories.
+    """
+    left, right = left.copy(deep=False), right.copy(deep=False)
+    for col in columns:
+        if not (isinstance(left[col].dtype, pd.CategoricalDtype)
+                and isinstance(right[col].dtype, pd.CategoricalDtype)):
+            continue
+        if left[col].cat.categories.equals(right[col].cat.categories):
+            continue
+        categories = union_categoricals(
+            [left[col].cat.remove_unused_categories(), right[col].cat.remove_unused_categories()],
+            sort_categories=True).categories
+        left[col] = left[col].cat.set_categories(categories)
+        right[col] = right[col].cat.set_categories(categories)
+    return left, right
+
+
+def concat_frames(frames):
+    """
+    Concatenate DataFrames, keeping the categorical columns categorical.
+
+    The categories of a column that is categorical in every frame are
+    unioned first (pd.concat would otherwise fall back to object columns).
+
+    Args:
+        frames (list of pandas.DataFrame): Frames with the same columns.
+
+    Returns:
+        pandas.DataFrame: Rows of every frame, in order, with a RangeIndex.
+    """
+    frames = [df.copy(deep=False) for df in frames]
+    for col in frames[0].columns:
+        if not all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            continue
+        union = union_categoricals([df[col] for df in frames], sort_categories=True).categories
+        for df in frames:
+            df[col] = df[col].cat.set_categories(union)
+    return pd.concat(frames, ignore_index=True)
+
+
+def stack_frames(frames, key, categories=None):
+    """
+    Stack per-key DataFrames into one long frame with a categorical key column.
+
+    Categorical columns keep their dtype, see concat_frames.
+
+    Args:
+        frames (dict): Key value -> DataFrame, e.g. 'Deaths' -> L3 deaths rows.
+        key (str): Name of the key column added in front, e.g. 'Impact_Type'.
+        categories (list, optional): Categories of the key column, in order.
+            Defaults to the keys of ``frames``.
+
+    Returns:
+        pandas.DataFrame: Rows of every frame, in the order of ``frames``,
+        with a RangeIndex.
+    """
+    names = list(frames)
+    dfs = [frames[name] for name in names]
+    categories = list(categories) if categories is not None else names
+    if not dfs:
+        return pd.DataFrame({key: pd.Categorical([], categories=categories)})
+
+    stacked = concat_frames(dfs)
+    key_values = np.repeat(np.array(names, dtype=object), [len(df) for df in dfs])
+    stacked.insert(0, key, pd.Categorical(key_values, categories=categories))
+    return stacked
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Timing and memory instrumentation of the analysis pipeline.
+
+Every measured span (a task stage of run_analysis, a cached pipeline step
+or a data_processing_functions call) records its wall time, CPU time,
+resident memory and, when tracing is on, the peak of the Python
+allocations during the span, plus the number of input and output rows.
+The records are appended to a JSON-lines log, one object per line.
+"""
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+import pandas as pd
+
+try:  # psutil is optional: without it the current RSS is read from /proc (Linux only)
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+# Current RSS without psutil: resident pages in the second field of this file
+STATM_PATH = "/proc/self/statm"
+
+
+def default_log_path():
+    """Return the project-level metrics log (Data/logs/pipeline_metrics.jsonl)."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), 'Data', 'logs', 'pipeline_metrics.jsonl')
+
+
+def rss_mb():
+    """Current resident memory of the process in MB, or None if unknown."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / MB
+    try:
+        with open(STATM_PATH, 'r') as fh:
+            resident_pages = int(fh.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, IndexError, AttributeError):  # no /proc (macOS, Windows)
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process so far in MB, or None if unknown."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / MB if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / MB
+    return None
+
+
+def count_rows(value):
+    """Rows of a DataFrame/Series result (first item of a tuple), else None."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+class PipelineMetrics:
+    """
+    Collects measured spans and writes them to a JSON-lines log.
+
+    Spans may nest (a stage calls functions that call functions); each
+    record carries its depth. Stages marked with mark() follow each other:
+    marking a stage ends the previous one.
+
+    Args:
+        log_path (str, optional): JSON-lines file the records are appended
+            to. Defaults to Data/logs/pipeline_metrics.jsonl; pass False to
+            keep the records in memory only.
+        trace_memory (bool): Also measure the peak Python allocations of
+            every span with tracemalloc (slows the run down noticeably).
+    """
+
+    def __init__(self, log_path=None, trace_memory=False):
+        self.log_path = default_log_path() if log_path is None else log_path
+        self.trace_memory = trace_memory
+        self.records = []     # records of the current run
+        self.run_id = None
+        self._open = []       # spans being measured, innermost last
+        self._mark = None     # span of the current marked stage
+
+    # --- spans ---
+    def begin(self, kind, name, rows_in=None):
+        """Start measuring a span and return it (pass it to end())."""
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # The outer span keeps the peak reached so far before we reset it
+            if self._open:
+                self._open[-1]["_carried_peak"] = max(self._open[-1]["_carried_peak"],
+                                                      tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        span = {"kind": kind, "name": name, "depth": len(self._open), "rows_in": rows_in,
+                "_wall": time.perf_counter(), "_cpu": time.process_time(), "_rss": rss_mb(),
+                "_traced": tracemalloc.get_traced_memory()[0] if self.trace_memory else 0,
+                "_carried_peak": 0}
+        self._open.append(span)
+        return span
+
+    def end(self, span, rows_out=None, **extra):
+        """Finish a span and record it."""
+        wall = time.perf_counter() - span["_wall"]
+        cpu = time.process_time() - span["_cpu"]
+        rss, peak_rss = rss_mb(), peak_rss_mb()
+        record = {"run_id": self.run_id, "time": time.time(), "kind": span["kind"],
+                  "name": span["name"], "depth": span["depth"],
+                  "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+                  "rss_mb": None if rss is None else round(rss, 2),
+                  "rss_delta_mb": None if rss is None or span["_rss"] is None
+                  else round(rss - span["_rss"], 2),
+                  "peak_rss_mb": None if peak_rss is None else round(peak_rss, 2),
+                  "rows_in": span["rows_in"], "rows_out": rows_out}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, span["_carried_peak"])
+            record["alloc_delta_mb"] = round((current - span["_traced"]) / MB, 3)
+            record["alloc_peak_mb"] = round((peak - span["_traced"]) / MB, 3)
+        record.update(extra)
+
+        self._open = [other for other in self._open if other is not span]
+        if self.trace_memory and self._open:
+            self._open[-1]["_carried_peak"] = max(self._open[-1]["_carried_peak"], peak)
+        self.records.append(record)
+        self._write(record)
+        return record
+
+    def measure(self, kind, name, rows_in=None):
+        """Context manager measuring the enclosed block as one span."""
+        return _Measure(self, kind, name, rows_in)
+
+    def mark(self, stage):
+        """End the current marked stage (if any) and start measuring stage."""
+        self.end_mark()
+        self._mark = self.begin("stage", stage)
+
+    def end_mark(self):
+        """End the current marked stage, if any."""
+        if self._mark is not None:
+            mark, self._mark = self._mark, None
+            self.end(mark)
+
+    # --- runs ---
+    def start_run(self, **params):
+        """Start a new run: clears the records and measures the whole run."""
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self._open, self._mark = [], None
+        span = self.begin("run", "run_analysis")
+        span["params"] = params
+        return span
+
+    def end_run(self, span, error=None):
+        """Finish the run started by start_run(); error is the exception text, if any."""
+        self.end_mark()
+        # Spans left open by an exception end with the run
+        while self._open and self._open[-1] is not span:
+            self.end(self._open[-1], error=True)
+        return self.end(span, params=span["params"], error=error)
+
+    # --- functions ---
+    def wrap(self, func, kind="function", name=None):
+        """
+        Return func measured as one span per call.
+
+        Rows are counted on the first DataFrame/Series argument and on the
+        result (or its first item if it is a tuple).
+        """
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def measured(*args, **kwargs):
+            rows_in = next((len(arg) for arg in args if isinstance(arg, (pd.DataFrame, pd.Series))), None)
+            span = self.begin(kind, name, rows_in)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                self.end(span, error=True)
+                raise
+            self.end(span, rows_out=count_rows(result))
+            return result
+
+        return measured
+
+    def instrument_module(self, module, names=None, exclude=()):
+        """
+        Replace the public functions of a module by measured versions.
+
+        Calls between the module's own functions go through the module
+        globals, so they are measured too. Call restore_module() to undo.
+
+        Args:
+            module (module): e.g. data_processing_functions.
+            names (list of str, optional): Functions to wrap. Defaults to
+                every public function defined in the module.
+            exclude (iterable of str): Functions left alone, e.g. those
+                called once per row, where measuring costs more than the call.
+        """
+        originals = getattr(module, "__metrics_originals__", {})
+        if names is None:
+            names = [name for name, value in vars(module).items()
+                     if callable(value) and not name.startswith("_") and not isinstance(value, type)
+                     and getattr(value, "__module__", None) == module.__name__]
+        for name in names:
+            if name in exclude:
+                continue
+            func = originals.get(name, getattr(module, name))
+            originals[name] = func
+            setattr(module, name, self.wrap(func, name=f"{module.__name__.split('.')[-1]}.{name}"))
+        module.__metrics_originals__ = originals
+
+    @staticmethod
+    def restore_module(module):
+        """Put back the functions replaced by instrument_module()."""
+        for name, func in getattr(module, "__metrics_originals__", {}).items():
+            setattr(module, name, func)
+        module.__metrics_originals__ = {}
+
+    # --- output ---
+    def _write(self, record):
+        if not self.log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(record, default=str) + "\n")
+        except OSError:
+            pass  # metrics must never break the analysis
+
+    def summary(self):
+        """
+        Per-stage totals of the current run.
+
+        Returns:
+            dict: Stage name -> {'wall_s', 'cpu_s', 'peak_rss_mb'}, in the
+            order the stages ran, plus 'total' for the whole run if it ended.
+        """
+        summary = {}
+        for record in self.records:
+            if record["kind"] not in ("stage", "run"):
+                continue
+            key = "total" if record["kind"] == "run" else record["name"]
+            entry = summary.setdefault(key, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": None})
+            entry["wall_s"] += record["wall_s"]
+            entry["cpu_s"] += record["cpu_s"]
+            entry["peak_rss_mb"] = record["peak_rss_mb"]
+        return summary
+
+
+def format_summary(summary):
+    """One-line text of a summary(), e.g. 'load 1.2s | filter 0.3s | total 2.0s'."""
+    parts = [f"{stage} {entry['wall_s']:.1f}s" for stage, entry in summary.items()]
+    peak = summary.get("total", {}).get("peak_rss_mb")
+    if peak is not None:
+        parts.append(f"peak {peak:.0f} MB")
+    return " | ".join(parts)
+
+
+class _Measure:
+    """Context manager returned by PipelineMetrics.measure()."""
+
+    def __init__(self, metrics, kind, name, rows_in):
+        self.metrics, self.kind, self.name, self.rows_in = metrics, kind, name, rows_in
+        self.rows_out = None  # may be set inside the block
+
+    def __enter__(self):
+        self.span = self.metrics.begin(self.kind, self.name, self.rows_in)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.metrics.end(self.span, rows_out=self.rows_out)
+        else:
+            self.metrics.end(self.span, rows_out=self.rows_out, error=True)
+        return False
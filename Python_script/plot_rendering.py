@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Rendering of the comparison figures.
+
+Figures are drawn on the non-interactive Agg backend with the
+object-oriented Figure API: nothing is registered in pyplot, so every
+figure is released as soon as it is saved. The four figures of a run are
+independent and are rendered in parallel by a pool of worker processes.
+
+Rendered files are kept in a content-addressed cache (Data/cache/plots),
+keyed on a hash of the plotted data and of the style, so a figure whose
+data did not change is never drawn twice.
+"""
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pickle import PicklingError
+
+import matplotlib
+matplotlib.use("Agg")  # no GUI event loop needed to draw into files
+from matplotlib.figure import Figure
+import seaborn as sns
+
+DEFAULT_DPI = 300
+DEFAULT_FORMAT = "png"
+
+# Bump when the drawing code changes, so cached figures are redrawn
+RENDER_VERSION = 1
+
+# Number of cached figures kept, the least recently used are removed
+CACHE_SIZE = 64
+
+# Figures used this recently are never pruned: another process sharing the
+# cache (e.g. a sweep worker) may be about to publish them
+PRUNE_GRACE_SECONDS = 60
+
+# Worker processes kept between runs, created on first use
+_POOL = None
+_POOL_WORKERS = None
+
+
+def default_image_dir():
+    """Return the project Images folder."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), 'Images')
+
+
+def default_cache_dir():
+    """Return the project-level figure cache folder (Data/cache/plots)."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), 'Data', 'cache', 'plots')
+
+
+def image_path(name, output_dir=None, fmt=DEFAULT_FORMAT):
+    """
+    Build the path of a comparison figure.
+
+    Args:
+        name (str): Figure name, e.g. 'Deaths' or 'Spatial_Global'.
+        output_dir (str, optional): Folder of the figure. Defaults to Images/.
+        fmt (str): File format / extension.
+
+    Returns:
+        str: Path of EM_DAT_Wikimpacts_<name>_comparison.<fmt>.
+    """
+    output_dir = output_dir or default_image_dir()
+    return os.path.join(output_dir, f"EM_DAT_Wikimpacts_{name}_comparison.{fmt}")
+
+
+def impact_job(category_name, counts, path, dpi=DEFAULT_DPI):
+    """
+    Describe the bar chart of one impact category.
+
+    Args:
+        category_name (str): Category shown in the title.
+        counts (dict): Difference bin label -> number of events, in plot order.
+        path (str): Output file.
+        dpi (int): Resolution of the saved figure.
+
+    Returns:
+        dict: Job for render_job / render_all.
+    """
+    return {"kind": "impacts", "path": path, "dpi": dpi,
+            "category_name": category_name, "counts": dict(counts)}
+
+
+def spatial_job(world_map, path, dpi=DEFAULT_DPI):
+    """
+    Describe the global map of the country-level differences.
+
+    Args:
+        world_map (geopandas.GeoDataFrame): Countries with a 'difference' column.
+        path (str): Output file.
+        dpi (int): Resolution of the saved figure.
+
+    Returns:
+        dict: Job for render_job / render_all.
+    """
+    return {"kind": "spatial", "path": path, "dpi": dpi, "world_map": world_map}
+
+
+def draw_impacts(fig, category_name, counts):
+    """Draw the bar chart of the difference bins of one category."""
+    labels = list(counts)
+    heights = [counts[label] for label in labels]
+
+    ax = fig.add_subplot(1, 1, 1)
+    ax.bar(labels, heights, color=sns.color_palette('viridis', len(labels)), width=0.8)
+
+    # Formatting
+    ax.set_title(f'Comparison of {category_name}: EM-DAT vs Wikimpacts', fontsize=15)
+    ax.set_xlabel('Impact Difference Category', fontsize=12)
+    ax.set_ylabel('Count of Events', fontsize=12)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    # Add count labels on top of bars
+    for p in ax.patches:
+        ax.annotate(f'{int(p.get_height())}',
+                    (p.get_x() + p.get_width() / 2., p.get_height()),
+                    ha='center', va='center',
+                    xytext=(0, 9),
+                    textcoords='offset points')
+
+
+def draw_spatial(fig, world_map):
+    """Draw the world map of the Wikimpacts - EM-DAT differences."""
+    ax = fig.add_subplot(1, 1, 1)
+    world_map.plot(
+        column="difference",
+        cmap="coolwarm",
+        linewidth=0.4,
+        edgecolor="black",
+        legend=True,
+        legend_kwds={"label": "Wikimpacts − EM-DAT"},
+        missing_kwds={"color": "lightgrey"},
+        ax=ax
+    )
+    ax.set_title(
+        "Spatial Differences Between EM-DAT and Wikimpacts\n(Tropical Cyclone Impacts)",
+        fontsize=16
+    )
+    ax.axis("off")
+
+
+def render_job(job):
+    """
+    Draw and save one figure.
+
+    Args:
+        job (dict): Job from impact_job or spatial_job.
+
+    Returns:
+        str: Path of the saved figure.
+
+    Raises:
+        ValueError: If the job kind is unknown.
+    """
+    if job["kind"] == "impacts":
+        fig = Figure(figsize=(10, 6))
+        draw_impacts(fig, job["category_name"], job["counts"])
+        savefig_kwargs = {}
+    elif job["kind"] == "spatial":
+        fig = Figure(figsize=(16, 9))
+        draw_spatial(fig, job["world_map"])
+        savefig_kwargs = {"bbox_inches": "tight"}
+    else:
+        raise ValueError(f"Unknown render job kind {job['kind']!r}")
+
+    # Written next to the target and swapped in: a published output path may
+    # be a hard link to a cached figure, which must not be overwritten
+    path = job["path"]
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # processes may draw the same figure at once
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fig.savefig(tmp_path, dpi=job["dpi"], format=os.path.splitext(path)[1][1:] or None,
+                    **savefig_kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        fig.clear()  # release the artists right away, not at the next GC pass
+    return path
+
+
+def job_key(job):
+    """
+    Hash everything that determines the pixels of a figure.
+
+    Bar charts are keyed on their bin counts, the map on the plotted
+    'difference' column and the country geometry; both also on the kind,
+    title, dpi, file format and RENDER_VERSION.
+
+    Args:
+        job (dict): Job from impact_job or spatial_job.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    style = {"version": RENDER_VERSION, "kind": job["kind"], "dpi": job["dpi"],
+             "format": os.path.splitext(job["path"])[1].lower()}
+    if job["kind"] == "impacts":
+        style["category_name"] = job["category_name"]
+        style["counts"] = list(job["counts"].items())
+
+    digest = hashlib.sha256(json.dumps(style, sort_keys=True).encode("utf-8"))
+    if job["kind"] == "spatial":
+        world_map = job["world_map"]
+        digest.update(world_map["difference"].to_numpy(dtype="float64", na_value=float("nan")).tobytes())
+        for geometry in world_map.geometry.to_wkb():
+            digest.update(geometry or b"")
+    return digest.hexdigest()
+
+
+def _cache_path(job, key, cache_dir):
+    """File of a job in the figure cache: <output name>_<key prefix>.<fmt>."""
+    stem, ext = os.path.splitext(os.path.basename(job["path"]))
+    return os.path.join(cache_dir, f"{stem}_{key[:20]}{ext}")
+
+
+def _publish(cached, path):
+    """Make the requested output path show the cached figure."""
+    if os.path.exists(path) and os.path.samefile(cached, path):
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(cached, tmp_path)  # no copy when both are on the same disk
+    except OSError:
+        shutil.copyfile(cached, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def prune_cache(cache_dir=None, keep=CACHE_SIZE):
+    """Remove all but the ``keep`` most recently used cached figures."""
+    cache_dir = cache_dir or default_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.is_file():
+                entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:  # pruned by another process meanwhile
+            pass
+    entries.sort(reverse=True)
+    recent = time.time() - PRUNE_GRACE_SECONDS
+    for mtime, path in entries[keep:]:
+        if mtime >= recent:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _pool(max_workers):
+    """Return the shared worker pool, (re)creating it if needed."""
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS != max_workers:
+        shutdown()
+        # spawn: the caller may run in a GUI thread, where forking is unsafe
+        _POOL = ProcessPoolExecutor(max_workers=max_workers,
+                                    mp_context=multiprocessing.get_context("spawn"))
+        _POOL_WORKERS = max_workers
+    return _POOL
+
+
+def shutdown():
+    """Stop the worker processes, if any."""
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
+
+
+atexit.register(shutdown)
+
+
+def _render_jobs(jobs, max_workers):
+    """Render jobs, in parallel worker processes when possible."""
+    if not jobs:
+        return []
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    if max_workers > 1 and len(jobs) > 1:
+        try:
+            return list(_pool(max_workers).map(render_job, jobs))
+        except (BrokenProcessPool, PicklingError, OSError) as exc:
+            print(f"Parallel rendering unavailable ({exc}), rendering in this process.")
+            shutdown()
+    return [render_job(job) for job in jobs]
+
+
+def render_all(jobs, max_workers=None, cache=True, cache_dir=None):
+    """
+    Render several figures, skipping those already in the figure cache.
+
+    Args:
+        jobs (list of dict): Jobs from impact_job / spatial_job.
+        max_workers (int, optional): Number of worker processes. Defaults
+            to one per job (at most the number of CPUs). With 1, or if the
+            pool cannot be used, the figures are rendered in this process.
+        cache (bool): Use the figure cache. If False, every figure is drawn
+            straight to its output path.
+        cache_dir (str, optional): Figure cache folder. Defaults to
+            Data/cache/plots in the repository.
+
+    Returns:
+        list of str: Output path of each job, in the order of ``jobs``.
+        Never a file of the cache folder, which prune_cache may remove
+        while the caller still shows the figure.
+    """
+    if not cache:
+        paths = _render_jobs(jobs, max_workers)
+        for path in paths:
+            print(f"Plot saved: {os.path.basename(path)}")
+        return paths
+
+    cache_dir = cache_dir or default_cache_dir()
+    cached_paths = [_cache_path(job, job_key(job), cache_dir) for job in jobs]
+    misses = [dict(job, path=cached) for job, cached in zip(jobs, cached_paths)
+              if not os.path.exists(cached)]
+    _render_jobs(misses, max_workers)
+
+    for job, cached in zip(jobs, cached_paths):
+        os.utime(cached)  # most recently used, see prune_cache
+        _publish(cached, job["path"])
+        state = "saved" if any(miss["path"] == cached for miss in misses) else "unchanged, not redrawn"
+        print(f"Plot {state}: {os.path.basename(job['path'])}")
+    prune_cache(cache_dir)
+    return [job["path"] for job in jobs]
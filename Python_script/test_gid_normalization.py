@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+normalize_gids and clean_dataframe against the row-wise GID functions.
+
+The vectorized cleaning must keep, row by row, exactly the code that
+get_single_valid_gid (level 3) or get_single_valid_gid_instance (level 2)
+returns, and raise where they raise.
+
+    python -m pytest Python_script/test_gid_normalization.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing_functions as dpf
+
+ROW_WISE = {False: dpf.get_single_valid_gid, True: dpf.get_single_valid_gid_instance}
+GID_COLUMNS = {False: "Administrative_Area_GID", True: "Administrative_Areas_GID"}
+
+# Shapes found in the impactdb GID columns, and malformed ones
+GID_ENTRIES = {
+    "single": "['USA']",
+    "double quotes": '["USA"]',
+    "subdivision": "['USA.12_1']",
+    "same country twice": "['USA', 'USA.1_1']",
+    "two countries": "['USA', 'CHN']",
+    "lower case": "['chn']",
+    "padded code": "[' CHN ']",
+    "non-ascii letters": "['ÄBC']",
+    "too short": "['US']",
+    "digits": "['12A']",
+    "empty code": "['']",
+    "empty list": "[]",
+    "spaces in brackets": " [ 'PHL' , ]",
+    "newline in list": "['PHL',\n 'PHL.3_1']",
+    "nested": "[['USA'], ['USA.2_1']]",
+    "nested two countries": "[['USA'], ['CHN']]",
+    "nested first empty": "[[], ['PHL']]",
+    "nested first two countries": "[['USA', 'MEX'], ['CHN']]",
+    "deep nesting": "[[['USA']]]",
+    "bare code": "USA",
+    "bare subdivision": "AUS.10",
+    "empty string": "",
+    "none string": "None",
+    "nan string": "nan",
+    "unclosed list": "['USA'",
+    "trailing text": "['USA'] x",
+    "number in list": "[1, 'USA']",
+    "None in list": "[None, 'USA']",
+    "tuple": "('USA',)",
+    "quoted string": "'USA'",
+    "escaped quote": "['US\\'A']",
+    "implicit concatenation": "['U' 'SA']",
+    "unicode prefix": "[u'USA']",
+    "leading tab": "\t['USA']",
+    "leading newline": "\n['USA']",
+    "NaN": np.nan,
+    "None": None,
+    "list object": ["USA"],
+    "nested list object": [["CHN"], ["MEX"]],
+}
+
+
+def row_wise(entry, instance):
+    """Output of the row-wise function, or the exception class it raises."""
+    try:
+        return ROW_WISE[instance](entry)
+    except Exception as exc:
+        return type(exc)
+
+
+def assert_same_codes(got, expected):
+    got, expected = pd.Series(got, dtype=object), pd.Series(expected, dtype=object)
+    same = (got.isna() & expected.isna()) | (got == expected)
+    assert same.all(), pd.DataFrame({"got": got, "expected": expected})[~same.to_numpy()]
+
+
+def random_entries(seed, n=5000):
+    """Seeded mix of well-formed, nested and malformed GID strings."""
+    rng = np.random.default_rng(seed)
+    tokens = ["USA", "usa", " CHN", "CHN.12_1", "AUS.10", "X1", "", "ÄBC", "O'B", "MEX ",
+              "A", "US", "12A", "ab c", "None", "nan"]
+    odd = list(GID_ENTRIES.values())[19:35]
+
+    def item():
+        token = tokens[rng.integers(len(tokens))]
+        return f'"{token}"' if "'" in token else f"'{token}'"
+
+    def literal(depth=0):
+        parts = [literal(1) if depth == 0 and rng.random() < 0.4 else item()
+                 for _ in range(rng.integers(0, 4))]
+        separator = [",", ", ", " ,", ",\n "][rng.integers(4)]
+        closing = ["", ",", " "][rng.integers(3)] if parts else ""
+        return "[" + [""," "][rng.integers(2)] + separator.join(parts) + closing + "]"
+
+    entries = []
+    for draw in rng.random(n):
+        if draw < 0.05:
+            entries.append(None)
+        elif draw < 0.08:
+            entries.append(np.nan)
+        elif draw < 0.2:
+            entries.append(tokens[rng.integers(len(tokens))])
+        elif draw < 0.3:
+            entries.append(odd[rng.integers(len(odd))])
+        else:
+            entries.append([" ", ""][rng.integers(2)] + literal())
+    return entries
+
+
+@pytest.mark.parametrize("instance", [False, True], ids=["level3", "level2"])
+@pytest.mark.parametrize("name", list(GID_ENTRIES))
+def test_normalize_gids_matches_row_wise(name, instance):
+    entry = GID_ENTRIES[name]
+    values = pd.Series([entry, entry], dtype=object)  # the second one is a cache hit
+    expected = row_wise(entry, instance)
+    if isinstance(expected, type):
+        with pytest.raises(expected):
+            dpf.normalize_gids(values, instance=instance, cache=dpf.GidCache())
+        return
+    got = dpf.normalize_gids(values, instance=instance, cache=dpf.GidCache())
+    assert_same_codes(got, [expected, expected])
+
+
+@pytest.mark.parametrize("cache", ["fresh", "none", "shared"])
+@pytest.mark.parametrize("dtype", ["object", "category"])
+@pytest.mark.parametrize("instance", [False, True], ids=["level3", "level2"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_normalize_gids_matches_row_wise_on_random_entries(seed, instance, dtype, cache):
+    entries = random_entries(seed)
+    expected = [row_wise(entry, instance) for entry in entries]
+    keep = [not isinstance(code, type) for code in expected]  # what the row-wise function accepts
+    values = pd.Series([e for e, k in zip(entries, keep) if k], dtype=dtype)
+    table = {"fresh": dpf.GidCache(), "none": None, "shared": dpf.GID_CACHE}[cache]
+    got = dpf.normalize_gids(values, instance=instance, cache=table)
+    assert_same_codes(got.astype(object), [c for c, k in zip(expected, keep) if k])
+
+
+@pytest.mark.parametrize("dtype", ["object", "category"])
+@pytest.mark.parametrize("instance", [False, True], ids=["level3", "level2"])
+def test_clean_dataframe_keeps_the_rows_of_row_wise(instance, dtype):
+    entries = [e for e in list(GID_ENTRIES.values()) + random_entries(3, 2000)
+               if not isinstance(e, list) and not isinstance(row_wise(e, instance), type)]
+    column = GID_COLUMNS[instance]
+    df = pd.DataFrame({"Event_ID": np.arange(len(entries)),
+                       column: pd.Series(entries, dtype=dtype)})
+    expected = pd.Series([row_wise(e, instance) for e in entries], dtype=object)
+
+    cleaned = dpf.clean_dataframe(df)
+
+    kept = expected.notna().to_numpy()
+    assert cleaned["Event_ID"].tolist() == df.loc[kept, "Event_ID"].tolist()
+    assert_same_codes(cleaned[column].astype(object).to_numpy(), expected[kept].to_numpy())